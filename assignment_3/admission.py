@@ -0,0 +1,45 @@
+import numpy as np
+
+
+class AdmissionQueue:
+    """
+    Array-backed FIFO of patients waiting for a prep room
+
+    Patients are their PatientLog rows, kept in a circular int64 array that
+    doubles when full, so a backlog costs 8 bytes per patient instead of a
+    suspended process and its pending resource request.
+    """
+    def __init__(self, capacity=1024):
+        self.data = np.empty(capacity, dtype=np.int64)
+        self.head = 0
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def _grow(self):
+        """Double the buffer, unrolling the rows to start at index 0"""
+        data = np.empty(2 * len(self.data), dtype=np.int64)
+        data[:self.count] = self.rows()
+        self.data = data
+        self.head = 0
+
+    def push(self, row):
+        """Append a patient at the back of the queue"""
+        if self.count == len(self.data):
+            self._grow()
+        self.data[(self.head + self.count) % len(self.data)] = row
+        self.count += 1
+
+    def pop(self):
+        """Remove the patient at the front of the queue"""
+        if self.count == 0:
+            raise IndexError("pop from empty admission queue")
+        row = int(self.data[self.head])
+        self.head = (self.head + 1) % len(self.data)
+        self.count -= 1
+        return row
+
+    def rows(self):
+        """Rows of the queued patients, front first"""
+        return self.data[(self.head + np.arange(self.count)) % len(self.data)]
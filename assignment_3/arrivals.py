@@ -0,0 +1,192 @@
+import time
+import random
+import numpy as np
+
+
+class RateTable:
+    """
+    Periodic arrival rate profile, e.g. a day or a week of theatre arrivals
+
+    times are the knots 0 = t_0 < ... < t_n = period. With kind 'constant'
+    rates[i] holds on [t_i, t_{i+1}); with kind 'linear' rates[i] is the rate
+    at t_i and the rate is interpolated linearly between knots.
+    """
+    def __init__(self, times, rates, kind='constant'):
+        self.times = np.asarray(times, dtype=float)
+        self.kind = kind
+        expected = len(self.times) - (1 if kind == 'constant' else 0)
+        if kind not in ('constant', 'linear') or len(rates) != expected:
+            raise ValueError(f"{kind} rate table needs {expected} rates for {len(times)} knots")
+        self.rates = np.asarray(rates, dtype=float)
+        if self.times[0] != 0 or np.any(np.diff(self.times) <= 0) or np.any(self.rates < 0):
+            raise ValueError("Knots must increase from 0 and rates must be non-negative")
+
+        widths = np.diff(self.times)
+        if kind == 'constant':
+            areas = self.rates * widths
+        else:
+            areas = (self.rates[:-1] + self.rates[1:]) / 2 * widths
+        self.cumulative = np.concatenate(([0.0], np.cumsum(areas)))
+        self.period = self.times[-1]
+        self.period_total = self.cumulative[-1]
+        if self.period_total <= 0:
+            raise ValueError("Rate table has no arrivals")
+
+    def mean_rate(self):
+        return self.period_total / self.period
+
+    def cumulative_rate(self, t):
+        """Expected number of arrivals in [0, t]"""
+        cycles, offset = np.divmod(np.asarray(t, dtype=float), self.period)
+        i = np.clip(np.searchsorted(self.times, offset, side='right') - 1, 0, len(self.times) - 2)
+        s = offset - self.times[i]
+        if self.kind == 'constant':
+            within = self.rates[i] * s
+        else:
+            slope = (self.rates[i + 1] - self.rates[i]) / (self.times[i + 1] - self.times[i])
+            within = self.rates[i] * s + slope * s ** 2 / 2
+        return cycles * self.period_total + self.cumulative[i] + within
+
+    def inverse(self, y):
+        """Times at which the cumulative rate reaches y, vectorized"""
+        cycles, offset = np.divmod(np.asarray(y, dtype=float), self.period_total)
+        # side='right' skips zero-rate segments, whose cumulative rate is flat
+        i = np.clip(np.searchsorted(self.cumulative, offset, side='right') - 1, 0, len(self.times) - 2)
+        d = offset - self.cumulative[i]
+        if self.kind == 'constant':
+            s = d / self.rates[i]
+        else:
+            slope = (self.rates[i + 1] - self.rates[i]) / (self.times[i + 1] - self.times[i])
+            # Root of r s + slope s^2 / 2 = d, in a form stable for slope near 0
+            denominator = self.rates[i] + np.sqrt(np.maximum(self.rates[i] ** 2 + 2 * slope * d, 0))
+            s = np.divide(2 * d, denominator, out=np.zeros_like(d), where=denominator > 0)
+        return cycles * self.period + self.times[i] + s
+
+
+class NHPPStream:
+    """
+    Non-homogeneous Poisson interarrival times by inversion
+
+    Arrival epochs are Lambda^-1 of a unit-rate Poisson process, computed a
+    batch at a time with NumPy, so every draw is used, unlike thinning, which
+    rejects a fraction 1 - mean/peak rate of its candidates. new() returns
+    the gap to the next arrival, like Stream. Each batch is drawn from a
+    NumPy generator seeded from rng, so runs are reproducible from
+    random.seed.
+    """
+    type = 'nhpp'
+
+    def __init__(self, table, start_time=0.0, rng=random, batch_size=1024):
+        self.table = table
+        self.rng = rng
+        self.batch_size = batch_size
+        self.last = start_time
+        self.cumulative = float(table.cumulative_rate(start_time))
+        self.pending = np.empty(0)
+        self.position = 0
+        self.reset()
+
+    def reset(self):
+        """Reset sample statistics of the drawn values"""
+        self.count = 0
+        self.total = 0
+
+    def _refill(self):
+        generator = np.random.default_rng(self.rng.getrandbits(64))
+        levels = self.cumulative + np.cumsum(generator.exponential(1.0, self.batch_size))
+        self.pending = self.table.inverse(levels)
+        self.position = 0
+        self.cumulative = float(levels[-1])
+
+    def new(self):
+        if self.position == len(self.pending):
+            self._refill()
+        arrival = float(self.pending[self.position])
+        self.position += 1
+        value = arrival - self.last
+        self.last = arrival
+        self.count += 1
+        self.total += value
+        return value
+
+    def sample_mean(self):
+        """Mean of the values drawn since the last reset, NaN if there were none"""
+        return self.total / self.count if self.count > 0 else np.nan
+
+    def state(self):
+        """JSON-serializable position in the arrival sequence, for snapshots"""
+        return {
+            'last': self.last,
+            'cumulative': self.cumulative,
+            'pending': self.pending[self.position:].tolist()
+        }
+
+    def set_state(self, state, exact=True):
+        """
+        Resume from state(); without exact, the arrivals already drawn into
+        the pending batch are dropped and the next batch starts at the last
+        arrival, so a reseeded rng gives new arrival times
+        """
+        self.last = state['last']
+        if exact:
+            self.cumulative = state['cumulative']
+            self.pending = np.array(state['pending'], dtype=float)
+        else:
+            self.cumulative = float(self.table.cumulative_rate(self.last))
+            self.pending = np.empty(0)
+        self.position = 0
+
+
+def thinning_arrivals(table, horizon, rng=random):
+    """
+    Reference generator by thinning (Lewis and Shedler)
+
+    Returns:
+        tuple: (arrival times, number of candidates drawn)
+    """
+    peak = table.rates.max()
+    arrivals = []
+    candidates = 0
+    now = 0.0
+    while True:
+        now += rng.expovariate(peak)
+        if now >= horizon:
+            return arrivals, candidates
+        candidates += 1
+        offset = now % table.period
+        if table.kind == 'constant':
+            rate = table.rates[min(np.searchsorted(table.times, offset, side='right') - 1, len(table.rates) - 1)]
+        else:
+            rate = np.interp(offset, table.times, table.rates)
+        if rng.random() * peak <= rate:
+            arrivals.append(now)
+
+
+if __name__ == "__main__":
+    # Daily profile in minutes, 8:1 between the busiest and the quietest hours
+    hours = np.arange(25) * 60
+    hourly = [1, 1, 1, 1, 1, 1, 2, 4, 8, 8, 7, 6, 6, 7, 8, 7, 5, 4, 3, 2, 2, 1, 1, 1]
+    table = RateTable(hours, np.array(hourly) / 100)
+    horizon = 365 * 24 * 60
+
+    start = time.perf_counter()
+    stream = NHPPStream(table, rng=random.Random(1))
+    arrivals = [stream.new()]
+    while stream.last < horizon:
+        arrivals.append(stream.new())
+    inversion_time = time.perf_counter() - start
+    arrival_times = np.cumsum(arrivals[:-1])
+
+    start = time.perf_counter()
+    thinned, candidates = thinning_arrivals(table, horizon, random.Random(1))
+    thinning_time = time.perf_counter() - start
+
+    expected = table.cumulative_rate(horizon)
+    print(f"Expected arrivals in a year: {expected:.0f}")
+    print(f"Inversion: {len(arrival_times)} arrivals, {len(arrival_times)} draws, {inversion_time:.2f}s")
+    print(f"Thinning: {len(thinned)} arrivals, {candidates} draws, {thinning_time:.2f}s")
+
+    observed = np.bincount((arrival_times % table.period // 60).astype(int), minlength=24) / 365
+    print("Hour  expected  observed")
+    for hour, rate in enumerate(hourly):
+        print(f"{hour:>4}  {rate * 0.6:>8.3f}  {observed[hour]:>8.3f}")
@@ -0,0 +1,87 @@
+import time
+import random
+from event_list import EVENT_LISTS, make_environment
+from hospital import HospitalSimulation
+from monitor import Monitor
+
+
+def hold_benchmark(kind, n_pending, n_holds=100000, seed=42, increment=None):
+    """
+    Classic hold model: pop the earliest event and schedule a new one
+
+    Args:
+        kind (str): Event list name from EVENT_LISTS
+        n_pending (int): Number of pending events kept in the list
+        n_holds (int): Number of hold operations timed
+        increment (callable): Draws the time increment, exponential(1) by default
+
+    Returns:
+        float: Mean time per hold operation in microseconds
+    """
+    rng = random.Random(seed)
+    increment = increment or (lambda: rng.expovariate(1.0))
+    event_list = EVENT_LISTS[kind]()
+    eid = 0
+    for _ in range(n_pending):
+        event_list.push((increment(), 1, eid, None))
+        eid += 1
+
+    # Let the structure settle into its steady-state shape before timing
+    for _ in range(n_pending):
+        now = event_list.pop()[0]
+        event_list.push((now + increment(), 1, eid, None))
+        eid += 1
+
+    start = time.perf_counter()
+    for _ in range(n_holds):
+        now = event_list.pop()[0]
+        event_list.push((now + increment(), 1, eid, None))
+        eid += 1
+    return (time.perf_counter() - start) / n_holds * 1e6
+
+
+def hospital_benchmark(kind, config, run_time, seed=42):
+    """
+    Run the hospital model on an event list
+
+    Returns:
+        dict: Wall time and the largest number of pending events seen
+    """
+    random.seed(seed)
+    env = make_environment(kind)
+    hospital = HospitalSimulation(env, config)
+    monitor = Monitor(config['check_interval'])
+    env.process(hospital.generate_patients())
+    env.process(monitor.run(hospital, env))
+
+    start = time.perf_counter()
+    env.run(until=run_time)
+    return {
+        'wall_time': time.perf_counter() - start,
+        'max_pending': env.max_pending
+    }
+
+
+if __name__ == "__main__":
+    sizes = [10 ** k for k in range(2, 7)]
+    print("Hold model, microseconds per hold:")
+    print(f"{'pending':>10}" + "".join(f"{kind:>12}" for kind in EVENT_LISTS))
+    for n_pending in sizes:
+        n_holds = max(100000, n_pending)
+        row = [hold_benchmark(kind, n_pending, n_holds) for kind in EVENT_LISTS]
+        print(f"{n_pending:>10}" + "".join(f"{cost:>12.3f}" for cost in row))
+
+    # Overloaded hospital: mean interarrival 10 against a single OR with mean 20
+    config = {
+        'num_prep_rooms': 2,
+        'num_recovery_rooms': 2,
+        'mean_interarrival_time': 10,
+        'mean_prep_time': 40,
+        'mean_operation_time': 20,
+        'mean_recovery_time': 40,
+        'check_interval': 5
+    }
+    print("\nOverloaded hospital, 100000 time units:")
+    for kind in EVENT_LISTS:
+        result = hospital_benchmark(kind, config, 100000)
+        print(f"{kind}: {result['wall_time']:.2f}s, max pending events {result['max_pending']}")
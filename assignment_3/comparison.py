@@ -0,0 +1,169 @@
+import numpy as np
+from scipy.stats import t
+from results_cube import ResultsCube
+from snapshot import snapshot_batch_means
+
+# Cube metrics, in the order used along the metric axis
+RESULT_METRICS = ('prep_queue_length', 'op_blocking_prob', 'recovery_full_prob')
+
+
+def stack_results(results, metrics=RESULT_METRICS):
+    """
+    Stack per-configuration results into one array
+
+    A ResultsCube whose design points are the configurations is returned as
+    a view; separately run configurations are copied into one array.
+    Replications started from warm-up snapshots are correlated, so they are
+    replaced by one batch mean per snapshot, which needs every configuration
+    to use the same snapshot for the same replication.
+
+    Args:
+        results: ResultsCube, or mapping of configuration label to SimulationResults
+        metrics (tuple): Cube metric names to place along the metric axis
+
+    Returns:
+        tuple: (labels, array of shape replications x configurations x metrics)
+    """
+    if isinstance(results, ResultsCube):
+        labels = list(range(results.shape[0]))
+        data = results.by_replication(metrics)
+        snapshot_ids = results.metadata.get('snapshot')
+    else:
+        labels = list(results.keys())
+        data = np.stack([results[label].cube.select(metrics)[0] for label in labels], axis=1)
+        snapshot_ids = [results[label].cube.metadata.get('snapshot') for label in labels]
+        if all(ids is None for ids in snapshot_ids):
+            snapshot_ids = None
+        elif any(ids is None for ids in snapshot_ids):
+            raise ValueError("Cannot pair configurations started from snapshots with ones that were not")
+        else:
+            snapshot_ids = np.concatenate(snapshot_ids)
+
+    if snapshot_ids is not None:
+        if not np.all(snapshot_ids == snapshot_ids[0]):
+            raise ValueError("Configurations must use the same snapshot for each replication")
+        data = snapshot_batch_means(data, snapshot_ids[0])
+    return labels, data
+
+
+def _holm_adjust(p_values):
+    """Holm step-down adjusted p-values along the first axis"""
+    n = p_values.shape[0]
+    order = np.argsort(p_values, axis=0)
+    sorted_p = np.take_along_axis(p_values, order, axis=0)
+    multipliers = (n - np.arange(n))[:, None]
+    adjusted_sorted = np.minimum(np.maximum.accumulate(sorted_p * multipliers, axis=0), 1.0)
+
+    adjusted = np.empty_like(adjusted_sorted)
+    np.put_along_axis(adjusted, order, adjusted_sorted, axis=0)
+
+    # Level each hypothesis is tested at in the step-down sequence
+    levels = np.empty_like(adjusted_sorted)
+    np.put_along_axis(levels, order, np.broadcast_to(1.0 / multipliers, sorted_p.shape), axis=0)
+    return adjusted, levels
+
+
+def pairwise_comparisons(data, confidence=0.95):
+    """
+    All pairwise paired-t comparisons with multiplicity correction
+
+    Every pair (i, j) with i < j is compared on every metric in a single
+    vectorized pass. Replications are assumed to share seeds across
+    configurations (common random numbers), so differences are paired.
+    Replications must be independent; stack_results batches those started
+    from shared warm-up snapshots.
+
+    Args:
+        data (ndarray): replications x configurations x metrics array
+        confidence (float): Family-wise confidence level per metric
+
+    Returns:
+        dict: Arrays indexed by (pair, metric) including:
+            - mean_diff, std_err, t_stat, p_value
+            - bonferroni_ci / holm_ci as (lower, upper) arrays
+            - bonferroni_p / holm_p adjusted p-values
+            - significant (Holm decision at the family-wise level)
+    """
+    data = np.asarray(data, dtype=float)
+    n_reps, n_configs, _ = data.shape
+    first, second = np.triu_indices(n_configs, k=1)
+    n_pairs = len(first)
+    alpha = 1 - confidence
+    dof = n_reps - 1
+
+    diffs = data[:, first, :] - data[:, second, :]
+    mean_diff = diffs.mean(axis=0)
+    std_err = diffs.std(axis=0, ddof=1) / np.sqrt(n_reps)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t_stat = np.where(std_err > 0, mean_diff / std_err, np.where(mean_diff == 0, 0.0, np.inf))
+    p_value = 2 * t.sf(np.abs(t_stat), dof)
+
+    bonferroni_p = np.minimum(p_value * n_pairs, 1.0)
+    holm_p, holm_levels = _holm_adjust(p_value)
+
+    bonferroni_half = t.ppf(1 - alpha / (2 * n_pairs), dof) * std_err
+    holm_half = t.ppf(1 - alpha * holm_levels / 2, dof) * std_err
+
+    return {
+        'pairs': np.column_stack((first, second)),
+        'mean_diff': mean_diff,
+        'std_err': std_err,
+        't_stat': t_stat,
+        'p_value': p_value,
+        'bonferroni_p': bonferroni_p,
+        'holm_p': holm_p,
+        'bonferroni_ci': (mean_diff - bonferroni_half, mean_diff + bonferroni_half),
+        'holm_ci': (mean_diff - holm_half, mean_diff + holm_half),
+        'significant': holm_p < alpha
+    }
+
+
+def multiple_comparisons_with_best(data, confidence=0.95, minimize=True):
+    """
+    Hsu's multiple comparisons with the best using paired differences
+
+    Builds simultaneous intervals for mu_i - best_{j != i} mu_j on each
+    metric, using the Bonferroni-paired form so common random numbers
+    across configurations are exploited.
+
+    Args:
+        data (ndarray): replications x configurations x metrics array
+        confidence (float): Simultaneous confidence level per metric
+        minimize (bool): Whether smaller values are better
+
+    Returns:
+        dict: Arrays indexed by (configuration, metric) including:
+            - lower / upper interval bounds
+            - contains_best (configurations that may be the best)
+    """
+    data = np.asarray(data, dtype=float)
+    if minimize:
+        data = -data
+    n_reps, n_configs, _ = data.shape
+    alpha = 1 - confidence
+
+    means = data.mean(axis=0)
+    # configs x configs x metrics paired differences
+    diffs = data[:, :, None, :] - data[:, None, :, :]
+    std_err = diffs.std(axis=0, ddof=1) / np.sqrt(n_reps)
+    t_val = t.ppf(1 - alpha / (n_configs - 1), n_reps - 1)
+    mean_diff = means[:, None, :] - means[None, :, :]
+
+    # Exclude j == i from the minimum
+    eye = np.eye(n_configs, dtype=bool)[:, :, None]
+    upper = np.min(np.where(eye, np.inf, mean_diff + t_val * std_err), axis=1)
+    lower = np.min(np.where(eye, np.inf, mean_diff - t_val * std_err), axis=1)
+    # Configuration i can still be the best unless its upper bound is negative
+    contains_best = upper >= 0
+    upper = np.maximum(upper, 0.0)
+    lower = np.minimum(lower, 0.0)
+
+    if minimize:
+        lower, upper = -upper, -lower
+
+    return {
+        'lower': lower,
+        'upper': upper,
+        'contains_best': contains_best
+    }
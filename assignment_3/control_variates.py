@@ -0,0 +1,55 @@
+import numpy as np
+from scipy.stats import t
+
+
+def control_variate_estimate(values, controls, confidence=0.95):
+    """
+    Multiple control-variate estimator of a mean
+
+    Controls must have known expectation zero, e.g. the difference between
+    the sample mean of an input stream and its theoretical mean. The
+    coefficients are fitted by least squares across replications and the
+    confidence interval uses the Lavenberg-Welch variance with n - q - 1
+    degrees of freedom.
+
+    Args:
+        values (array): Output estimate per replication, shape (n,)
+        controls (array): Control deviations per replication, shape (n, q)
+        confidence (float): Confidence level of the interval
+
+    Returns:
+        dict: mean, ci, coefficients, crude and controlled variances and
+            variance_reduction (fraction of the crude variance removed)
+    """
+    y = np.asarray(values, dtype=float)
+    c = np.asarray(controls, dtype=float).reshape(len(y), -1)
+    n, q = c.shape
+
+    crude_mean = np.mean(y)
+    crude_var = np.var(y, ddof=1) / n
+    if n <= q + 2:
+        raise ValueError(f"Need more than {q + 2} replications for {q} controls")
+
+    y_centered = y - crude_mean
+    c_mean = np.mean(c, axis=0)
+    c_centered = c - c_mean
+
+    s_cc = c_centered.T @ c_centered
+    beta = np.linalg.lstsq(s_cc, c_centered.T @ y_centered, rcond=None)[0]
+    mean = crude_mean - c_mean @ beta
+
+    residuals = y_centered - c_centered @ beta
+    residual_var = residuals @ residuals / (n - q - 1)
+    controlled_var = residual_var * (1 / n + c_mean @ np.linalg.pinv(s_cc) @ c_mean)
+
+    half_width = t.ppf((1 + confidence) / 2, n - q - 1) * np.sqrt(controlled_var)
+    variance_reduction = 1 - controlled_var / crude_var if crude_var > 0 else np.nan
+
+    return {
+        'mean': mean,
+        'ci': (mean - half_width, mean + half_width),
+        'coefficients': beta,
+        'crude_variance': crude_var,
+        'controlled_variance': controlled_var,
+        'variance_reduction': variance_reduction
+    }
@@ -0,0 +1,216 @@
+import time
+import numpy as np
+from sim_run import run_configuration
+
+# HospitalSimulation has a single operating theatre
+OPERATING_ROOMS = 1
+
+
+def erlang_c_queue(arrival_rate, service_rate, servers):
+    """
+    Mean queue length of an M/M/c queue
+
+    Uses the Erlang B recursion, which is stable for any number of servers.
+
+    Returns:
+        float: Mean number waiting, inf if the queue is unstable
+    """
+    load = arrival_rate / service_rate
+    if load >= servers:
+        return np.inf
+    erlang_b = 1.0
+    for k in range(1, servers + 1):
+        erlang_b = load * erlang_b / (k + load * erlang_b)
+    erlang_c = servers * erlang_b / (servers - load * (1 - erlang_b))
+    return erlang_c * load / (servers - load)
+
+
+def working_rooms(load, rooms):
+    """
+    Upstream rooms still working, given how many are blocked
+
+    Quasi-static approximation: with b of the rooms blocked, the others
+    behave as an M/M/(rooms - b) stage offered the same load, whose mean
+    number of busy rooms is min(load, rooms - b).
+
+    Returns:
+        ndarray: Working rooms for b = 0..rooms blocked
+    """
+    return np.minimum(load, rooms - np.arange(rooms + 1)).astype(float)
+
+
+def blocking_stage(upstream_rate, service_rate, servers, working):
+    """
+    Finite-capacity stage fed by upstream rooms that block when it is full
+
+    The state n counts patients that have reached the stage, in service or
+    finished upstream and holding an upstream room. With b = (n - servers)+
+    upstream rooms blocked, births occur at upstream_rate * working[b], the
+    upstream service rate times the rooms still working, and deaths at
+    min(n, servers) * service_rate. The stationary distribution is computed
+    in log space, so large stages neither overflow nor underflow.
+
+    Returns:
+        dict: State probabilities, throughput and mean number of upstream
+            rooms blocked
+    """
+    upstream = len(working) - 1
+    n = np.arange(servers + upstream + 1)
+    blocked = np.maximum(n - servers, 0)
+    births = upstream_rate * working[blocked[:-1]]
+    deaths = np.minimum(n[1:], servers) * service_rate
+    with np.errstate(divide='ignore'):
+        log_p = np.concatenate(([0.0], np.cumsum(np.log(births) - np.log(deaths))))
+    p = np.exp(log_p - log_p.max())
+    p /= p.sum()
+    return {
+        'probabilities': p,
+        'throughput': np.dot(p[1:], deaths),
+        'blocked': np.dot(p, blocked)
+    }
+
+
+def decompose(config, tol=1e-10, max_iterations=1000):
+    """
+    Approximate steady-state metrics by blocking-aware decomposition
+
+    Each stage is analysed on its own. Prep is an M/M/c queue whose service
+    time is the preparation plus the mean wait for the OR; by Little's law
+    that wait is the mean number of blocked prep rooms over the arrival rate.
+    The OR and recovery are blocking_stage models fed by the working rooms
+    of the stage before, the OR's service time being the operation plus the
+    mean time it stays blocked by a full recovery unit. Each stage's
+    effective feed rate is scaled until its throughput equals the arrival
+    rate, and since the blocking times and feed rates depend on each other
+    the stages are iterated to a fixed point. The cost per iteration is
+    linear in the number of rooms.
+
+    Args:
+        config (dict): HospitalSimulation configuration
+        tol (float): Relative change in the blocking times that ends the iteration
+        max_iterations (int): Iteration limit
+
+    Returns:
+        dict: Metrics named as in Monitor.get_results, with the OR queue
+            length, stability, iteration count and convergence flag
+    """
+    if 'arrival_rate_table' in config:
+        raise ValueError("Decomposition needs a stationary arrival rate")
+    rate = 1 / config['mean_interarrival_time']
+    prep_rate = 1 / config['mean_prep_time']
+    operation_rate = 1 / config['mean_operation_time']
+    recovery_rate = 1 / config['mean_recovery_time']
+    prep_rooms = config['num_prep_rooms']
+    recovery_rooms = config['num_recovery_rooms']
+    unstable = {'stable': False, 'prep_queue_length': np.inf, 'iterations': 0, 'converged': True}
+
+    if rate >= recovery_rooms * recovery_rate or rate >= OPERATING_ROOMS * operation_rate:
+        return unstable
+
+    # Upstream rooms still working, by the number blocked
+    prep_working = working_rooms(rate / prep_rate, prep_rooms)
+    operation_working = working_rooms(rate / operation_rate, OPERATING_ROOMS)
+    # Effective service rates of the rooms feeding the OR and recovery
+    prep_feed, operation_feed = prep_rate, operation_rate
+    prep_blocking, or_blocking = 0.0, 0.0
+    for iteration in range(1, max_iterations + 1):
+        recovery = blocking_stage(operation_feed, recovery_rate, recovery_rooms, operation_working)
+        # Mean time the OR is held waiting for a recovery room
+        or_holding = 1 / operation_rate + recovery['blocked'] / rate
+        if rate * or_holding >= OPERATING_ROOMS:
+            return {**unstable, 'iterations': iteration}
+        operation = blocking_stage(prep_feed, 1 / or_holding, OPERATING_ROOMS, prep_working)
+
+        prep_feed *= rate / operation['throughput']
+        operation_feed *= rate / recovery['throughput']
+        updated = (operation['blocked'] / rate, recovery['blocked'] / rate)
+        change = max(abs(new - old) / max(new, 1e-12) for new, old in zip(updated, (prep_blocking, or_blocking)))
+        prep_blocking, or_blocking = updated
+        if change < tol:
+            break
+
+    # Mean time a prepared patient holds the prep room waiting for the OR
+    prep_holding = 1 / prep_rate + prep_blocking
+    recovery_p = recovery['probabilities']
+    return {
+        'stable': rate * prep_holding < prep_rooms,
+        'prep_queue_length': erlang_c_queue(rate, 1 / prep_holding, prep_rooms),
+        'op_blocking_prob': recovery_p[recovery_rooms + 1:].sum(),
+        'recovery_full_prob': recovery_p[recovery_rooms:].sum(),
+        'prep_util': min(rate * prep_holding / prep_rooms, 1.0),
+        'op_util': rate * or_holding / OPERATING_ROOMS,
+        'recovery_util': rate / (recovery_rooms * recovery_rate),
+        'op_queue_length': operation['blocked'],
+        'iterations': iteration,
+        'converged': change < tol
+    }
+
+
+def compare_with_simulation(config, seeds, confidence=0.95):
+    """
+    Decomposition metrics against simulation replications of the same config
+
+    Returns:
+        dict: Per metric, the approximation, the simulated mean and CI and the
+            absolute and relative error, plus stability by the approximation
+            and the solver and simulation wall times
+    """
+    start = time.perf_counter()
+    approximation = decompose(config)
+    solver_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    results = run_configuration(config, seeds)
+    simulation_time = time.perf_counter() - start
+    stats = results.compute_statistics(confidence)
+
+    report = {'stable': approximation['stable'], 'solver_time': solver_time,
+              'simulation_time': simulation_time, 'metrics': {}}
+    for metric in ('prep_queue_length', 'op_blocking_prob', 'recovery_full_prob', 'prep_util', 'op_util', 'recovery_util'):
+        simulated = stats[f'{metric}_mean']
+        error = approximation.get(metric, np.nan) - simulated
+        report['metrics'][metric] = {
+            'approximation': approximation.get(metric, np.nan),
+            'simulated': simulated,
+            'ci': stats[f'{metric}_ci'],
+            'abs_error': error,
+            'rel_error': error / simulated if simulated != 0 else np.nan
+        }
+    return report
+
+
+if __name__ == "__main__":
+    base_config = {
+        'mean_interarrival_time': 25,
+        'mean_prep_time': 40,
+        'mean_operation_time': 20,
+        'mean_recovery_time': 40,
+        'check_interval': 5,
+        'warm_time': 1000,
+        'sim_time': 20000
+    }
+    layouts = [(3, 4), (3, 5), (4, 5), (2, 2)]
+    seeds = list(range(42, 62))
+
+    for prep_rooms, recovery_rooms in layouts:
+        config = {**base_config, 'num_prep_rooms': prep_rooms, 'num_recovery_rooms': recovery_rooms}
+        report = compare_with_simulation(config, seeds)
+        print(f"\n{prep_rooms}p{recovery_rooms}r: solver {report['solver_time'] * 1000:.1f}ms, "
+              f"simulation {report['simulation_time']:.1f}s")
+        if not report['stable']:
+            print(f"  unstable by the approximation; simulated prep queue "
+                  f"{report['metrics']['prep_queue_length']['simulated']:.1f} and growing with run length")
+            continue
+        for metric, result in report['metrics'].items():
+            lower, upper = result['ci']
+            print(f"  {metric:<19} approx {result['approximation']:8.4f}  sim {result['simulated']:8.4f} "
+                  f"({lower:.4f}, {upper:.4f})  error {result['abs_error']:+.4f}")
+
+    # Solver time does not grow with the size of the layout
+    for scale in (10, 100, 1000):
+        config = {**base_config, 'num_prep_rooms': 2 * scale, 'num_recovery_rooms': 2 * scale,
+                  'mean_interarrival_time': 25 / scale, 'mean_operation_time': 20 / scale}
+        start = time.perf_counter()
+        result = decompose(config)
+        print(f"{2 * scale} prep / {2 * scale} recovery rooms: {(time.perf_counter() - start) * 1000:.1f}ms, "
+              f"{result['iterations']} iterations, prep queue {result['prep_queue_length']:.3f}")
@@ -0,0 +1,288 @@
+import sys
+import json
+import time
+import socket
+import struct
+import threading
+from collections import deque
+import numpy as np
+from sim_run import SimulationResults, run_configuration
+from results_cube import ResultsCube
+
+# Messages are JSON objects, each preceded by its length as 4 bytes
+HEADER = struct.Struct('!I')
+
+
+def send_message(sock, message):
+    payload = json.dumps(message).encode()
+    sock.sendall(HEADER.pack(len(payload)) + payload)
+
+
+def _receive_exactly(sock, size):
+    data = bytearray()
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError("Connection closed")
+        data.extend(chunk)
+    return bytes(data)
+
+
+def receive_message(sock):
+    size, = HEADER.unpack(_receive_exactly(sock, HEADER.size))
+    return json.loads(_receive_exactly(sock, size))
+
+
+def run_task(config, seed):
+    """One replication, as a JSON-serializable dict"""
+    results = run_configuration(config, [seed])
+    return {
+        'metrics': {name: float(values[0]) for name, values in results.metric_values().items()},
+        'metadata': {name: float(values[0, 0]) for name, values in results.cube.metadata.items()},
+        'input_means': [float(mean) for mean in results.input_means[0]],
+        'input_targets': list(results.input_targets)
+    }
+
+
+class Coordinator:
+    """
+    Hands (config, seed) replications to workers connected over TCP
+
+    Each worker connection is served by a thread that sends one task at a
+    time. A worker that disconnects, or takes longer than task_timeout on a
+    task, is dropped and its task goes back to the front of the queue for
+    the next free worker. A task that raises on the worker is reported back
+    and retried the same way. After max_attempts failures of one task, or
+    when every worker has been lost, run() raises instead of waiting.
+    Results are stored by task index, so they do not depend on which worker
+    ran what, and a replication gives the same numbers wherever it runs.
+
+    The protocol has no authentication: listen on localhost or a trusted
+    network only.
+    """
+    def __init__(self, host='127.0.0.1', port=0, task_timeout=None, max_attempts=3):
+        self.server = socket.create_server((host, port))
+        self.address = self.server.getsockname()
+        self.task_timeout = task_timeout
+        self.max_attempts = max_attempts
+        self.pending = deque()
+        self.condition = threading.Condition()
+        self.closed = False
+        self.workers = 0
+        self.lost = 0
+        self.reassigned = 0
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    def _accept(self):
+        self.server.settimeout(0.2)
+        while not self.closed:
+            try:
+                conn, _ = self.server.accept()
+            except socket.timeout:
+                continue
+            except OSError:
+                return
+            with self.condition:
+                self.workers += 1
+            threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+    def _fail(self, batch, index, error):
+        """Requeue a failed task, or fail its batch once out of attempts"""
+        batch['attempts'][index] += 1
+        if batch['error'] is not None:
+            return
+        if batch['attempts'][index] >= self.max_attempts:
+            batch['error'] = f"Task {index} failed {batch['attempts'][index]} times: {error}"
+            # The batch is abandoned, so its queued tasks are not run
+            self.pending = deque(item for item in self.pending if item[0] is not batch)
+        else:
+            self.pending.appendleft((batch, index))
+            self.reassigned += 1
+
+    def _serve(self, conn):
+        with conn:
+            while True:
+                with self.condition:
+                    while not self.pending and not self.closed:
+                        self.condition.wait()
+                    if self.closed:
+                        try:
+                            send_message(conn, {'type': 'shutdown'})
+                        except OSError:
+                            pass
+                        self.workers -= 1
+                        return
+                    batch, index = self.pending.popleft()
+                config, seed = batch['tasks'][index]
+                try:
+                    conn.settimeout(self.task_timeout)
+                    send_message(conn, {'type': 'task', 'task': index, 'config': config, 'seed': seed})
+                    reply = receive_message(conn)
+                    if reply.get('task') != index:
+                        raise ConnectionError("Reply to the wrong task")
+                except (OSError, ValueError) as error:
+                    # Lost worker: its task goes to the next free worker
+                    with self.condition:
+                        self._fail(batch, index, f"worker lost ({error!r})")
+                        self.workers -= 1
+                        self.lost += 1
+                        self.condition.notify_all()
+                    return
+                with self.condition:
+                    if reply['type'] == 'error':
+                        self._fail(batch, index, reply['error'])
+                    elif batch['results'][index] is None:
+                        batch['results'][index] = reply['result']
+                        batch['remaining'] -= 1
+                    self.condition.notify_all()
+
+    def run(self, tasks, timeout=None):
+        """
+        Run (config, seed) tasks on the connected workers
+
+        Args:
+            tasks (list): (config, seed) pairs
+            timeout (float): Overall time limit in seconds, None waits indefinitely
+
+        Returns:
+            list: Task results in the order of tasks
+
+        Raises:
+            RuntimeError: A task failed max_attempts times, or every worker was lost
+            TimeoutError: The tasks did not finish within timeout
+        """
+        batch = {'tasks': list(tasks), 'results': [None] * len(tasks), 'remaining': len(tasks),
+                 'attempts': [0] * len(tasks), 'error': None}
+        deadline = None if timeout is None else time.time() + timeout
+        with self.condition:
+            lost_before = self.lost
+            self.pending.extend((batch, index) for index in range(len(tasks)))
+            self.condition.notify_all()
+            while batch['remaining'] > 0:
+                if batch['error'] is not None:
+                    raise RuntimeError(batch['error'])
+                if self.workers == 0 and self.lost > lost_before:
+                    self._abandon(batch)
+                    raise RuntimeError("Every worker was lost with tasks outstanding")
+                wait = None if deadline is None else deadline - time.time()
+                if wait is not None and wait <= 0:
+                    self._abandon(batch)
+                    raise TimeoutError(f"{batch['remaining']} of {len(tasks)} tasks unfinished after {timeout}s")
+                self.condition.wait(wait)
+        return batch['results']
+
+    def _abandon(self, batch):
+        """Drop a batch's queued tasks; tasks already sent finish unused"""
+        batch['error'] = batch['error'] or "Abandoned"
+        self.pending = deque(item for item in self.pending if item[0] is not batch)
+
+    def close(self):
+        """Shut the workers down and stop listening"""
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+        self.server.close()
+
+
+def run_worker(host, port, fail_after=None, connect_timeout=10.0):
+    """
+    Serve tasks from a coordinator until it shuts down
+
+    fail_after drops the connection instead of answering the task after that
+    many, to exercise reassignment.
+
+    Returns:
+        int: Number of tasks completed
+    """
+    deadline = time.time() + connect_timeout
+    while True:
+        try:
+            sock = socket.create_connection((host, port))
+            break
+        except OSError:
+            if time.time() > deadline:
+                raise
+            time.sleep(0.1)
+
+    completed = 0
+    with sock:
+        while True:
+            try:
+                message = receive_message(sock)
+            except (OSError, ValueError):
+                return completed
+            if message['type'] == 'shutdown' or completed == fail_after:
+                return completed
+            try:
+                result = run_task(message['config'], message['seed'])
+            except Exception as error:
+                # Report the failure instead of dropping the connection
+                send_message(sock, {'type': 'error', 'task': message['task'], 'error': repr(error)})
+                continue
+            send_message(sock, {'type': 'result', 'task': message['task'], 'result': result})
+            completed += 1
+
+
+def results_from_replications(replications):
+    """Assemble per-replication results, in seed order, into SimulationResults"""
+    results = SimulationResults(ResultsCube(1, len(replications)))
+    for r, replication in enumerate(replications):
+        results.cube.record(0, r, replication['metrics'], **replication['metadata'])
+        results.input_targets = tuple(replication['input_targets'])
+    results.input_means = np.array([replication['input_means'] for replication in replications])
+    return results
+
+
+def run_configuration_distributed(coordinator, config, seeds, timeout=None):
+    """
+    run_configuration with the replications spread over the workers
+
+    Gives the same per-replication values as run_configuration; quantile
+    sketches are not shipped, and warm-up snapshots are not supported.
+    """
+    return results_from_replications(coordinator.run([(config, seed) for seed in seeds], timeout))
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 4 and sys.argv[1] == 'worker':
+        # python distributed.py worker HOST PORT, on each analysis server
+        run_worker(sys.argv[2], int(sys.argv[3]))
+        sys.exit()
+
+    # Localhost test: worker processes stand in for remote hosts, and one
+    # of them drops out after two tasks
+    import multiprocessing as mp
+
+    config = {
+        'num_prep_rooms': 3,
+        'num_recovery_rooms': 4,
+        'mean_interarrival_time': 25,
+        'mean_prep_time': 40,
+        'mean_operation_time': 20,
+        'mean_recovery_time': 40,
+        'check_interval': 5,
+        'warm_time': 1000,
+        'sim_time': 20000
+    }
+    seeds = list(range(42, 66))
+
+    coordinator = Coordinator(task_timeout=60)
+    host, port = coordinator.address
+    workers = [mp.Process(target=run_worker, args=(host, port, 2 if i == 0 else None)) for i in range(4)]
+    for worker in workers:
+        worker.start()
+
+    start = time.time()
+    distributed = run_configuration_distributed(coordinator, config, seeds)
+    elapsed = time.time() - start
+    coordinator.close()
+    for worker in workers:
+        worker.join()
+    print(f"{len(seeds)} replications on {len(workers)} workers in {elapsed:.1f}s, "
+          f"{coordinator.reassigned} task(s) reassigned")
+
+    start = time.time()
+    local = run_configuration(config, seeds)
+    print(f"Serial run_configuration in {time.time() - start:.1f}s")
+    identical = np.array_equal(distributed.cube.values, local.cube.values, equal_nan=True)
+    print(f"Identical results: {identical}")
@@ -0,0 +1,247 @@
+import random
+import itertools
+from functools import partial
+import numpy as np
+from scipy.stats import t
+from hospital import HospitalSimulation
+from monitor import Monitor
+from patient_log import PatientLog
+from event_list import make_environment
+from pool import map_tasks
+
+# Metrics compared between engines, with the equivalence margin of each:
+# relative to the reference mean for queue lengths, absolute for fractions
+EQUIVALENCE_MARGINS = {
+    'prep_queue_length': ('relative', 0.10),
+    'op_blocking_prob': ('absolute', 0.02),
+    'recovery_full_prob': ('absolute', 0.02),
+    'prep_util': ('absolute', 0.02),
+    'op_util': ('absolute', 0.02),
+    'recovery_util': ('absolute', 0.02)
+}
+
+
+def simpy_engine(config, seed, overrides=None):
+    """
+    Reference engine: one replication of HospitalSimulation
+
+    overrides are applied to the config, so variants of the model such as
+    another event list or lazy admission can be passed as candidates with
+    functools.partial.
+
+    Returns:
+        dict: Monitor averages plus the patient flow rates and times that
+            Little's law relates them to
+    """
+    config = {**config, **(overrides or {})}
+    random.seed(seed)
+    env = make_environment(config.get('event_list'))
+    patient_log = PatientLog()
+    hospital = HospitalSimulation(env, config, patient_log)
+    monitor = Monitor(config['check_interval'])
+    env.process(hospital.generate_patients())
+    env.process(monitor.run(hospital, env))
+
+    env.run(until=config['warm_time'])
+    monitor.reset()
+    end = config['warm_time'] + config['sim_time']
+    env.run(until=end)
+
+    queue_length, blocking_prob, recovery_full, prep_util, op_util, recovery_util = monitor.get_results()
+    arrivals = patient_log.records(since=config['warm_time'], complete_only=False)
+    arrivals = arrivals[arrivals['arrival'] < end]
+    breakdown = patient_log.wait_breakdown(since=config['warm_time'])
+    return {
+        'prep_queue_length': queue_length,
+        'op_blocking_prob': blocking_prob,
+        'recovery_full_prob': recovery_full,
+        'prep_util': prep_util,
+        'op_util': op_util,
+        'recovery_util': recovery_util,
+        'arrival_rate': len(arrivals) / config['sim_time'],
+        'prep_wait': np.mean(breakdown['prep_wait']),
+        # Rooms are held until the next stage is secured
+        'prep_holding': np.mean(breakdown['prep_time'] + breakdown['op_wait']),
+        'or_holding': np.mean(breakdown['operation_time'] + breakdown['blocking_time']),
+        'recovery_holding': np.mean(breakdown['recovery_time'])
+    }
+
+
+def _run_task(task):
+    engine, config, seed = task
+    return engine(config, seed)
+
+
+def tost(reference, candidate, margin, alpha=0.05, paired=False):
+    """
+    Two one-sided tests for equivalence of two means
+
+    The means are declared equivalent when both H0: diff <= -margin and
+    H0: diff >= margin are rejected at level alpha, i.e. when the
+    (1 - 2 alpha) confidence interval of the difference lies in (-margin, margin).
+    Paired samples use the per-replication differences, otherwise Welch's
+    standard error is used.
+
+    Returns:
+        dict: Difference, its CI, the TOST p-value and whether equivalent
+    """
+    reference, candidate = np.asarray(reference), np.asarray(candidate)
+    diff = candidate.mean() - reference.mean()
+    if paired:
+        se = (candidate - reference).std(ddof=1) / np.sqrt(len(reference))
+        dof = len(reference) - 1
+    else:
+        var_r = reference.var(ddof=1) / len(reference)
+        var_c = candidate.var(ddof=1) / len(candidate)
+        se = np.sqrt(var_r + var_c)
+        if se > 0:
+            dof = (var_r + var_c) ** 2 / (var_r ** 2 / (len(reference) - 1) + var_c ** 2 / (len(candidate) - 1))
+    if se == 0:
+        p_value = 0.0 if abs(diff) < margin else 1.0
+        ci = (diff, diff)
+    else:
+        p_value = max(t.sf((diff + margin) / se, dof), t.cdf((diff - margin) / se, dof))
+        half = t.ppf(1 - alpha, dof) * se
+        ci = (diff - half, diff + half)
+    return {
+        'diff': diff,
+        'ci': ci,
+        'margin': margin,
+        'p_value': p_value,
+        'equivalent': bool(p_value < alpha)
+    }
+
+
+def littles_law_checks(results, config, tolerance=0.05):
+    """
+    Little's law L = lambda * W for the prep queue and each room type
+
+    Compares the time-average number in each part of the system from the
+    Monitor with the arrival rate times the mean time spent there from the
+    patient log, averaged over replications.
+
+    Returns:
+        list: One dict per check with both sides, relative error and pass flag
+    """
+    mean = lambda name: np.mean([r[name] for r in results])
+    checks = [
+        ('prep_queue', mean('prep_queue_length'), 'prep_wait'),
+        ('prep_rooms', mean('prep_util') * config['num_prep_rooms'], 'prep_holding'),
+        ('operating_room', mean('op_util'), 'or_holding'),
+        ('recovery_rooms', mean('recovery_util') * config['num_recovery_rooms'], 'recovery_holding')
+    ]
+    report = []
+    for name, number, time_name in checks:
+        predicted = mean('arrival_rate') * mean(time_name)
+        error = abs(number - predicted) / max(number, predicted, 1e-12)
+        report.append({
+            'check': name,
+            'L': number,
+            'lambda_W': predicted,
+            'relative_error': error,
+            'passed': bool(error <= tolerance)
+        })
+    return report
+
+
+def equivalence_report(configs, candidate, seeds, reference=simpy_engine, alpha=0.05,
+                       margins=None, little_tolerance=0.05, paired=True, n_workers=None):
+    """
+    Validate a candidate engine against the reference on a grid of configurations
+
+    Both engines run every configuration in one parallel campaign. Each
+    metric must pass TOST, and both engines must satisfy Little's law.
+
+    By default both engines use the same seeds and the TOST is paired:
+    common random numbers cancel most of the input noise, so far fewer
+    replications are needed, and an engine that draws its random numbers
+    in the reference order must match it exactly. With paired=False the
+    candidate gets disjoint seeds, which compares output distributions of
+    engines whose random number use differs completely.
+
+    Args:
+        configs (list): Configurations to check
+        candidate (callable): Engine taking (config, seed), returning a metric dict
+        seeds (list): Reference seeds
+        reference (callable): Reference engine
+        margins (dict): Metric to (kind, margin), EQUIVALENCE_MARGINS by default
+        paired (bool): Common seeds and paired tests
+        n_workers (int): Worker processes, as in pool.map_tasks
+
+    Returns:
+        dict: Per-configuration TOST and Little's law results and overall pass
+    """
+    margins = margins or EQUIVALENCE_MARGINS
+    if paired:
+        candidate_seeds = seeds
+    else:
+        candidate_seeds = [seed + max(seeds) - min(seeds) + 1 for seed in seeds]
+    tasks = [(reference, config, seed) for config, seed in itertools.product(configs, seeds)]
+    tasks += [(candidate, config, seed) for config, seed in itertools.product(configs, candidate_seeds)]
+
+    outputs = map_tasks(_run_task, tasks, n_workers)
+
+    n = len(seeds)
+    half = len(configs) * n
+    report = {'configs': [], 'passed': True}
+    for c, config in enumerate(configs):
+        ref_results = outputs[c * n:(c + 1) * n]
+        cand_results = outputs[half + c * n:half + (c + 1) * n]
+
+        tests = {}
+        for metric, (kind, margin) in margins.items():
+            ref_values = [r[metric] for r in ref_results]
+            cand_values = [r[metric] for r in cand_results]
+            if kind == 'relative':
+                margin = margin * abs(np.mean(ref_values))
+            tests[metric] = tost(ref_values, cand_values, margin, alpha, paired)
+
+        little = {
+            'reference': littles_law_checks(ref_results, config, little_tolerance),
+            'candidate': littles_law_checks(cand_results, config, little_tolerance)
+        }
+        passed = (all(test['equivalent'] for test in tests.values())
+                  and all(check['passed'] for checks in little.values() for check in checks))
+        report['configs'].append({'config': config, 'tost': tests, 'little': little, 'passed': passed})
+        report['passed'] &= passed
+    return report
+
+
+def print_report(report):
+    """Print a report from equivalence_report"""
+    for entry in report['configs']:
+        config = entry['config']
+        print(f"\n{config['num_prep_rooms']}p{config['num_recovery_rooms']}r, "
+              f"interarrival {config['mean_interarrival_time']}: {'PASS' if entry['passed'] else 'FAIL'}")
+        for metric, test in entry['tost'].items():
+            print(f"  {metric}: diff {test['diff']:.4f} CI ({test['ci'][0]:.4f}, {test['ci'][1]:.4f}) "
+                  f"margin {test['margin']:.4f} {'ok' if test['equivalent'] else 'NOT EQUIVALENT'}")
+        for engine, checks in entry['little'].items():
+            for check in checks:
+                print(f"  Little {engine} {check['check']}: L {check['L']:.3f} "
+                      f"lambda*W {check['lambda_W']:.3f} {'ok' if check['passed'] else 'FAILED'}")
+    print(f"\nOverall: {'PASS' if report['passed'] else 'FAIL'}")
+
+
+if __name__ == "__main__":
+    base_config = {
+        'mean_prep_time': 40,
+        'mean_operation_time': 20,
+        'mean_recovery_time': 40,
+        'check_interval': 5,
+        'warm_time': 1000,
+        'sim_time': 20000
+    }
+    configs = [
+        {**base_config, 'num_prep_rooms': p, 'num_recovery_rooms': r, 'mean_interarrival_time': a}
+        for p, r, a in [(3, 4, 25), (4, 5, 25), (3, 5, 30)]
+    ]
+    seeds = list(range(42, 72))
+
+    # Lazy admission on a ladder-queue event list against the plain model
+    candidate = partial(simpy_engine, overrides={'lazy_admission': True, 'event_list': 'ladder'})
+    print_report(equivalence_report(configs, candidate, seeds))
+
+    # A deliberately different model: prep times 10% longer
+    candidate = partial(simpy_engine, overrides={'mean_prep_time': 44})
+    print_report(equivalence_report(configs[:1], candidate, seeds))
@@ -0,0 +1,379 @@
+import heapq
+import random
+import simpy
+from simpy.core import EmptySchedule, Infinity
+
+# EventListEnvironment reaches into simpy.Environment's private _queue, _eid
+# and _now, whose layout has been checked against these major versions
+SIMPY_MAJOR_VERSIONS = (4,)
+
+# Entries are SimPy's (time, priority, event id, event) tuples, so ties in
+# time are broken by priority and then by scheduling order.
+
+
+def _insort_descending(entries, entry):
+    """
+    Insert into a list sorted latest first, so the earliest entry is taken
+    by list.pop() in O(1) rather than list.pop(0) in O(n)
+    """
+    lo, hi = 0, len(entries)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if entry < entries[mid]:
+            lo = mid + 1
+        else:
+            hi = mid
+    entries.insert(lo, entry)
+
+
+class HeapEventList:
+    """Binary heap, the structure SimPy uses internally"""
+    def __init__(self):
+        self.heap = []
+
+    def __len__(self):
+        return len(self.heap)
+
+    def push(self, entry):
+        heapq.heappush(self.heap, entry)
+
+    def pop(self):
+        return heapq.heappop(self.heap)
+
+    def peek(self):
+        return self.heap[0] if self.heap else None
+
+
+class CalendarQueue:
+    """
+    Calendar queue (Brown, 1988)
+
+    Events are hashed by time into an array of day buckets, each sorted
+    latest first so the earliest event pops off its end. The number of
+    buckets doubles or halves with the queue size, and the bucket width is
+    re-estimated from the spacing of the earliest events.
+    """
+    def __init__(self, n_buckets=2, width=1.0):
+        self.size = 0
+        self._rebuild(n_buckets, width, [], 0)
+
+    def __len__(self):
+        return self.size
+
+    def _rebuild(self, n_buckets, width, entries, current_day):
+        self.n_buckets = n_buckets
+        self.width = width
+        self.buckets = [[] for _ in range(n_buckets)]
+        self.current_day = current_day
+        self.grow_at = 2 * n_buckets
+        self.shrink_at = n_buckets // 2 - 2
+        for entry in entries:
+            _insort_descending(self.buckets[int(entry[0] // width) % n_buckets], entry)
+
+    def _resize(self, n_buckets):
+        entries = [entry for bucket in self.buckets for entry in bucket]
+        width = self._estimate_width(entries)
+        first = min(entries)[0] if entries else 0
+        self._rebuild(n_buckets, width, entries, int(first // width))
+
+    def _estimate_width(self, entries):
+        """Three times the mean gap between the earliest events, ignoring outliers"""
+        times = [entry[0] for entry in heapq.nsmallest(25, entries)]
+        if len(times) < 2:
+            return self.width
+        gaps = [b - a for a, b in zip(times, times[1:])]
+        mean_gap = sum(gaps) / len(gaps)
+        typical = [gap for gap in gaps if gap <= 2 * mean_gap]
+        mean_gap = sum(typical) / len(typical) if typical else mean_gap
+        return 3 * mean_gap if mean_gap > 0 else self.width
+
+    def push(self, entry):
+        day = int(entry[0] // self.width)
+        _insort_descending(self.buckets[day % self.n_buckets], entry)
+        # An event earlier than the day reached by a peek or a resize moves
+        # the search back, as in Brown's enqueue
+        if day < self.current_day:
+            self.current_day = day
+        self.size += 1
+        if self.size > self.grow_at:
+            self._resize(2 * self.n_buckets)
+
+    def _find(self):
+        """Locate the bucket holding the earliest event"""
+        n = self.n_buckets
+        for _ in range(n):
+            bucket = self.buckets[self.current_day % n]
+            if bucket and bucket[-1][0] // self.width <= self.current_day:
+                return bucket
+            self.current_day += 1
+
+        # Nothing within a year of the current day: direct search
+        bucket = min((b for b in self.buckets if b), key=lambda b: b[-1])
+        self.current_day = int(bucket[-1][0] // self.width)
+        return bucket
+
+    def pop(self):
+        if self.size == 0:
+            raise IndexError("pop from empty calendar queue")
+        entry = self._find().pop()
+        self.size -= 1
+        if self.size < self.shrink_at:
+            self._resize(max(self.n_buckets // 2, 2))
+        return entry
+
+    def peek(self):
+        return self._find()[-1] if self.size else None
+
+
+class _Rung:
+    """One rung of a ladder queue: equal-width buckets from start to end"""
+    def __init__(self, start, width, n_buckets, end=None):
+        self.start = start
+        self.width = width
+        self.buckets = [[] for _ in range(n_buckets)]
+        self.current = 0
+        # A child rung ends exactly where its parent bucket does
+        self.stop = start + n_buckets * width if end is None else end
+
+    def current_start(self):
+        return self.start + self.current * self.width
+
+    def end(self):
+        return self.stop
+
+    def insert(self, entry):
+        index = int((entry[0] - self.start) / self.width) if self.width > 0 else 0
+        self.buckets[min(max(index, self.current), len(self.buckets) - 1)].append(entry)
+
+
+class LadderQueue:
+    """
+    Ladder queue (Tang, Goh and Thng, 2005)
+
+    Far-future events go unsorted into Top. When the near future is needed,
+    Top is spread over a rung of buckets, crowded buckets are split into
+    finer child rungs, and only a small bucket is ever sorted into Bottom,
+    latest first so the earliest event pops off its end.
+    """
+    def __init__(self, threshold=50, max_rungs=8):
+        self.threshold = threshold
+        self.max_rungs = max_rungs
+        self.top = []
+        self.top_start = -Infinity
+        self.top_min = Infinity
+        self.top_max = -Infinity
+        self.rungs = []
+        self.bottom = []
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def push(self, entry):
+        self.size += 1
+        time = entry[0]
+        if time > self.top_start:
+            self.top.append(entry)
+            self.top_min = min(self.top_min, time)
+            self.top_max = max(self.top_max, time)
+            return
+        if not self.bottom or time > self.bottom[0][0]:
+            # Deepest rung whose remaining range holds the event
+            for rung in reversed(self.rungs):
+                if rung.current_start() <= time < rung.end():
+                    rung.insert(entry)
+                    return
+        _insort_descending(self.bottom, entry)
+
+    def _spread_top(self):
+        """Move Top onto a new first rung"""
+        width = (self.top_max - self.top_min) / len(self.top)
+        rung = _Rung(self.top_min, width, len(self.top) + 1)
+        for entry in self.top:
+            rung.insert(entry)
+        self.rungs.append(rung)
+        self.top_start = self.top_max
+        self.top = []
+        self.top_min = Infinity
+        self.top_max = -Infinity
+
+    def _refill_bottom(self):
+        """Move the earliest non-empty bucket into Bottom, splitting it if crowded"""
+        while not self.bottom:
+            if not self.rungs:
+                if not self.top:
+                    return
+                self._spread_top()
+            rung = self.rungs[-1]
+            while rung.current < len(rung.buckets) and not rung.buckets[rung.current]:
+                rung.current += 1
+            if rung.current == len(rung.buckets):
+                self.rungs.pop()
+                continue
+
+            bucket = rung.buckets[rung.current]
+            rung.buckets[rung.current] = []
+            bucket_start = rung.current_start()
+            rung.current += 1
+
+            times = [entry[0] for entry in bucket]
+            if (len(bucket) > self.threshold and len(self.rungs) < self.max_rungs
+                    and max(times) > min(times)):
+                bucket_end = rung.end() if rung.current == len(rung.buckets) else rung.current_start()
+                child = _Rung(bucket_start, rung.width / self.threshold, self.threshold, end=bucket_end)
+                for entry in bucket:
+                    child.insert(entry)
+                self.rungs.append(child)
+            else:
+                bucket.sort(reverse=True)
+                self.bottom = bucket
+
+    def pop(self):
+        if self.size == 0:
+            raise IndexError("pop from empty ladder queue")
+        if not self.bottom:
+            self._refill_bottom()
+        self.size -= 1
+        return self.bottom.pop()
+
+    def peek(self):
+        if self.size == 0:
+            return None
+        if not self.bottom:
+            self._refill_bottom()
+        return self.bottom[-1]
+
+
+EVENT_LISTS = {
+    'heap': HeapEventList,
+    'calendar': CalendarQueue,
+    'ladder': LadderQueue
+}
+
+
+class EventListEnvironment(simpy.Environment):
+    """
+    SimPy environment whose pending events live in a pluggable event list
+
+    step() moves the next entry into SimPy's own (otherwise empty) queue and
+    lets the base class process it, so event semantics are unchanged. This
+    relies on SimPy internals, so other SimPy versions are refused; run
+    check_event_order to validate one before adding it to
+    SIMPY_MAJOR_VERSIONS.
+    """
+    def __init__(self, event_list='heap', initial_time=0):
+        major = int(simpy.__version__.split('.')[0])
+        if major not in SIMPY_MAJOR_VERSIONS:
+            raise RuntimeError(f"EventListEnvironment is not validated for SimPy {simpy.__version__}")
+        super().__init__(initial_time)
+        if not (isinstance(getattr(self, '_queue', None), list) and hasattr(self, '_eid')
+                and hasattr(self, '_now')):
+            raise RuntimeError(f"SimPy {simpy.__version__} lacks the Environment internals EventListEnvironment uses")
+        self.event_list = EVENT_LISTS[event_list]()
+        self.max_pending = 0
+
+    def schedule(self, event, priority=simpy.events.NORMAL, delay=0):
+        self.event_list.push((self._now + delay, priority, next(self._eid), event))
+        if len(self.event_list) > self.max_pending:
+            self.max_pending = len(self.event_list)
+
+    def peek(self):
+        entry = self.event_list.peek()
+        return Infinity if entry is None else entry[0]
+
+    def step(self):
+        try:
+            self._queue.append(self.event_list.pop())
+        except IndexError:
+            raise EmptySchedule from None
+        super().step()
+
+
+def make_environment(event_list=None, initial_time=0):
+    """Plain SimPy environment, or one backed by the named event list"""
+    if event_list is None:
+        return simpy.Environment(initial_time)
+    return EventListEnvironment(event_list, initial_time)
+
+
+def check_entry_order(kind, seed, n_operations=20000):
+    """
+    Whether an event list pops the same entries in the same order as heapq
+
+    Pushes and pops are interleaved at random, and times are drawn from a
+    coarse grid as well as continuously, so ties in time and priority occur.
+    """
+    rng = random.Random(seed)
+    event_list, heap = EVENT_LISTS[kind](), []
+    now, eid = 0.0, 0
+    for _ in range(n_operations):
+        if heap and rng.random() < 0.45:
+            entry = event_list.pop()
+            if entry != heapq.heappop(heap):
+                return False
+            now = entry[0]
+        else:
+            delay = rng.choice((0.0, 1.0, 2.5)) if rng.random() < 0.3 else rng.expovariate(1.0)
+            entry = (now + delay, rng.choice((0, 1)), eid, None)
+            eid += 1
+            event_list.push(entry)
+            heapq.heappush(heap, entry)
+    while heap:
+        if event_list.pop() != heapq.heappop(heap):
+            return False
+    return len(event_list) == 0
+
+
+def _random_workload(env, rng, log, n_processes=30):
+    """Processes with tied timeouts, shared rooms and interrupts, logging every resume"""
+    rooms = simpy.Resource(env, capacity=3)
+
+    def worker(name):
+        for step in range(40):
+            try:
+                if rng.random() < 0.3:
+                    with rooms.request() as request:
+                        yield request
+                        log.append((env.now, name, step, 'room'))
+                        yield env.timeout(rng.choice((0, 1, 2)))
+                else:
+                    yield env.timeout(rng.choice((0, 0.5, 1)) if rng.random() < 0.5 else rng.expovariate(1.0))
+                log.append((env.now, name, step))
+            except simpy.Interrupt:
+                log.append((env.now, name, step, 'interrupted'))
+
+    workers = [env.process(worker(i)) for i in range(n_processes)]
+
+    def interrupter():
+        while True:
+            yield env.timeout(rng.expovariate(0.5))
+            target = rng.choice(workers)
+            if target.is_alive and target is not env.active_process:
+                target.interrupt()
+                log.append((env.now, 'interrupt', workers.index(target)))
+
+    env.process(interrupter())
+
+
+def check_event_order(kind, seed, until=200):
+    """
+    Whether an EventListEnvironment processes a random workload exactly like
+    simpy.Environment: same processes resumed at the same times, in the
+    same order
+    """
+    logs = []
+    for env in (simpy.Environment(), EventListEnvironment(kind)):
+        log = []
+        _random_workload(env, random.Random(seed), log)
+        env.run(until=until)
+        logs.append(log)
+    return logs[0] == logs[1] and len(logs[0]) > 0
+
+
+if __name__ == "__main__":
+    seeds = range(20)
+    for kind in EVENT_LISTS:
+        entries = sum(check_entry_order(kind, seed) for seed in seeds)
+        events = sum(check_event_order(kind, seed) for seed in seeds)
+        print(f"{kind:<9} entry order matches heapq {entries}/{len(seeds)}, "
+              f"event order matches simpy.Environment {events}/{len(seeds)}")
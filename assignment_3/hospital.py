@@ -1,11 +1,25 @@
+import math
+import random
 import simpy
 from stream import Stream
-from patient import Patient
+from patient_log import PatientLog, SERVICE_FIELDS
+from admission import AdmissionQueue
+from arrivals import RateTable, NHPPStream
+
+# Stages of a patient's flow, in order
+FLOW_STAGES = ('waiting_prep', 'prep', 'waiting_operation', 'operation', 'blocked', 'recovery')
+# Restore order that lets room holders claim their rooms before the queued patients
+RESTORE_ORDER = ('recovery', 'blocked', 'operation', 'waiting_operation', 'prep', 'waiting_prep')
 
 class HospitalSimulation:
-    def __init__(self, env: simpy.Environment, config: dict):
+    def __init__(self, env: simpy.Environment, config: dict, patient_log=None, rng=random):
         self.env = env
         self.config = config
+        # Every patient is a row of the log; without a log to keep, a
+        # recycling one holds just the patients in the system
+        self.patient_log = patient_log if patient_log is not None else PatientLog(1024, recycle=True)
+        self.columns = self.patient_log.columns
+        self.rng = rng  # random module or a random.Random owned by this hospital
 
         # Resources
         self.prep_rooms = simpy.Resource(env, capacity=config['num_prep_rooms'])
@@ -19,52 +33,261 @@ class HospitalSimulation:
         self.post_wait = 0
         self.is_blocking = False
         self.is_operational = False
+        self.wait_observers = []  # Callbacks receiving (name, wait) per patient
+
+        # Order of stage changes, which restores queue positions from snapshots
+        self.stage_order = 0
+        self.next_arrival = 0
+
+        # With lazy admission, arrivals finding every prep room busy wait as
+        # compact records and only become patient processes when admitted
+        self.admission_queue = AdmissionQueue() if config.get('lazy_admission') else None
 
-        # Random streams - all exponential as per specification
-        self.interarrival_stream = Stream('exp', config['mean_interarrival_time'])
-        self.prep_stream = Stream('exp', config['mean_prep_time'])
-        self.operation_stream = Stream('exp', config['mean_operation_time'])
-        self.recovery_stream = Stream('exp', config['mean_recovery_time'])
+        # Random streams - all exponential as per specification, unless a
+        # time-varying arrival rate table is given
+        if 'arrival_rate_table' in config:
+            table = RateTable(**config['arrival_rate_table'])
+            self.interarrival_stream = NHPPStream(table, env.now, rng=rng)
+        else:
+            self.interarrival_stream = Stream('exp', config['mean_interarrival_time'], rng=rng)
+        self.prep_stream = Stream('exp', config['mean_prep_time'], rng=rng)
+        self.operation_stream = Stream('exp', config['mean_operation_time'], rng=rng)
+        self.recovery_stream = Stream('exp', config['mean_recovery_time'], rng=rng)
 
     def reset(self):
         """Reset statistics"""
         self.pre_wait = 0
         self.op_wait = 0
         self.post_wait = 0
+        for stream in self.input_streams().values():
+            stream.reset()
+
+    def input_streams(self):
+        """Random streams keyed by the config name of their mean"""
+        streams = {
+            'mean_interarrival_time': self.interarrival_stream,
+            'mean_prep_time': self.prep_stream,
+            'mean_operation_time': self.operation_stream,
+            'mean_recovery_time': self.recovery_stream
+        }
+        # Time-varying arrivals have no single mean
+        return {name: stream for name, stream in streams.items() if stream.type != 'nhpp'}
         
-    def generate_patients(self):
+    def generate_patients(self, first_arrival=None):
         """Generate new patients"""
+        if first_arrival is not None:
+            # Resume the arrival process of a restored snapshot
+            self.next_arrival = first_arrival
+            yield self.env.timeout(first_arrival - self.env.now)
         while True:
             self.total_patients += 1
-            patient = Patient(
-                id=self.total_patients,
-                arrival_time=self.env.now,
-                prep_time=self.prep_stream.new(),
-                operation_time=self.operation_stream.new(),
-                recovery_time=self.recovery_stream.new()
+            row = self.patient_log.add(
+                self.total_patients,
+                self.env.now,
+                self.prep_stream.new(),
+                self.operation_stream.new(),
+                self.recovery_stream.new()
             )
 
-            self.env.process(self.patient_flow(patient))
-            yield self.env.timeout(self.interarrival_stream.new())
+            self.admit(row)
+            interarrival = self.interarrival_stream.new()
+            self.next_arrival = self.env.now + interarrival
+            yield self.env.timeout(interarrival)
+
+    def admit(self, row):
+        """Start an arriving patient's flow, or queue it for lazy admission"""
+        if self.admission_queue is None:
+            self.env.process(self.patient_flow(row))
+        elif len(self.admission_queue) == 0 and self.prep_rooms.count < self.prep_rooms.capacity:
+            self.env.process(self.patient_flow(row, pre_req=self.prep_rooms.request()))
+        else:
+            self.admission_queue.push(row)
+
+    def _admit_waiting(self, event=None):
+        """Admit queued arrivals into the prep rooms that are free"""
+        while len(self.admission_queue) > 0 and self.prep_rooms.count < self.prep_rooms.capacity:
+            row = self.admission_queue.pop()
+            self.env.process(self.patient_flow(row, pre_req=self.prep_rooms.request()))
+
+    def prep_queue_length(self):
+        """Patients waiting for a prep room, admitted or not"""
+        queued = len(self.admission_queue) if self.admission_queue is not None else 0
+        return len(self.prep_rooms.queue) + queued
+
+    def _track(self, row, stage, duration=None):
+        """Record the stage a patient is in, for snapshots"""
+        self.columns['stage'][row] = FLOW_STAGES.index(stage)
+        self.columns['stage_end'][row] = math.nan if duration is None else self.env.now + duration
+        self.columns['stage_order'][row] = self.stage_order
+        self.stage_order += 1
+
+    def _observe_wait(self, name, value):
+        """Report a patient's waiting time to the observers"""
+        for observer in self.wait_observers:
+            observer(name, value)
+
+    def _stamp(self, row, field):
+        """Log the time a patient reached an event"""
+        self.columns[field][row] = self.env.now
+
+    def _depart(self, row):
+        """Take a patient out of the flow"""
+        self.patient_log.release(row)
+
+    def patient_flow(self, row, stage='waiting_prep', residual=None, pre_req=None):
+        """Process a single patient, given by its PatientLog row, through the hospital system
+
+        Patients restored from a snapshot start at ``stage`` with ``residual``
+        time left in their current activity. Lazily admitted patients bring
+        the prep room request made on their admission as ``pre_req``.
+        """
+        start = FLOW_STAGES.index(stage)
+        columns = self.columns
+
+        # Rooms held or queued for at the starting stage are requested before
+        # the first yield, so restored patients keep their place in each queue
+        if start <= 2 and pre_req is None:
+            pre_req = self.prep_rooms.request()
+        if 2 <= start <= 4:
+            op_req = self.operating_room.request()
+        if 3 <= start <= 4:
+            self.is_operational = True
+        if start >= 4:
+            post_req = self.recovery_rooms.request()
 
-    def patient_flow(self, patient: Patient):
-        """Process a single patient through the hospital system"""
         # Preparation phase
-        pre_req = self.prep_rooms.request()
-        yield pre_req  # Request prep room first
-        yield self.env.timeout(patient.prep_time)
+        if start <= 1:
+            self._track(row, 'waiting_prep')
+            yield pre_req  # Request prep room first
+            self._stamp(row, 'prep_start')
+            if start == 0:
+                self._observe_wait('prep_wait', self.env.now - columns['arrival'][row])
+            duration = residual if start == 1 else columns['prep_time'][row]
+            self._track(row, 'prep', duration)
+            yield self.env.timeout(duration)
+            self._stamp(row, 'prep_end')
         
         # Operation phase
-        op_req = self.operating_room.request()
-        yield op_req  # Request OR after prep is done
-        self.is_operational = True
-        self.prep_rooms.release(pre_req)  # Release prep room only after OR is secured
-        yield self.env.timeout(patient.operation_time)
+        if start <= 3:
+            if start <= 2:
+                if start <= 1:
+                    op_req = self.operating_room.request()
+                self._track(row, 'waiting_operation')
+                prep_end = self.env.now
+                yield op_req  # Request OR after prep is done
+                self._stamp(row, 'or_start')
+                if start <= 1:
+                    self._observe_wait('op_wait', self.env.now - prep_end)
+                self.is_operational = True
+                self.prep_rooms.release(pre_req)  # Release prep room only after OR is secured
+                if self.admission_queue is not None:
+                    self._admit_waiting()
+            duration = residual if start == 3 else columns['operation_time'][row]
+            self._track(row, 'operation', duration)
+            yield self.env.timeout(duration)
+            self._stamp(row, 'or_end')
         
         # Recovery phase
-        post_req = self.recovery_rooms.request()
-        yield post_req  # Request recovery room
-        self.is_operational = False
-        self.operating_room.release(op_req)  # Release OR only after recovery room is secured
-        yield self.env.timeout(patient.recovery_time)
-        self.recovery_rooms.release(post_req)
\ No newline at end of file
+        if start <= 3 and self.transfer_out(row):
+            # Recovery continues at another hospital
+            self.is_operational = False
+            self.operating_room.release(op_req)
+            self._depart(row)
+            return
+
+        if start <= 4:
+            if start <= 3:
+                post_req = self.recovery_rooms.request()
+            self._track(row, 'blocked')
+            self.is_blocking = True  # OR is held until a recovery room is free
+            yield post_req  # Request recovery room
+            self._stamp(row, 'recovery_start')
+            self.is_blocking = False
+            self.is_operational = False
+            self.operating_room.release(op_req)  # Release OR only after recovery room is secured
+        duration = residual if start == 5 else columns['recovery_time'][row]
+        self._track(row, 'recovery', duration)
+        yield self.env.timeout(duration)
+        self.recovery_rooms.release(post_req)
+        self._stamp(row, 'departure')
+        self._depart(row)
+
+    def transfer_out(self, row):
+        """Whether a patient leaves for recovery elsewhere after the operation"""
+        return False
+
+    def _patient_record(self, row):
+        """JSON-serializable arrival and service times of a patient"""
+        columns = self.columns
+        return {
+            'id': int(columns['id'][row]),
+            'arrival_time': float(columns['arrival'][row]),
+            **{name: float(columns[name][row]) for name in SERVICE_FIELDS}
+        }
+
+    def snapshot(self):
+        """
+        Capture the hospital state as a JSON-serializable dict
+
+        Includes every patient's stage, pre-drawn service times and residual
+        activity time, the time of the next arrival and the RNG state.
+        """
+        columns = self.columns
+        patients = []
+        if self.admission_queue is not None:
+            # Queued arrivals rank behind every live patient
+            for i, row in enumerate(self.admission_queue.rows()):
+                patients.append({**self._patient_record(row), 'stage': 'waiting_prep',
+                                 'residual': None, 'order': self.stage_order + i})
+        for row in self.patient_log.in_flow():
+            ends = columns['stage_end'][row]
+            patients.append({
+                **self._patient_record(row),
+                'stage': FLOW_STAGES[columns['stage'][row]],
+                'residual': None if math.isnan(ends) else float(ends - self.env.now),
+                'order': int(columns['stage_order'][row])
+            })
+        snapshot = {
+            'time': self.env.now,
+            'next_arrival': self.next_arrival,
+            'total_patients': self.total_patients,
+            'rng_state': self.rng.getstate(),
+            'patients': patients
+        }
+        if isinstance(self.interarrival_stream, NHPPStream):
+            snapshot['arrival_stream'] = self.interarrival_stream.state()
+        return snapshot
+
+    def restore(self, snapshot, seed=None):
+        """
+        Start the patient and arrival processes from a snapshot
+
+        The environment must start at the snapshot time. With a seed the
+        restored run uses a fresh random sequence instead of the saved one.
+        """
+        self.total_patients = snapshot['total_patients']
+
+        # Room holders are restarted before the patients queued behind them
+        patients = sorted(
+            snapshot['patients'],
+            key=lambda p: (RESTORE_ORDER.index(p['stage']), p['order'])
+        )
+        for record in patients:
+            row = self.patient_log.add(record['id'], record['arrival_time'],
+                                       *(record[name] for name in SERVICE_FIELDS))
+            if self.admission_queue is not None and record['stage'] == 'waiting_prep':
+                self.admission_queue.push(row)
+            else:
+                self.env.process(self.patient_flow(row, record['stage'], record['residual']))
+        if self.admission_queue is not None:
+            # Admit once the restored room holders have claimed their rooms
+            self.env.timeout(0).callbacks.append(self._admit_waiting)
+
+        if seed is None:
+            state = snapshot['rng_state']
+            self.rng.setstate((state[0], tuple(state[1]), state[2]))
+        else:
+            self.rng.seed(seed)
+        if 'arrival_stream' in snapshot:
+            self.interarrival_stream.set_state(snapshot['arrival_stream'], exact=seed is None)
+        self.env.process(self.generate_patients(first_arrival=snapshot['next_arrival']))
@@ -1,10 +1,18 @@
 # monitor.py
 import numpy as np
+from quantiles import TDigest
+
+# Series tracked with streaming quantile sketches
+QUEUE_SKETCHES = ('prep_queue', 'op_waiting')
+WAIT_SKETCHES = ('prep_wait', 'op_wait')
+# Fewest samples a sketch needs before its tail quantiles are reported
+MIN_SKETCH_SAMPLES = 20
 
 class Monitor:
     """Enhanced monitoring system"""
-    def __init__(self, check_freq):
+    def __init__(self, check_freq, quantiles=(0.9, 0.95)):
         self.check_freq = check_freq
+        self.quantiles = quantiles
         self.reset()
         
     def reset(self):
@@ -24,13 +32,23 @@ class Monitor:
         self.recovery_waiting_samples = []
         
         self.sample_count = 0
+
+        # Constant-memory quantile sketches of queue lengths and patient waits
+        self.sketches = {name: TDigest() for name in QUEUE_SKETCHES + WAIT_SKETCHES}
+
+    def record_wait(self, name, value):
+        """Record a per-patient waiting time reported by the hospital"""
+        self.sketches[name].add(value)
         
     def run(self, hospital, env):
         """Regular sampling of system state"""
+        hospital.wait_observers.append(self.record_wait)
         while True:
             # Sample queue lengths
-            self.prep_queue_samples.append(len(hospital.prep_rooms.queue))
+            self.prep_queue_samples.append(hospital.prep_queue_length())
             self.op_waiting_samples.append(len(hospital.operating_room.queue))
+            self.sketches['prep_queue'].add(self.prep_queue_samples[-1])
+            self.sketches['op_waiting'].add(len(hospital.operating_room.queue))
             self.recovery_waiting_samples.append(len(hospital.recovery_rooms.queue))
             
             # Sample OR blocking
@@ -72,6 +90,19 @@ class Monitor:
 
 
 
+    def get_quantiles(self):
+        """
+        Streaming quantile estimates of queue lengths and waits for the sampling period
+
+        A sketch with fewer than MIN_SKETCH_SAMPLES samples, such as the waits
+        of a period in which no patient finished waiting, gives NaN.
+        """
+        return {
+            f'{name}_q{round(q * 100)}': sketch.quantile(q) if sketch.count >= MIN_SKETCH_SAMPLES else np.nan
+            for name, sketch in self.sketches.items()
+            for q in self.quantiles
+        }
+
     def get_raw_data(self):
         """Return raw sample data for detailed analysis"""
         if self.sample_count == 0:
@@ -90,17 +121,18 @@ class Monitor:
 
     def get_statistics(self):
         """Get detailed statistics of all measures"""
-        raw_data = self.get_raw_data()
-        if not raw_data:
-            return {}
-            
-        stats = {}
-        for name, data in raw_data.items():
-            stats[name] = {
-                'mean': np.mean(data),
-                'std': np.std(data),
-                'min': np.min(data),
-                'max': np.max(data),
-                'samples': len(data)
-            }
-        return stats
\ No newline at end of file
+        return raw_data_statistics(self.get_raw_data())
+
+
+def raw_data_statistics(raw_data):
+    """Mean, spread and range of each series of raw sample data"""
+    stats = {}
+    for name, data in raw_data.items():
+        stats[name] = {
+            'mean': np.mean(data),
+            'std': np.std(data),
+            'min': np.min(data),
+            'max': np.max(data),
+            'samples': len(data)
+        }
+    return stats
\ No newline at end of file
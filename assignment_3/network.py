@@ -0,0 +1,258 @@
+import os
+import time
+import random
+import multiprocessing as mp
+import simpy
+from hospital import HospitalSimulation
+from monitor import Monitor
+from pool import worker_count
+
+
+class TransferHospital(HospitalSimulation):
+    """
+    Hospital site that transfers patients to linked sites for recovery
+
+    When all local recovery rooms are taken at the end of an operation, the
+    patient is sent to a randomly chosen linked site instead of blocking
+    the OR. Each site owns its random generator so its trajectory does not
+    depend on which other sites share its worker process.
+    """
+    def __init__(self, env, config, site, links, seed):
+        super().__init__(env, config, rng=random.Random(seed))
+        self.site = site
+        self.links = links  # List of (destination site, transfer delay)
+        self.outbox = []
+        self.sent = 0
+        self.transfers_out = 0
+        self.transfers_in = 0
+
+    def transfer_out(self, row):
+        """Send the patient away if the local recovery unit is full"""
+        if not self.links or self.recovery_rooms.count < self.recovery_rooms.capacity:
+            return False
+        destination, delay = self.links[self.rng.randrange(len(self.links))]
+        # (receive time, source, sequence) orders messages deterministically
+        recovery_time = float(self.columns['recovery_time'][row])
+        self.outbox.append((self.env.now + delay, self.site, self.sent, destination, recovery_time))
+        self.sent += 1
+        self.transfers_out += 1
+        return True
+
+    def receive(self, messages):
+        """Schedule transferred patients arriving from other sites"""
+        for receive_time, _, _, _, recovery_time in sorted(messages):
+            self.env.process(self.transferred_recovery(receive_time, recovery_time))
+
+    def transferred_recovery(self, receive_time, recovery_time):
+        """Recovery of a patient operated on at another site"""
+        yield self.env.timeout(receive_time - self.env.now)
+        self.transfers_in += 1
+        post_req = self.recovery_rooms.request()
+        yield post_req
+        yield self.env.timeout(recovery_time)
+        self.recovery_rooms.release(post_req)
+
+
+class LogicalProcess:
+    """One hospital site with its own environment and event list"""
+    def __init__(self, site, config, links, seed):
+        self.env = simpy.Environment()
+        self.hospital = TransferHospital(self.env, config, site, links, seed)
+        self.monitor = Monitor(config['check_interval'])
+
+        self.env.process(self.hospital.generate_patients())
+        self.env.process(self.monitor.run(self.hospital, self.env))
+
+    def advance(self, until, messages):
+        """Process incoming transfers and run up to (not including) until"""
+        self.hospital.receive(messages)
+        self.env.run(until=until)
+        outbox, self.hospital.outbox = self.hospital.outbox, []
+        return outbox
+
+    def reset(self):
+        """Reset statistics at the end of warm-up"""
+        self.monitor.reset()
+        self.hospital.reset()
+        self.hospital.transfers_out = 0
+        self.hospital.transfers_in = 0
+
+    def results(self):
+        queue_length, blocking_prob, recovery_full, prep_util, op_util, recovery_util = self.monitor.get_results()
+        return {
+            'prep_queue_length': queue_length,
+            'op_blocking_prob': blocking_prob,
+            'recovery_full_prob': recovery_full,
+            'prep_util': prep_util,
+            'op_util': op_util,
+            'recovery_util': recovery_util,
+            'transfers_out': self.hospital.transfers_out,
+            'transfers_in': self.hospital.transfers_in
+        }
+
+
+class SiteGroup:
+    """Logical processes owned by one worker"""
+    def __init__(self, specs):
+        self.lps = {site: LogicalProcess(site, *spec) for site, spec in specs.items()}
+
+    def handle(self, command, payload):
+        if command == 'advance':
+            until, inboxes = payload
+            outbox = []
+            for site, lp in self.lps.items():
+                outbox.extend(lp.advance(until, inboxes.get(site, [])))
+            return outbox
+        elif command == 'reset':
+            for lp in self.lps.values():
+                lp.reset()
+        elif command == 'results':
+            return {site: lp.results() for site, lp in self.lps.items()}
+
+
+def _worker(conn, specs):
+    """Worker process loop serving commands from the coordinator"""
+    group = SiteGroup(specs)
+    while True:
+        command, payload = conn.recv()
+        if command == 'stop':
+            break
+        conn.send(group.handle(command, payload))
+
+
+class _LocalWorker:
+    """In-process stand-in for a worker connection"""
+    def __init__(self, specs):
+        self.group = SiteGroup(specs)
+
+    def send(self, message):
+        self.reply = self.group.handle(*message)
+
+    def recv(self):
+        return self.reply
+
+
+def run_network(configs, links, warm_time, sim_time, seed=42, n_workers=None):
+    """
+    Simulate a network of hospitals with conservative window synchronization
+
+    Every site is a logical process with its own event list. Sites only
+    interact through transfers whose delay is at least the lookahead L (the
+    smallest link delay), so all sites can safely advance through a window
+    [T, T + L) in parallel: any transfer sent in the window arrives at or
+    after T + L. Between windows the coordinator routes the transfers.
+    Results do not depend on the number of workers.
+
+    Args:
+        configs (list): Hospital config per site
+        links (dict): Site index to list of (destination, transfer delay)
+        warm_time (float): Warm-up period, statistics are reset after it
+        sim_time (float): Measured period
+        seed (int): Base seed, site i uses seed + i
+        n_workers (int): Worker processes, as in pool.map_tasks
+
+    Returns:
+        dict: Per-site results, lookahead, number of windows and wall time
+    """
+    n_sites = len(configs)
+    n_workers = worker_count(n_workers, n_sites)
+    delays = [delay for site_links in links.values() for _, delay in site_links]
+    end_time = warm_time + sim_time
+    lookahead = min(delays) if delays else end_time
+    if lookahead <= 0:
+        raise ValueError("Transfer delays must be positive to give a lookahead")
+
+    # Round-robin assignment of sites to workers
+    assignment = {site: site % n_workers for site in range(n_sites)}
+    specs = [{} for _ in range(n_workers)]
+    for site in range(n_sites):
+        specs[assignment[site]][site] = (configs[site], links.get(site, []), seed + site)
+
+    processes = []
+    if n_workers == 1:
+        connections = [_LocalWorker(specs[0])]
+    else:
+        connections = []
+        for worker_specs in specs:
+            parent, child = mp.Pipe()
+            process = mp.Process(target=_worker, args=(child, worker_specs))
+            process.start()
+            connections.append(parent)
+            processes.append(process)
+
+    def broadcast(command, payloads=None):
+        for w, conn in enumerate(connections):
+            conn.send((command, None if payloads is None else payloads[w]))
+        return [conn.recv() for conn in connections]
+
+    start = time.time()
+    now = 0.0
+    windows = 0
+    pending = {}
+    try:
+        while now < end_time:
+            boundary = warm_time if now < warm_time else end_time
+            until = min(now + lookahead, boundary)
+
+            # Deliver every transfer received so far to the owning worker
+            inboxes = [{} for _ in range(n_workers)]
+            for site, messages in pending.items():
+                inboxes[assignment[site]][site] = messages
+            pending = {}
+
+            for outbox in broadcast('advance', [(until, inbox) for inbox in inboxes]):
+                for message in outbox:
+                    pending.setdefault(message[3], []).append(message)
+
+            now = until
+            windows += 1
+            if now == warm_time:
+                broadcast('reset')
+
+        site_results = {}
+        for group_results in broadcast('results'):
+            site_results.update(group_results)
+    finally:
+        for conn in connections:
+            if processes:
+                conn.send(('stop', None))
+        for process in processes:
+            process.join()
+
+    return {
+        'sites': [site_results[site] for site in range(n_sites)],
+        'lookahead': lookahead,
+        'windows': windows,
+        'wall_time': time.time() - start
+    }
+
+
+def ring_network(n_sites, config, transfer_delay):
+    """Identical sites, each linked to its two neighbours in a ring"""
+    configs = [dict(config) for _ in range(n_sites)]
+    links = {
+        site: [((site - 1) % n_sites, transfer_delay), ((site + 1) % n_sites, transfer_delay)]
+        for site in range(n_sites)
+    }
+    return configs, links
+
+
+if __name__ == "__main__":
+    base_config = {
+        'num_prep_rooms': 3,
+        'num_recovery_rooms': 3,
+        'mean_interarrival_time': 25,
+        'mean_prep_time': 40,
+        'mean_operation_time': 20,
+        'mean_recovery_time': 40,
+        'check_interval': 5
+    }
+    configs, links = ring_network(30, base_config, transfer_delay=30)
+
+    for n_workers in (1, None):
+        results = run_network(configs, links, warm_time=1000, sim_time=20000, n_workers=n_workers)
+        print(f"\nWorkers: {n_workers or os.cpu_count()}")
+        print(f"Lookahead: {results['lookahead']}, windows: {results['windows']}")
+        print(f"Wall time: {results['wall_time']:.2f}s")
+        for site, site_results in enumerate(results['sites'][:3]):
+            print(f"Site {site}: " + ", ".join(f"{k}={v:.4f}" for k, v in site_results.items()))
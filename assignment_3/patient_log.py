@@ -0,0 +1,142 @@
+import numpy as np
+
+# One row per patient; times are NaN until the patient reaches that point
+RECORD_DTYPE = np.dtype([
+    ('id', np.int64),
+    ('arrival', np.float64),
+    ('prep_start', np.float64),
+    ('prep_end', np.float64),
+    ('or_start', np.float64),
+    ('or_end', np.float64),
+    ('recovery_start', np.float64),
+    ('departure', np.float64),
+    # Service times drawn on arrival
+    ('prep_time', np.float64),
+    ('operation_time', np.float64),
+    ('recovery_time', np.float64),
+    # Current flow stage (-1 outside the flow), when its activity ends (NaN
+    # while waiting) and its order among stage changes, for snapshots
+    ('stage', np.int8),
+    ('stage_end', np.float64),
+    ('stage_order', np.int64)
+])
+
+TIME_FIELDS = ('arrival', 'prep_start', 'prep_end', 'or_start', 'or_end', 'recovery_start', 'departure')
+SERVICE_FIELDS = ('prep_time', 'operation_time', 'recovery_time')
+
+
+class PatientLog:
+    """
+    Preallocated structured-array store of patients
+
+    Each patient is a row holding its event times, its drawn service times
+    and its current stage, and the hospital passes the row index through
+    its flow instead of a per-patient object. Event times are written
+    straight into the row through cached column views.
+
+    With recycle set, rows of departed patients are reused, so a hospital
+    that only needs the live patients holds one row per patient in the
+    system; such a log keeps no history.
+    """
+    def __init__(self, chunk_size=65536, recycle=False):
+        self.chunk_size = chunk_size
+        self.recycle = recycle
+        self.free_rows = []
+        self.count = 0
+        self.columns = {}
+        self._set_data(self._allocate(chunk_size))
+
+    def _set_data(self, data):
+        self.data = data
+        # Column views, so stamps skip the field lookup on the structured
+        # array; updated in place so callers may hold on to the dict
+        self.columns.update((name, data[name]) for name in RECORD_DTYPE.names)
+
+    def _allocate(self, size):
+        data = np.empty(size, dtype=RECORD_DTYPE)
+        for name in TIME_FIELDS + ('stage_end',):
+            data[name] = np.nan
+        data['stage'] = -1
+        return data
+
+    def add(self, patient_id, arrival, prep_time, operation_time, recovery_time):
+        """Store an arriving patient and its service times, and return its row"""
+        columns = self.columns
+        if self.free_rows:
+            row = self.free_rows.pop()
+            for name in TIME_FIELDS[1:]:
+                columns[name][row] = np.nan
+        else:
+            if self.count == len(self.data):
+                # Grow by at least one chunk, and geometrically for large logs
+                extra = self._allocate(max(self.chunk_size, self.count // 2))
+                self._set_data(np.concatenate((self.data, extra)))
+            row = self.count
+            self.count += 1
+        columns['id'][row] = patient_id
+        columns['arrival'][row] = arrival
+        columns['prep_time'][row] = prep_time
+        columns['operation_time'][row] = operation_time
+        columns['recovery_time'][row] = recovery_time
+        columns['stage'][row] = -1
+        columns['stage_end'][row] = np.nan
+        return row
+
+    def release(self, row):
+        """Mark a patient as gone from the flow, freeing its row when recycling"""
+        self.columns['stage'][row] = -1
+        if self.recycle:
+            self.free_rows.append(row)
+
+    def stamp(self, row, field, time):
+        """Record the time a patient reached an event"""
+        self.columns[field][row] = time
+
+    def in_flow(self):
+        """Rows of the patients currently in the flow"""
+        return np.flatnonzero(self.columns['stage'][:self.count] >= 0)
+
+    def records(self, since=None, complete_only=True):
+        """
+        View of the logged rows
+
+        Args:
+            since (float): Only patients arriving at or after this time
+            complete_only (bool): Only patients followed from their
+                arrival to their departure; patients restored from a
+                snapshot past prep lack the earlier event times
+        """
+        data = self.data[:self.count]
+        mask = np.ones(self.count, dtype=bool)
+        if since is not None:
+            mask &= data['arrival'] >= since
+        if complete_only:
+            mask &= ~np.isnan(data['departure']) & ~np.isnan(data['prep_start'])
+        return data if mask.all() else data[mask]
+
+    def wait_breakdown(self, since=None):
+        """Per-patient waits and service times for each stage"""
+        data = self.records(since)
+        return {
+            'prep_wait': data['prep_start'] - data['arrival'],
+            'prep_time': data['prep_end'] - data['prep_start'],
+            'op_wait': data['or_start'] - data['prep_end'],
+            'operation_time': data['or_end'] - data['or_start'],
+            'blocking_time': data['recovery_start'] - data['or_end'],
+            'recovery_time': data['departure'] - data['recovery_start'],
+            'sojourn_time': data['departure'] - data['arrival']
+        }
+
+    def get_statistics(self, since=None, quantiles=(0.5, 0.9, 0.95)):
+        """Mean, standard deviation and quantiles of every breakdown component"""
+        stats = {}
+        for name, values in self.wait_breakdown(since).items():
+            if len(values) == 0:
+                continue
+            stats[name] = {
+                'mean': np.mean(values),
+                'std': np.std(values),
+                **{f'q{int(q * 100)}': v for q, v in zip(quantiles, np.quantile(values, quantiles))},
+                'samples': len(values)
+            }
+        return stats
@@ -0,0 +1,31 @@
+import os
+import multiprocessing as mp
+
+
+def worker_count(n_workers, n_tasks):
+    """
+    Worker processes to use for n_tasks tasks
+
+    n_workers of 1 runs in-process and None uses all cores; there are never
+    more workers than tasks.
+    """
+    return min(n_workers or os.cpu_count(), n_tasks)
+
+
+def map_tasks(function, tasks, n_workers=None):
+    """
+    Apply function to every task, in-process or on a process pool
+
+    Args:
+        function (callable): Module-level function, so workers can unpickle it
+        tasks (list): One argument per call
+        n_workers (int): Worker processes, 1 runs in-process, None uses all cores
+
+    Returns:
+        list: Outputs in task order
+    """
+    n_workers = worker_count(n_workers, len(tasks))
+    if n_workers <= 1:
+        return [function(task) for task in tasks]
+    with mp.Pool(n_workers) as pool:
+        return pool.map(function, tasks)
@@ -0,0 +1,97 @@
+import math
+import numpy as np
+
+
+class TDigest:
+    """
+    Merging t-digest for streaming quantile estimates
+
+    Memory is bounded by the compression parameter rather than the number of
+    samples. Digests built in different replications or worker processes can
+    be combined with merge(), and are plain picklable objects.
+    """
+    def __init__(self, compression=100, buffer_size=500):
+        self.compression = compression
+        self.buffer_size = buffer_size
+        self.means = np.empty(0)
+        self.weights = np.empty(0)
+        self.buffer = []
+        self.count = 0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, value, weight=1):
+        """Add a sample"""
+        self.buffer.append((value, weight))
+        self.count += weight
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+        if len(self.buffer) >= self.buffer_size:
+            self._compress()
+
+    def merge(self, other):
+        """Fold another digest into this one"""
+        other._compress()
+        self._compress()
+        self.means = np.concatenate((self.means, other.means))
+        self.weights = np.concatenate((self.weights, other.weights))
+        self.count += other.count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._compress(force=True)
+        return self
+
+    def _k(self, q):
+        """Scale function that keeps centroids small near the tails"""
+        return self.compression / (2 * np.pi) * np.arcsin(2 * q - 1)
+
+    def _compress(self, force=False):
+        """
+        Merge buffered samples into the centroids
+
+        Each sorted sample is placed by the scale function at the middle of
+        its cumulative weight, and the samples in each half unit of k form
+        one centroid, so the whole merge is a few NumPy passes and at most
+        compression + 1 centroids remain.
+        """
+        if not self.buffer and not force:
+            return
+        if self.buffer:
+            values, weights = zip(*self.buffer)
+            self.buffer = []
+            means = np.concatenate((self.means, values))
+            weights = np.concatenate((self.weights, weights))
+        else:
+            means, weights = self.means, self.weights
+        if len(means) == 0:
+            return
+
+        order = np.argsort(means, kind='stable')
+        means, weights = means[order], weights[order]
+        cumulative = np.cumsum(weights)
+        positions = (cumulative - weights / 2) / cumulative[-1]
+        bins = np.floor(2 * (self._k(positions) - self._k(0))).astype(np.int64)
+        starts = np.flatnonzero(np.concatenate(([True], np.diff(bins) > 0)))
+
+        self.weights = np.add.reduceat(weights, starts)
+        self.means = np.add.reduceat(means * weights, starts) / self.weights
+
+    def quantile(self, q):
+        """Estimate the q-quantile, NaN if no samples were added"""
+        self._compress()
+        if self.count == 0:
+            return np.nan
+        if len(self.means) == 1:
+            return self.means[0]
+
+        # Centroid means sit at the middle of their cumulative weight
+        positions = np.cumsum(self.weights) - self.weights / 2
+        x = np.concatenate(([0.0], positions, [self.count]))
+        y = np.concatenate(([self.min], self.means, [self.max]))
+        return float(np.interp(q * self.count, x, y))
+
+    def quantiles(self, qs):
+        """Estimate several quantiles at once"""
+        return [self.quantile(q) for q in qs]
@@ -1,27 +1,72 @@
+import time
 import random
 import simpy
 import numpy as np
 from scipy.stats import t
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from hospital import HospitalSimulation
 from monitor import Monitor
-from scipy.stats import sem
+from control_variates import control_variate_estimate
+from snapshot import warm_up_snapshots, start_from_snapshot, snapshot_batch_means
+from patient_log import PatientLog
+from quantiles import TDigest
+from results_cube import ResultsCube
+from event_list import make_environment
+from comparison import stack_results, pairwise_comparisons, multiple_comparisons_with_best
+
+# Time-average metrics of every replication; the cube also holds tail quantiles
+MEAN_METRICS = ('prep_queue_length', 'op_blocking_prob', 'recovery_full_prob', 'prep_util', 'op_util', 'recovery_util')
+
+
+def _metric_view(name):
+    return property(lambda self: self.cube.metric(name)[0])
+
 
 @dataclass
 class SimulationResults:
-    """Container for simulation results"""
-    prep_queue_lengths: list
-    op_blocking_prob: list
-    recovery_full_prob: list
-    
+    """Container for simulation results, backed by a single-point ResultsCube"""
+    cube: ResultsCube
+    input_means: np.ndarray = None  # Replications x inputs sample means
+    input_targets: tuple = ()  # Theoretical means, in the same order
+    sketches: dict = field(default_factory=dict)  # Quantile sketches merged over replications
+
+    prep_queue_lengths = _metric_view('prep_queue_length')
+    op_blocking_prob = _metric_view('op_blocking_prob')
+    recovery_full_prob = _metric_view('recovery_full_prob')
+    prep_util = _metric_view('prep_util')
+    op_util = _metric_view('op_util')
+    recovery_util = _metric_view('recovery_util')
+
+    def metric_values(self):
+        """Per-replication values of every recorded metric, as views of the cube"""
+        return {name: self.cube.metric(name)[0] for name in self.cube.metrics}
+
+    def pooled_quantiles(self, quantiles=(0.9, 0.95)):
+        """Quantiles of the sketches merged over all replications"""
+        return {
+            f'{name}_q{round(q * 100)}': sketch.quantile(q)
+            for name, sketch in self.sketches.items()
+            for q in quantiles
+        }
+
     def compute_statistics(self, confidence=0.95):
-        """Compute mean and confidence intervals for all metrics"""
+        """
+        Compute mean and confidence intervals for all metrics
+
+        Replications started from warm-up snapshots enter as one batch mean
+        per snapshot, as those sharing a snapshot are correlated. NaN values,
+        the tail quantiles of sketches too small to report, are left out, and
+        a metric with fewer than two values left is skipped.
+        """
+        snapshot_ids = self.cube.metadata.get('snapshot')
         stats_dict = {}
-        for metric_name, values in {
-            'prep_queue_length': self.prep_queue_lengths,
-            'op_blocking_prob': self.op_blocking_prob,
-            'recovery_full_prob': self.recovery_full_prob
-        }.items():
+        for metric_name, values in self.metric_values().items():
+            reported = ~np.isnan(values)
+            if reported.sum() < 2:
+                continue
+            values = values[reported]
+            if snapshot_ids is not None:
+                values = snapshot_batch_means(values, snapshot_ids[0][reported])
             mean = np.mean(values)
             # Fix the stats call
             sem = np.std(values, ddof=1) / np.sqrt(len(values))
@@ -32,35 +77,120 @@ class SimulationResults:
             stats_dict[f'{metric_name}_ci'] = conf_int
         return stats_dict
 
-def run_configuration(config, seeds):
-    """Run multiple replications of a single configuration"""
-    results = SimulationResults([], [], [])
+    def compute_control_variate_statistics(self, confidence=0.95):
+        """
+        Control-variate adjusted means, CIs and variance reduction of the mean metrics
+
+        Tail quantiles are left out: their relation to the input sample means
+        is far from the linear one the estimator fits. Replications started
+        from warm-up snapshots enter, with their controls, as one batch mean
+        per snapshot, as in compute_statistics. An input stream that drew no
+        values in some replication has no sample mean there, and is dropped
+        as a control.
+        """
+        controls = self.input_means - np.array(self.input_targets)
+        controls = controls[:, ~np.isnan(controls).any(axis=0)]
+        snapshot_ids = self.cube.metadata.get('snapshot')
+        if snapshot_ids is not None:
+            controls = snapshot_batch_means(controls, snapshot_ids[0])
+        stats_dict = {}
+        for metric_name in MEAN_METRICS:
+            values = self.cube.metric(metric_name)[0]
+            if snapshot_ids is not None:
+                values = snapshot_batch_means(values, snapshot_ids[0])
+            estimate = control_variate_estimate(values, controls, confidence)
+            stats_dict[f'{metric_name}_mean'] = estimate['mean']
+            stats_dict[f'{metric_name}_ci'] = estimate['ci']
+            stats_dict[f'{metric_name}_variance_reduction'] = estimate['variance_reduction']
+        return stats_dict
+
+def run_configuration(config, seeds, warmup_runs=None):
+    """
+    Run multiple replications of a single configuration
+
+    With warmup_runs set, only that many warm-up periods are simulated. Their
+    end states are snapshotted and the replications start from them in turn,
+    each with its own seed, so warm-up is amortized across replications.
+    Replications sharing a snapshot are correlated, so compute_statistics
+    then uses one batch mean per snapshot, and a CI needs two or more.
+    """
+    if warmup_runs is not None and warmup_runs < 2:
+        raise ValueError("warmup_runs must be at least 2 to give a confidence interval")
+    results = SimulationResults(ResultsCube(1, len(seeds)))
+    snapshots = warm_up_snapshots(config, seeds[:warmup_runs]) if warmup_runs else None
+    input_means = []
     
-    for seed in seeds:
-        random.seed(seed)
-        env = simpy.Environment()
-        hospital = HospitalSimulation(env, config)
+    for r, seed in enumerate(seeds):
+        start = time.perf_counter()
         monitor = Monitor(config['check_interval'])
-        
-        # Start processes
-        env.process(hospital.generate_patients())
-        env.process(monitor.run(hospital, env))
-        
-        # Warm-up period
-        env.run(until=config['warm_time'])
-        monitor.reset()
+
+        if snapshots:
+            snapshot = snapshots[r % len(snapshots)]
+            env, hospital = start_from_snapshot(config, snapshot, seed)
+            env.process(monitor.run(hospital, env))
+            start_time = snapshot['time']
+            metadata = {'snapshot': r % len(snapshots)}
+        else:
+            random.seed(seed)
+            env = make_environment(config.get('event_list'))
+            hospital = HospitalSimulation(env, config)
+            
+            # Start processes
+            env.process(hospital.generate_patients())
+            env.process(monitor.run(hospital, env))
+            
+            # Warm-up period
+            env.run(until=config['warm_time'])
+            monitor.reset()
+            hospital.reset()
+            start_time = config['warm_time']
+            metadata = {}
         
         # Main simulation
-        env.run(until=config['warm_time'] + config['sim_time'])
+        env.run(until=start_time + config['sim_time'])
         
         # Collect results
-        queue_length, blocking_prob, recovery_full = monitor.get_results()
-        results.prep_queue_lengths.append(queue_length)
-        results.op_blocking_prob.append(blocking_prob)
-        results.recovery_full_prob.append(recovery_full)
-    
+        queue_length, blocking_prob, recovery_full, prep_util, op_util, recovery_util = monitor.get_results()
+        metrics = {
+            'prep_queue_length': queue_length,
+            'op_blocking_prob': blocking_prob,
+            'recovery_full_prob': recovery_full,
+            'prep_util': prep_util,
+            'op_util': op_util,
+            'recovery_util': recovery_util,
+            **monitor.get_quantiles()
+        }
+        for name, sketch in monitor.sketches.items():
+            results.sketches.setdefault(name, TDigest()).merge(sketch)
+
+        # Input sample means during the measured period serve as control variates
+        streams = hospital.input_streams()
+        input_means.append([stream.sample_mean() for stream in streams.values()])
+        results.input_targets = tuple(config[name] for name in streams)
+        results.cube.record(0, r, metrics, wall_time=time.perf_counter() - start,
+                            warm_time=start_time, **metadata)
+
+    results.input_means = np.array(input_means)
     return results
 
+def run_patient_log(config, seed):
+    """
+    Run one replication logging every patient's event times
+
+    Returns:
+        tuple: (PatientLog, per-stage wait statistics for patients arriving
+            after the warm-up period)
+    """
+    random.seed(seed)
+    env = simpy.Environment()
+    patient_log = PatientLog()
+    hospital = HospitalSimulation(env, config, patient_log)
+
+    env.process(hospital.generate_patients())
+    env.run(until=config['warm_time'] + config['sim_time'])
+
+    return patient_log, patient_log.get_statistics(since=config['warm_time'])
+
 def compare_configurations(seeds):
     """Run and compare different configurations"""
     configs = [
@@ -103,26 +233,33 @@ if __name__ == "__main__":
                 print(f"{metric}: ({value[0]:.4f}, {value[1]:.4f})")
             else:
                 print(f"{metric}: {value:.4f}")
+
+        cv_stats = config_results.compute_control_variate_statistics()
+        print(f"\nControl-variate results for configuration {config_name}:")
+        for metric, value in cv_stats.items():
+            if 'ci' in metric:
+                print(f"{metric}: ({value[0]:.4f}, {value[1]:.4f})")
+            else:
+                print(f"{metric}: {value:.4f}")
     
     # Perform paired comparisons
     print("\nPaired Comparisons:")
-    configs = list(results.keys())
-    for i in range(len(configs)):
-        for j in range(i+1, len(configs)):
-            config1, config2 = configs[i], configs[j]
-            
-            # Calculate differences
-            queue_diff = np.array(results[config1].prep_queue_lengths) - np.array(results[config2].prep_queue_lengths)
-            block_diff = np.array(results[config1].op_blocking_prob) - np.array(results[config2].op_blocking_prob)
-            
-            # Compute confidence intervals for differences
-            for metric_name, diff in [("Queue Length", queue_diff), ("Blocking Prob", block_diff)]:
-                mean_diff = np.mean(diff)
-                ci = t.interval(0.95, len(diff)-1, loc=mean_diff, scale=sem(diff))
-                print(f"\n{config1} vs {config2} - {metric_name}")
-                print(f"Mean difference: {mean_diff:.4f}")
-                print(f"95% CI: ({ci[0]:.4f}, {ci[1]:.4f})")
-                
-                # Check if difference is significant (CI doesn't contain 0)
-                significant = (ci[0] * ci[1] > 0)
-                print(f"Significant difference: {significant}")
\ No newline at end of file
+    configs, data = stack_results(results)
+    comparisons = pairwise_comparisons(data)
+    metric_names = ["Queue Length", "Blocking Prob", "Recovery Full Prob"]
+
+    for p, (i, j) in enumerate(comparisons['pairs']):
+        for m, metric_name in enumerate(metric_names):
+            lower, upper = comparisons['bonferroni_ci'][0][p, m], comparisons['bonferroni_ci'][1][p, m]
+            print(f"\n{configs[i]} vs {configs[j]} - {metric_name}")
+            print(f"Mean difference: {comparisons['mean_diff'][p, m]:.4f}")
+            print(f"Simultaneous 95% CI (Bonferroni): ({lower:.4f}, {upper:.4f})")
+            print(f"Holm-adjusted p-value: {comparisons['holm_p'][p, m]:.4f}")
+            print(f"Significant difference: {comparisons['significant'][p, m]}")
+
+    # Identify configurations that may be the best (smallest) on each metric
+    print("\nMultiple Comparisons with the Best:")
+    mcb = multiple_comparisons_with_best(data)
+    for m, metric_name in enumerate(metric_names):
+        candidates = [configs[i] for i in np.flatnonzero(mcb['contains_best'][:, m])]
+        print(f"{metric_name}: {', '.join(candidates)}")
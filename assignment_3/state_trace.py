@@ -0,0 +1,135 @@
+import numpy as np
+
+# One row per state change; the state holds until the next row's time
+TRACE_DTYPE = np.dtype([
+    ('time', np.float64),
+    ('prep_queue', np.int32),
+    ('prep_busy', np.int32),
+    ('op_busy', np.int8),
+    ('op_waiting', np.int32),
+    ('op_blocking', np.int8),
+    ('recovery_busy', np.int32),
+    ('recovery_waiting', np.int32)
+])
+
+STATE_FIELDS = TRACE_DTYPE.names[1:]
+
+
+class StateTrace:
+    """
+    Run-length trace of the hospital state the Monitor samples
+
+    A row is written only when the state changes, and changes at the same
+    time overwrite each other, so the trace holds one row per distinct
+    state rather than one per event or per check. Any check interval or
+    window can then be sampled from the trace after the run.
+    """
+    def __init__(self, hospital, chunk_size=65536):
+        self.hospital = hospital
+        self.chunk_size = chunk_size
+        self.prep_capacity = hospital.prep_rooms.capacity
+        self.recovery_capacity = hospital.recovery_rooms.capacity
+        self.data = np.empty(chunk_size, dtype=TRACE_DTYPE)
+        self.count = 0
+        self.last = None
+        self.observe()
+
+    def _state(self):
+        hospital = self.hospital
+        return (
+            hospital.prep_queue_length(),
+            len(hospital.prep_rooms.users),
+            len(hospital.operating_room.users),
+            len(hospital.operating_room.queue),
+            1 if hospital.is_blocking else 0,
+            len(hospital.recovery_rooms.users),
+            len(hospital.recovery_rooms.queue)
+        )
+
+    def observe(self):
+        """Record the current state if it differs from the last row"""
+        state = self._state()
+        if state == self.last:
+            return
+        now = self.hospital.env.now
+        if self.count > 0 and self.data['time'][self.count - 1] == now:
+            self.count -= 1  # Same instant: keep only the final state
+            if self.count > 0 and tuple(self.data[self.count - 1])[1:] == state:
+                self.last = state
+                return
+        if self.count == len(self.data):
+            extra = np.empty(max(self.chunk_size, self.count // 2), dtype=TRACE_DTYPE)
+            self.data = np.concatenate((self.data, extra))
+        self.data[self.count] = (now,) + state
+        self.count += 1
+        self.last = state
+
+    def run(self, until):
+        """Run the hospital's environment to until, tracing every event"""
+        env = self.hospital.env
+        while env.peek() < until:
+            env.step()
+            self.observe()
+        env.run(until=until)
+
+    def rows(self):
+        """View of the trace rows"""
+        return self.data[:self.count]
+
+    def _raw_data(self, rows):
+        recovery_usage = rows['recovery_busy'] + rows['recovery_waiting']
+        return {
+            'prep_queue': rows['prep_queue'].astype(float),
+            'op_blocking': rows['op_blocking'].astype(float),
+            'recovery_full': (recovery_usage >= self.recovery_capacity).astype(float),
+            'prep_util': rows['prep_busy'] / self.prep_capacity,
+            'op_util': rows['op_busy'].astype(float),
+            'recovery_util': rows['recovery_busy'] / self.recovery_capacity,
+            'op_waiting': rows['op_waiting'].astype(float),
+            'recovery_waiting': rows['recovery_waiting'].astype(float)
+        }
+
+    def resample(self, interval, start=0.0, end=None):
+        """
+        State at every check time start, start + interval, ... before end
+
+        Returns:
+            dict: Arrays keyed like Monitor.get_raw_data
+        """
+        data = self.rows()
+        end = self.hospital.env.now if end is None else end
+        times = np.arange(start, end, interval)
+        index = np.searchsorted(data['time'], times, side='right') - 1
+        return self._raw_data(data[np.maximum(index, 0)])
+
+    def time_averages(self, start=0.0, end=None):
+        """Exact time averages over [start, end), keyed like Monitor.get_raw_data"""
+        data = self.rows()
+        end = self.hospital.env.now if end is None else end
+        first = max(np.searchsorted(data['time'], start, side='right') - 1, 0)
+        last = np.searchsorted(data['time'], end, side='left')
+        rows = data[first:last]
+        edges = np.clip(np.append(rows['time'], end), start, end)
+        weights = np.diff(edges)
+        return {name: np.dot(values, weights) / (end - start) for name, values in self._raw_data(rows).items()}
+
+
+if __name__ == "__main__":
+    from verify import traced_run
+
+    config = {
+        'num_prep_rooms': 3,
+        'num_recovery_rooms': 4,
+        'mean_interarrival_time': 25,
+        'mean_prep_time': 40,
+        'mean_operation_time': 20,
+        'mean_recovery_time': 40
+    }
+    trace = traced_run(config, seed=42, until=100000)
+    print(f"{trace.count} trace rows, {trace.rows().nbytes / 1e6:.1f} MB")
+    # Every check interval from one run
+    for interval in (1, 5, 25, 100):
+        raw_data = trace.resample(interval, start=1000)
+        print(f"Interval {interval:>3}: {len(raw_data['prep_queue'])} samples, "
+              f"mean prep queue {raw_data['prep_queue'].mean():.3f}")
+    print(f"Time average: {trace.time_averages(start=1000)['prep_queue']:.3f}")
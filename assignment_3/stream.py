@@ -1,17 +1,36 @@
+import math
 import random
 
 class Stream:
     """Random number stream wrapper"""
-    def __init__(self, type_name, *args):
+    def __init__(self, type_name, *args, rng=random):
         self.type = type_name
+        self.rng = rng
         if type_name == 'exp':
             self.p1 = args[0]
         elif type_name == 'unif':
             self.p1 = args[0] - args[1]
             self.p2 = args[0] + args[1]
-            
+        # Derivative of the log-likelihood of every draw with respect to the
+        # mean, kept over the whole run for likelihood-ratio gradients
+        self.score = 0.0
+        self.reset()
+
+    def reset(self):
+        """Reset sample statistics of the drawn values"""
+        self.count = 0
+        self.total = 0
+
     def new(self):
         if self.type == 'exp':
-            return random.expovariate(1/self.p1)
+            value = self.rng.expovariate(1/self.p1)
+            self.score += (value - self.p1) / self.p1 ** 2
         elif self.type == 'unif':
-            return random.uniform(self.p1, self.p2)
\ No newline at end of file
+            value = self.rng.uniform(self.p1, self.p2)
+        self.count += 1
+        self.total += value
+        return value
+
+    def sample_mean(self):
+        """Mean of the values drawn since the last reset, NaN if there were none"""
+        return self.total / self.count if self.count > 0 else math.nan
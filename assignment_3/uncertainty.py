@@ -0,0 +1,146 @@
+import time
+import numpy as np
+from scipy.stats import qmc
+from sim_run import run_configuration
+from results_cube import ResultsCube
+from pool import map_tasks
+
+
+def design_points(ranges, n_points, method='lhs', seed=42):
+    """
+    Space-filling sample of parameter vectors
+
+    Args:
+        ranges (dict): Config key to (low, high); low == high holds a parameter fixed
+        n_points (int): Number of points, a power of 2 suits Sobol
+        method (str): 'lhs' for a Latin hypercube, 'sobol' for a scrambled Sobol sequence
+        seed (int): Seed of the design
+
+    Returns:
+        list: Dicts of parameter values
+    """
+    names = list(ranges)
+    if method == 'lhs':
+        sampler = qmc.LatinHypercube(d=len(names), seed=seed)
+    elif method == 'sobol':
+        sampler = qmc.Sobol(d=len(names), scramble=True, seed=seed)
+    else:
+        raise ValueError(f"Unknown design method: {method}")
+    unit = sampler.random(n_points)
+    lows, highs = np.array([ranges[name] for name in names], dtype=float).T
+    # qmc.scale rejects a degenerate range (low == high), which fixes a parameter
+    scaled = lows + unit * (highs - lows)
+    return [dict(zip(names, row)) for row in scaled]
+
+
+def _run_point(task):
+    """Replications of one design point, as a single-point cube"""
+    config, seeds = task
+    return run_configuration(config, seeds).cube
+
+
+def run_campaign(base_config, points, replications, base_seed=42, n_workers=None):
+    """
+    Simulate every design point as one parallel campaign
+
+    Point i uses seeds base_seed + i * replications onward, so points are
+    independent and the variance decomposition below applies.
+
+    Args:
+        base_config (dict): Config the parameter values are applied to
+        points (list): Parameter dicts from design_points
+        replications (int): Replications per point
+        n_workers (int): Worker processes, as in pool.map_tasks
+
+    Returns:
+        dict: Points, the points x replications x metrics ResultsCube, and
+            a points x replications view per metric
+    """
+    tasks = [
+        ({**base_config, **point}, list(range(base_seed + i * replications, base_seed + (i + 1) * replications)))
+        for i, point in enumerate(points)
+    ]
+    start = time.time()
+    outputs = map_tasks(_run_point, tasks, n_workers)
+
+    cube = ResultsCube(len(points), replications, points=[list(point.values()) for point in points])
+    for i, output in enumerate(outputs):
+        cube.set_point(i, output)
+    return {
+        'points': points,
+        'cube': cube,
+        'values': {name: cube.metric(name) for name in cube.metrics},
+        'wall_time': time.time() - start
+    }
+
+
+def variance_decomposition(campaign, metric):
+    """
+    Split output variance into parameter and stochastic parts
+
+    One-way random-effects ANOVA over the design points: the stochastic
+    variance is the pooled within-point variance, and the parameter variance
+    is the variance of the point means less the part of it due to noise,
+    s^2_means - s^2_within / r. Per-parameter shares of the variance of the
+    point means come from squared standardized coefficients of a linear fit
+    on the parameters, which are first-order sensitivity indices when the
+    response is near linear. Parameters held fixed get a share of 0.
+
+    Returns:
+        dict: Mean, variance components, their fractions and parameter shares
+    """
+    values = campaign['values'][metric]
+    n_points, replications = values.shape
+    point_means = values.mean(axis=1)
+
+    within = values.var(axis=1, ddof=1).mean()
+    parameter = max(point_means.var(ddof=1) - within / replications, 0.0)
+    total = parameter + within
+
+    names = list(campaign['points'][0])
+    X = campaign['cube'].points.astype(float)
+    # A parameter with a degenerate range does not vary and explains nothing
+    spread = X.std(axis=0)
+    varying = spread > 0
+    X = (X[:, varying] - X[:, varying].mean(axis=0)) / spread[varying]
+    y = point_means - point_means.mean()
+    explained = np.zeros(len(names))
+    if point_means.var() > 0 and varying.any():
+        coefficients, *_ = np.linalg.lstsq(X, y, rcond=None)
+        explained[varying] = coefficients ** 2 / point_means.var()
+
+    return {
+        'mean': values.mean(),
+        'parameter_variance': parameter,
+        'stochastic_variance': within,
+        'parameter_fraction': parameter / total if total > 0 else 0.0,
+        'stochastic_fraction': within / total if total > 0 else 0.0,
+        'parameter_shares': dict(zip(names, explained))
+    }
+
+
+if __name__ == "__main__":
+    base_config = {
+        'num_prep_rooms': 3,
+        'num_recovery_rooms': 4,
+        'mean_interarrival_time': 25,
+        'check_interval': 5,
+        'warm_time': 1000,
+        'sim_time': 5000
+    }
+    # Service time means are estimates, uncertain to about +-15%
+    ranges = {
+        'mean_prep_time': (34, 46),
+        'mean_operation_time': (17, 23),
+        'mean_recovery_time': (34, 46)
+    }
+
+    for method in ('lhs', 'sobol'):
+        points = design_points(ranges, 32, method)
+        campaign = run_campaign(base_config, points, replications=5)
+        print(f"\n{method}: {len(points)} points x 5 replications in {campaign['wall_time']:.1f}s")
+        for metric in ('prep_queue_length', 'op_blocking_prob', 'recovery_full_prob'):
+            result = variance_decomposition(campaign, metric)
+            shares = ", ".join(f"{name}={share:.2f}" for name, share in result['parameter_shares'].items())
+            print(f"{metric}: mean {result['mean']:.4f}, parameter {result['parameter_fraction']:.0%}, "
+                  f"stochastic {result['stochastic_fraction']:.0%} ({shares})")
@@ -2,7 +2,8 @@ import random
 import numpy as np
 import simpy
 from hospital import HospitalSimulation
-from monitor import Monitor
+from monitor import raw_data_statistics
+from state_trace import StateTrace
 from scipy.stats import t, sem
 from collections import defaultdict
 
@@ -58,21 +59,27 @@ def verify_rates(config, seed, duration=10000):
     
     return results
 
-def verify_warmup(config, seed):
-    """Run a longer simulation to check warm-up period adequacy"""
+def traced_run(config, seed, until):
+    """One run of the hospital with a state trace that later analyses sample"""
     random.seed(seed)
     env = simpy.Environment()
     hospital = HospitalSimulation(env, config)
-    monitor = Monitor(config['check_interval'])
-    
     env.process(hospital.generate_patients())
-    env.process(monitor.run(hospital, env))
-    
-    # Run for 5x the current warm-up period
-    env.run(until=5 * config['warm_time'])
-    
-    # Get raw data
-    raw_data = monitor.get_raw_data()
+    trace = StateTrace(hospital)
+    trace.run(until)
+    return trace
+
+def verify_warmup(config, seed, trace=None):
+    """
+    Check warm-up period adequacy over 5x the current warm-up period
+
+    A trace from traced_run covering that period is sampled at the check
+    interval instead of simulating again.
+    """
+    horizon = 5 * config['warm_time']
+    if trace is None:
+        trace = traced_run(config, seed, horizon)
+    raw_data = trace.resample(config['check_interval'], 0, horizon)
     
     # Calculate moving averages with different window sizes
     windows = [50, 100, 200]
@@ -104,8 +111,13 @@ def verify_simulation(base_config):
         for metric, value in rates[service_type].items():
             print(f"{metric}: {value:.4f}")
     
+    # One run feeds both the warm-up and the extended analysis
+    extended_config = {**base_config, 'sim_time': 5000}
+    end = extended_config['warm_time'] + extended_config['sim_time']
+    trace = traced_run(base_config, seed, max(end, 5 * base_config['warm_time']))
+
     print("\n2. Warm-up Analysis:")
-    mas = verify_warmup(base_config, seed)
+    mas = verify_warmup(base_config, seed, trace)
     for window, metrics in mas.items():
         print(f"\nWindow size: {window}")
         for metric, values in metrics.items():
@@ -113,22 +125,8 @@ def verify_simulation(base_config):
             print(f"{metric} stabilizes around: {stabilized_mean:.4f}")
     
     print("\n3. Extended Run Analysis:")
-    extended_config = {**base_config, 'sim_time': 5000}
-    env = simpy.Environment()
-    hospital = HospitalSimulation(env, extended_config)
-    monitor = Monitor(extended_config['check_interval'])
-    
-    env.process(hospital.generate_patients())
-    env.process(monitor.run(hospital, env))
-    
-    # Run with warm-up
-    env.run(until=extended_config['warm_time'])
-    monitor.reset()
-    
-    # Main run
-    env.run(until=extended_config['warm_time'] + extended_config['sim_time'])
-    
-    stats = monitor.get_statistics()
+    raw_data = trace.resample(extended_config['check_interval'], extended_config['warm_time'], end)
+    stats = raw_data_statistics(raw_data)
     print("\nExtended simulation statistics:")
     for metric, values in stats.items():
         print(f"\n{metric}:")
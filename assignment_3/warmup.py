@@ -0,0 +1,141 @@
+import numpy as np
+from verify import traced_run
+from pool import map_tasks
+
+
+def welch_moving_average(series, window):
+    """
+    Welch's moving average with half-width window, in O(n) via cumulative sums
+
+    Point i averages series[i - window:i + window + 1]; the first window
+    points average the shorter symmetric span series[:2i + 1]. Points within
+    window of the end have no full span and are dropped.
+    """
+    series = np.asarray(series, dtype=float)
+    n = len(series) - window
+    if n <= 0:
+        return np.empty(0)
+    sums = np.concatenate(([0.0], np.cumsum(series)))
+    i = np.arange(n)
+    lo = np.where(i < window, 0, i - window)
+    hi = np.where(i < window, 2 * i + 1, i + window + 1)
+    return (sums[hi] - sums[lo]) / (hi - lo)
+
+
+def _replication_series(task):
+    """Monitor series of one replication, sampled from its state trace"""
+    config, seed, horizon = task
+    trace = traced_run(config, seed, horizon)
+    return trace.resample(config['check_interval'], 0, horizon)
+
+
+def ensemble_series(config, seeds, horizon=None, n_workers=None):
+    """
+    Monitor series averaged across replications
+
+    Args:
+        config (dict): Configuration to analyse
+        seeds (list): One replication per seed
+        horizon (float): Run length, 5x the warm-up period by default
+        n_workers (int): Worker processes, as in pool.map_tasks
+
+    Returns:
+        dict: Metric name to the mean series over replications
+    """
+    horizon = horizon or 5 * config['warm_time']
+    tasks = [(config, seed, horizon) for seed in seeds]
+    outputs = map_tasks(_replication_series, tasks, n_workers)
+    return {name: np.mean([output[name] for output in outputs], axis=0) for name in outputs[0]}
+
+
+def truncation_point(smoothed, rel_tol=0.05, max_outside=0.1):
+    """
+    First index after which a smoothed series stays near its steady level
+
+    The level is the mean of the second half of the series. The band around
+    it is rel_tol of the level, widened to twice the fluctuation of the
+    second half. The series counts as settled once it
+    has entered the band and no more than max_outside of the remaining
+    points leave it, so isolated late excursions do not push the point to
+    the end. A series whose trend moves it across the second half by more
+    than the band, or that never settles by this rule, has not settled.
+
+    Returns:
+        int: Truncation index, None if the series has not settled
+    """
+    half = smoothed[len(smoothed) // 2:]
+    if len(half) < 2:
+        return None
+    x = np.arange(len(half))
+    slope = np.polyfit(x, half, 1)[0]
+    level = half.mean()
+    band = max(rel_tol * abs(level), 2 * half.std())
+    if abs(slope) * len(half) > band:
+        return None
+    outside = np.abs(smoothed - level) > band
+    # Fraction of points from each index onward that are outside the band
+    remaining = np.cumsum(outside[::-1])[::-1] / np.arange(len(smoothed), 0, -1)
+    settled = remaining <= max_outside
+    if outside.all() or not settled.any():
+        return None
+    return int(max(np.argmax(~outside), np.argmax(settled)))
+
+
+def ensemble_warmup(config, seeds, windows=(10, 25, 50, 100), horizon=None, rel_tol=0.05, n_workers=None):
+    """
+    Welch's procedure on an ensemble of replications, for every metric
+
+    For each metric, the Welch averages for all windows are computed from
+    the replication-mean series. The smallest window whose second half
+    fluctuates by less than rel_tol of its level is taken as smooth enough
+    (the largest window if none is), and the truncation point is read from it.
+
+    Returns:
+        dict: Per metric, the smoothed series by window, the chosen window,
+            whether it settled, and the recommended truncation as a sample
+            index and a time (None when not settled)
+    """
+    means = ensemble_series(config, seeds, horizon, n_workers)
+    interval = config['check_interval']
+    report = {}
+    for name, series in means.items():
+        smoothed = {window: welch_moving_average(series, window) for window in windows}
+        chosen = windows[-1]
+        for window in windows:
+            half = smoothed[window][len(smoothed[window]) // 2:]
+            if len(half) > 0 and half.std() <= rel_tol * abs(half.mean()):
+                chosen = window
+                break
+        index = truncation_point(smoothed[chosen], rel_tol)
+        report[name] = {
+            'smoothed': smoothed,
+            'window': chosen,
+            'settled': index is not None,
+            'truncation_index': index,
+            'truncation_time': None if index is None else index * interval,
+            'level': smoothed[chosen][len(smoothed[chosen]) // 2:].mean()
+        }
+    return report
+
+
+if __name__ == "__main__":
+    config = {
+        'num_prep_rooms': 3,
+        'num_recovery_rooms': 4,
+        'mean_interarrival_time': 25,
+        'mean_prep_time': 40,
+        'mean_operation_time': 20,
+        'mean_recovery_time': 40,
+        'check_interval': 5,
+        'warm_time': 1000,
+        'sim_time': 1000
+    }
+    report = ensemble_warmup(config, list(range(42, 92)), horizon=20000)
+    print(f"Configured warm-up: {config['warm_time']}")
+    for name, result in report.items():
+        if not result['settled']:
+            print(f"{name:<17} window {result['window']:>3}, not settled within the horizon")
+            continue
+        verdict = 'ok' if result['truncation_time'] <= config['warm_time'] else 'TOO SHORT'
+        print(f"{name:<17} window {result['window']:>3}, truncate at {result['truncation_time']:>6.0f} "
+              f"(level {result['level']:.4f}) {verdict}")
@@ -5,15 +5,15 @@ import matplotlib.pyplot as plt
 import seaborn as sns
 
 class ExperimentAnalyzer:
-    def __init__(self, results):
-        self.results = results
+    def __init__(self, cube):
+        self.cube = cube
         self.factor_names = ['Arrival Rate', 'Arrival Dist', 'Prep Dist', 
                            'Recovery Dist', 'Prep Units', 'Recovery Units']
 
-    def create_effects_matrix(self):
+    def create_effects_matrix(self, metric='prep_queue_length'):
         """Create matrix of main effects and interactions"""
-        X = np.array([r['factors'] for r in self.results])
-        y = np.array([r['queue_length'] for r in self.results])
+        X = self.cube.points
+        y = self.cube.point_means(metric)
         return X, y
 
     def plot_main_effects(self):
@@ -0,0 +1,140 @@
+import time
+import simpy
+from collections import deque
+from simpy.core import BoundClass
+from simpy.resources.resource import Request, Resource, Preempted
+
+
+class ClassQueue:
+    """
+    Request queue with one FIFO bucket per priority class
+
+    Appending is O(1) and the head is found in O(classes), where the
+    SortedQueue of simpy.PriorityResource re-sorts a list on every request.
+    Class 0 is served first. Only the list operations SimPy uses are
+    provided; access past the head walks the buckets.
+    """
+    def __init__(self, n_classes):
+        self.buckets = [deque() for _ in range(n_classes)]
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def append(self, request):
+        self.buckets[request.rank].append(request)
+        self.size += 1
+
+    def _locate(self, index):
+        for bucket in self.buckets:
+            if index < len(bucket):
+                return bucket, index
+            index -= len(bucket)
+        raise IndexError("ClassQueue index out of range")
+
+    def __getitem__(self, index):
+        bucket, index = self._locate(index)
+        return bucket[index]
+
+    def pop(self, index=0):
+        bucket, index = self._locate(index)
+        self.size -= 1
+        if index == 0:
+            return bucket.popleft()
+        request = bucket[index]
+        del bucket[index]
+        return request
+
+    def remove(self, request):
+        self.buckets[request.rank].remove(request)
+        self.size -= 1
+
+    def lengths(self):
+        """Number of waiting requests in each class"""
+        return [len(bucket) for bucket in self.buckets]
+
+
+class ClassRequest(Request):
+    """Request of a priority class, 0 being the most urgent"""
+    def __init__(self, resource, rank):
+        self.rank = rank
+        self.time = resource._env.now
+        # Set by the holder while it may be interrupted
+        self.preemptible = False
+        super().__init__(resource)
+
+
+class ClassPriorityResource(Resource):
+    """
+    Resource serving requests by class, FIFO within a class
+
+    With preempt set, a request that finds every unit busy takes the unit of
+    the least urgent, most recent preemptible holder of a lower class, whose
+    process gets an Interrupt with a Preempted cause, as with
+    simpy.PreemptiveResource.
+    """
+    request = BoundClass(ClassRequest)
+
+    def __init__(self, env, capacity, n_classes, preempt=False):
+        super().__init__(env, capacity)
+        self.put_queue = ClassQueue(n_classes)
+        self.preempt = preempt
+
+    def _do_put(self, event):
+        if self.preempt and len(self.users) >= self.capacity:
+            candidates = [user for user in self.users if user.preemptible]
+            if candidates:
+                victim = max(candidates, key=lambda user: (user.rank, user.time))
+                if victim.rank > event.rank:
+                    self.users.remove(victim)
+                    victim.preemptible = False
+                    victim.proc.interrupt(Preempted(by=event.proc, usage_since=victim.usage_since, resource=self))
+        return super()._do_put(event)
+
+    def queue_lengths(self):
+        """Number of waiting requests in each class"""
+        return self.put_queue.lengths()
+
+
+if __name__ == "__main__":
+    # Queue a backlog of mixed classes behind one busy unit, then serve it
+    def serve_backlog(resource, request, size):
+        start = time.perf_counter()
+        current = request(0)
+        for i in range(size):
+            request(i % 3)
+        for _ in range(size):
+            resource.release(current)
+            resource._env.run()
+            current = resource.users[0]
+        return time.perf_counter() - start
+
+    for size in (1000, 5000, 10000):
+        resource = simpy.PriorityResource(simpy.Environment(), capacity=1)
+        sorted_time = serve_backlog(resource, lambda rank: resource.request(priority=rank), size)
+        resource = ClassPriorityResource(simpy.Environment(), capacity=1, n_classes=3)
+        bucket_time = serve_backlog(resource, resource.request, size)
+        print(f"Backlog {size}: PriorityResource {sorted_time:.3f}s, ClassPriorityResource {bucket_time:.3f}s")
+
+    # Emergency-mix scenario: waits by severity under each discipline
+    import random
+    from hospital import HospitalSimulation
+    from monitor import Monitor
+    from sim_run import create_config_from_factors
+
+    config = create_config_from_factors([0, 0, 0, 0, 0, 1])
+    config.update(mean_interarrival_time=23, severity_sampling='random')
+    for scheduling in (None, 'priority', 'preemptive'):
+        random.seed(42)
+        env = simpy.Environment()
+        hospital = HospitalSimulation(env, {**config, 'priority_scheduling': scheduling})
+        monitor = Monitor(config['check_interval'])
+        env.process(hospital.generate_patients())
+        env.process(monitor.run(hospital, env))
+        env.run(until=config['warm_time'])
+        monitor.reset()
+        env.run(until=config['warm_time'] + 50000)
+        waits = monitor.class_waiting_times()
+        print(f"\n{scheduling or 'fifo'}: mean wait by severity (prep / operation)")
+        for severity in ('high', 'medium', 'low'):
+            print(f"  {severity:<7} {waits[(severity, 'prep')]:7.1f} / {waits[(severity, 'operation')]:7.1f}")
@@ -1,5 +1,15 @@
 import random
 import simpy
+from patient import SeverityMix
+from class_queue import ClassPriorityResource
+
+# Stages of a patient's journey, in order
+JOURNEY_STAGES = ('waiting_prep', 'prep', 'blocked', 'waiting_operation',
+                  'operation', 'waiting_recovery', 'recovery')
+# Stages in which the patient holds a room
+HOLDING_STAGES = ('prep', 'operation', 'recovery')
+# Severity classes from most to least urgent, for priority scheduling
+PRIORITY_ORDER = ('high', 'medium', 'low')
 
 class HospitalSimulation:
     def __init__(self, env, config):
@@ -10,20 +20,48 @@ class HospitalSimulation:
         self.total_time = 0
         self.last_operation_start = 0
 
-        # Resources
-        self.prep_rooms = simpy.Resource(env, capacity=config['num_prep_rooms'])
-        self.operation_room = simpy.Resource(env, capacity=1)
+        # Resources, with prep and operating rooms served by severity under
+        # priority_scheduling 'priority' or 'preemptive'
+        scheduling = config.get('priority_scheduling')
+        if scheduling:
+            if scheduling not in ('priority', 'preemptive'):
+                raise ValueError(f"Unknown priority scheduling: {scheduling}")
+            if not config.get('severity_sampling'):
+                raise ValueError("Priority scheduling needs severity_sampling")
+            preempt = scheduling == 'preemptive'
+            self.prep_rooms = ClassPriorityResource(env, config['num_prep_rooms'], len(PRIORITY_ORDER), preempt)
+            self.operation_room = ClassPriorityResource(env, 1, len(PRIORITY_ORDER), preempt)
+        else:
+            self.prep_rooms = simpy.Resource(env, capacity=config['num_prep_rooms'])
+            self.operation_room = simpy.Resource(env, capacity=1)
         self.recovery_rooms = simpy.Resource(env, capacity=config['num_recovery_rooms'])
         
         # Statistics
         self.prep_queue = []
         self.operation_blocked = False
         self.recovery_full = False
+
+        # Patients currently in the system keyed by process, for snapshots
+        self.active_patients = {}
+        self.stage_order = 0
+        self.next_arrival = 0
+
+        # Severity classes of arriving patients, with the outcome of each
+        # departed patient as (severity, arrival, prep start, departure) and
+        # each completed wait for a room as (severity, stage, wait)
+        self.severity_mix = None
+        self.departures = []
+        self.waits = []
+        if config.get('severity_sampling'):
+            self.severity_mix = SeverityMix(
+                config['severity_distribution'], self, config['severity_sampling'],
+                config.get('severity_block_size', 20)
+            )
     
-    def generate_time(self, mean, dist_type='exp', min_val=None, max_val=None):
+    def generate_time(self, mean, dist_type='exp', min_val=None, max_val=None, rng=random):
         """Generate time based on distribution type"""
         if dist_type == 'exp':
-            return random.expovariate(1.0 / mean)
+            return rng.expovariate(1.0 / mean)
         elif dist_type == 'unif':
             # For uniform distribution, we use the provided min and max values
             # or calculate them to maintain the same mean
@@ -31,83 +69,272 @@ class HospitalSimulation:
                 # Default to ±25% of mean for uniform distribution
                 min_val = 0.75 * mean
                 max_val = 1.25 * mean
-            return random.uniform(min_val, max_val)
+            return rng.uniform(min_val, max_val)
         else:
             raise ValueError(f"Unknown distribution type: {dist_type}")
 
-    def generate_interarrival_time(self):
+    def generate_interarrival_time(self, rng=random):
         """Generate time between patient arrivals"""
         if self.config['arrival_dist'] == 'unif':
             if self.config['mean_interarrival_time'] == 25:
-                return self.generate_time(25, 'unif', 20, 30)
+                return self.generate_time(25, 'unif', 20, 30, rng)
             else:  # mean = 22.5
-                return self.generate_time(22.5, 'unif', 20, 25)
+                return self.generate_time(22.5, 'unif', 20, 25, rng)
         else:  # exponential
-            return self.generate_time(self.config['mean_interarrival_time'], 'exp')
+            return self.generate_time(self.config['mean_interarrival_time'], 'exp', rng=rng)
 
-    def generate_prep_time(self):
+    def generate_prep_time(self, rng=random):
         """Generate preparation time"""
         if self.config['prep_dist'] == 'unif':
-            return self.generate_time(40, 'unif', 30, 50)
+            return self.generate_time(40, 'unif', 30, 50, rng)
         else:  # exponential
-            return self.generate_time(40, 'exp')
+            return self.generate_time(40, 'exp', rng=rng)
 
-    def generate_operation_time(self):
+    def generate_operation_time(self, rng=random):
         """Generate operation time (always exponential)"""
-        return self.generate_time(self.config['mean_operation_time'], 'exp')
+        return self.generate_time(self.config['mean_operation_time'], 'exp', rng=rng)
 
-    def generate_recovery_time(self):
+    def generate_recovery_time(self, rng=random):
         """Generate recovery time"""
         if self.config['recovery_dist'] == 'unif':
-            return self.generate_time(40, 'unif', 30, 50)
+            return self.generate_time(40, 'unif', 30, 50, rng)
         else:  # exponential
-            return self.generate_time(40, 'exp')
+            return self.generate_time(40, 'exp', rng=rng)
+
+    def _service_time(self, stage, generate):
+        """Service time of the calling patient, pre-drawn for its severity if it has one"""
+        times = self.active_patients[self.env.active_process].get('times')
+        return generate() if times is None else times[stage]
+
+    def _track(self, stage, duration=None, keep_order=False):
+        """Record the stage of the calling patient, for snapshots"""
+        record = self.active_patients[self.env.active_process]
+        record['stage'] = stage
+        record['ends'] = None if duration is None else self.env.now + duration
+        if not keep_order:
+            record['order'] = self.stage_order
+            self.stage_order += 1
+
+    def _request(self, resource):
+        """Request a room, by the calling patient's severity class if the room has classes"""
+        if isinstance(resource, ClassPriorityResource):
+            severity = self.active_patients[self.env.active_process]['severity']
+            return resource.request(PRIORITY_ORDER.index(severity))
+        return resource.request()
+
+    def _serve(self, resource, request, duration, stage):
+        """
+        Hold a room for duration and return the request that holds it
+
+        A patient preempted by a more urgent one queues again and resumes its
+        remaining time when it gets a room back (preemptive resume).
+        """
+        record = self.active_patients[self.env.active_process]
+        while True:
+            self._track(stage, duration)
+            request.preemptible = True
+            start = self.env.now
+            try:
+                yield self.env.timeout(duration)
+                break
+            except simpy.Interrupt:
+                duration -= self.env.now - start
+                record['remaining'] = duration
+                self._track(f'waiting_{stage}')
+                queued = self.env.now
+                if stage == 'prep':
+                    self.prep_queue.append(record['arrival_time'])
+                request = self._request(resource)
+                yield request
+                if stage == 'prep':
+                    self.prep_queue.remove(record['arrival_time'])
+                record['wait'] = record.get('wait', 0) + self.env.now - queued
+                del record['remaining']
+        request.preemptible = False
+        wait = record.pop('wait', None)
+        if 'severity' in record and wait is not None:
+            self.waits.append((record['severity'], stage, wait))
+        return request
+
+    def drain_waits(self):
+        """Waits completed since the last call, as (severity, stage, wait)"""
+        waits, self.waits = self.waits, []
+        return waits
+
+    def patient_journey(self, stage='waiting_prep', residual=None, arrival_time=None, severity=None):
+        """Simulate a single patient's journey through the hospital
+
+        Patients restored from a snapshot start at ``stage`` with ``residual``
+        time left in their current activity, and with their severity record.
+        """
+        start = JOURNEY_STAGES.index(stage)
+        process = self.env.active_process
+        self.active_patients[process] = {'arrival_time': arrival_time}
+        if severity is not None:
+            self.active_patients[process].update(severity)
+        elif self.severity_mix is not None:
+            self.active_patients[process].update(self.severity_mix.next_patient())
 
-    def patient_journey(self):
-        """Simulate a single patient's journey through the hospital"""
-        # Record arrival and queue length
-        arrival_time = self.env.now
-        self.prep_queue.append(arrival_time)
-        
         # Preparation phase
-        with self.prep_rooms.request() as prep_req:
-            yield prep_req
-            self.prep_queue.remove(arrival_time)
-            yield self.env.timeout(self.generate_prep_time())
-        
+        if start <= 1:
+            prep_req = self._request(self.prep_rooms)
+            if start == 0:
+                # Record arrival and queue length
+                if arrival_time is None:
+                    arrival_time = self.env.now
+                    self.active_patients[process]['arrival_time'] = arrival_time
+                self.prep_queue.append(arrival_time)
+                self._track('waiting_prep')
+                # Restored patients have waited since arrival unless preempted
+                queued = arrival_time if residual is None else self.env.now
+                yield prep_req
+                self.prep_queue.remove(arrival_time)
+                if self.active_patients[process].get('prep_start') is None:
+                    self.active_patients[process]['prep_start'] = self.env.now
+                self.active_patients[process]['wait'] = self.env.now - queued
+                # Patients preempted before a snapshot resume their remaining time
+                duration = residual if residual is not None else self._service_time(0, self.generate_prep_time)
+            else:
+                yield prep_req
+                duration = residual
+            prep_req = yield from self._serve(self.prep_rooms, prep_req, duration, 'prep')
+            self.prep_rooms.release(prep_req)
+
         # Operation phase
-        with self.operation_room.request() as op_req:
+        if start <= 4:
+            op_req = self._request(self.operation_room)
+            queued = self.env.now
             # Check if recovery is full before starting operation
-            if self.recovery_rooms.count >= self.recovery_rooms.capacity:
-                self.operation_blocked = True
-                yield self.recovery_rooms.request()
+            # (restored patients take the blocking flags from the snapshot)
+            if start == 2 or (start <= 1 and self.recovery_rooms.count >= self.recovery_rooms.capacity):
+                if start <= 1:
+                    self.operation_blocked = True
+                self._track('blocked')
+                # Wait for a recovery room to free up, without keeping it
+                recovery_wait = self.recovery_rooms.request()
+                yield recovery_wait
+                self.recovery_rooms.release(recovery_wait)
                 self.operation_blocked = False
-            
+                self._track('waiting_operation', keep_order=True)
+            elif start != 4:
+                self._track('waiting_operation')
+
             yield op_req
-            yield self.env.timeout(self.generate_operation_time())
-        
+            if start <= 1:
+                self.active_patients[process]['wait'] = self.env.now - queued
+            if start >= 3 and residual is not None:
+                duration = residual
+            else:
+                duration = self._service_time(1, self.generate_operation_time)
+            op_req = yield from self._serve(self.operation_room, op_req, duration, 'operation')
+            self.operation_room.release(op_req)
+
         # Recovery phase
-        with self.recovery_rooms.request() as recovery_req:
-            if self.recovery_rooms.count >= self.recovery_rooms.capacity:
+        recovery_req = self.recovery_rooms.request()
+        if start <= 5:
+            if start <= 4 and self.recovery_rooms.count >= self.recovery_rooms.capacity:
                 self.recovery_full = True
+            self._track('waiting_recovery')
             yield recovery_req
             self.recovery_full = False
-            yield self.env.timeout(self.generate_recovery_time())
+            duration = self._service_time(2, self.generate_recovery_time)
+        else:
+            yield recovery_req
+            duration = residual
+        self._track('recovery', duration)
+        yield self.env.timeout(duration)
+        self.recovery_rooms.release(recovery_req)
+        record = self.active_patients.pop(process)
+        if 'severity' in record:
+            self.departures.append((record['severity'], record['arrival_time'],
+                                    record.get('prep_start'), self.env.now))
 
-    def generate_patients(self):
+    def generate_patients(self, first_arrival=None):
         """Generate new patients arriving at the hospital"""
+        if first_arrival is not None:
+            # Resume the arrival process of a restored snapshot
+            self.next_arrival = first_arrival
+            yield self.env.timeout(first_arrival - self.env.now)
         while True:
             # Create a new patient
             self.env.process(self.patient_journey())
-            
+
             # Wait for next patient
             interarrival_time = self.generate_interarrival_time()
+            self.next_arrival = self.env.now + interarrival_time
             yield self.env.timeout(interarrival_time)
 
+    def snapshot(self):
+        """
+        Capture the hospital state as a JSON-serializable dict
+
+        Includes every patient's stage and residual activity time, the time
+        of the next arrival, the blocking flags and the RNG state, plus the
+        severity records and sampler state when severity sampling is on.
+        """
+        patients = []
+        for record in self.active_patients.values():
+            if 'stage' not in record:
+                continue  # Created at this instant, not started yet
+            patient = {
+                'stage': record['stage'],
+                'residual': record.get('remaining') if record['ends'] is None else record['ends'] - self.env.now,
+                'arrival_time': record['arrival_time'],
+                'order': record['order']
+            }
+            if 'severity' in record:
+                patient['severity'] = {key: record.get(key) for key in ('severity', 'times', 'prep_start')}
+            patients.append(patient)
+        snapshot = {
+            'time': self.env.now,
+            'next_arrival': self.next_arrival,
+            'operation_blocked': self.operation_blocked,
+            'recovery_full': self.recovery_full,
+            'rng_state': random.getstate(),
+            'patients': patients
+        }
+        if self.severity_mix is not None:
+            snapshot['severity_mix'] = self.severity_mix.state()
+        return snapshot
+
+    def restore(self, snapshot, seed=None):
+        """
+        Start the patient and arrival processes from a snapshot
+
+        The environment must start at the snapshot time. With a seed the
+        restored run uses a fresh random sequence instead of the saved one.
+        """
+        self.operation_blocked = snapshot['operation_blocked']
+        self.recovery_full = snapshot['recovery_full']
+
+        # Room holders first, then queued patients in the order they queued
+        patients = sorted(
+            snapshot['patients'],
+            key=lambda p: (p['stage'] not in HOLDING_STAGES, p['order'])
+        )
+        for record in patients:
+            self.env.process(self.patient_journey(
+                record['stage'], record['residual'], record['arrival_time'], record.get('severity')
+            ))
+        if seed is None:
+            state = snapshot['rng_state']
+            random.setstate((state[0], tuple(state[1]), state[2]))
+            if self.severity_mix is not None:
+                self.severity_mix.set_state(snapshot['severity_mix'])
+        else:
+            random.seed(seed)
+            if self.severity_mix is not None:
+                self.severity_mix.reseed()
+        self.env.process(self.generate_patients(first_arrival=snapshot['next_arrival']))
+
     def get_current_queue_length(self):
         """Get current length of preparation queue"""
         return len(self.prep_queue)
 
+    def get_number_in_system(self):
+        """Get number of patients anywhere in the hospital"""
+        return len(self.active_patients)
+
     def is_operation_blocked(self):
         """Check if operation room is blocked"""
         return self.operation_blocked
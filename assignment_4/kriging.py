@@ -0,0 +1,209 @@
+import numpy as np
+from scipy.optimize import minimize
+from sim_run import run_configuration
+
+
+class StochasticKriging:
+    """
+    Stochastic kriging metamodel (Ankenman, Nelson and Staum, 2010)
+
+    The replication mean at x is modelled as beta0 + M(x) + noise, where M is
+    a Gaussian process with a Gaussian kernel tau^2 exp(-sum theta_j d_j^2)
+    and the noise at design point i has the known variance V_i / n_i, so
+    heteroscedastic simulation noise is smoothed rather than interpolated.
+    Inputs are scaled to the unit cube given by bounds.
+    """
+    def __init__(self, bounds):
+        self.bounds = np.asarray(bounds, dtype=float)
+
+    def _scale(self, X):
+        X = np.atleast_2d(np.asarray(X, dtype=float))
+        return (X - self.bounds[:, 0]) / (self.bounds[:, 1] - self.bounds[:, 0])
+
+    def _kernel(self, A, B, tau2, theta):
+        d2 = (A[:, None, :] - B[None, :, :]) ** 2
+        return tau2 * np.exp(-np.sum(theta * d2, axis=2))
+
+    def _profile(self, log_params):
+        """GLS fit of beta0 for given hyperparameters, with the negative log-likelihood"""
+        tau2, theta = np.exp(log_params[0]), np.exp(log_params[1:])
+        cov = self._kernel(self.X, self.X, tau2, theta) + np.diag(self.noise)
+        try:
+            chol = np.linalg.cholesky(cov)
+        except np.linalg.LinAlgError:
+            return None, np.inf
+        ones = np.ones(len(self.y))
+        solve = lambda b: np.linalg.solve(chol.T, np.linalg.solve(chol, b))
+        inv_ones = solve(ones)
+        beta0 = inv_ones @ self.y / (ones @ inv_ones)
+        residual = self.y - beta0
+        nll = 0.5 * residual @ solve(residual) + np.sum(np.log(np.diag(chol)))
+        return (beta0, chol, inv_ones), nll
+
+    def fit(self, X, means, variances, counts):
+        """
+        Fit to replication summaries at the design points
+
+        Args:
+            X (array): Design points, one row each
+            means (array): Replication means
+            variances (array): Replication sample variances
+            counts (array): Replications per point
+        """
+        self.X = self._scale(X)
+        self.y = np.asarray(means, dtype=float)
+        self.noise = np.asarray(variances, dtype=float) / np.asarray(counts)
+        self.noise = np.maximum(self.noise, 1e-10 * max(self.y.var(), 1e-10))
+
+        spread = max(self.y.var(), 1e-6)
+        starts = [np.concatenate(([np.log(spread)], np.full(self.X.shape[1], np.log(t))))
+                  for t in (1.0, 10.0, 100.0)]
+        best = None
+        for start in starts:
+            result = minimize(lambda p: self._profile(p)[1], start, method='Nelder-Mead',
+                              options={'maxiter': 2000, 'xatol': 1e-4, 'fatol': 1e-6})
+            if best is None or result.fun < best.fun:
+                best = result
+        self.tau2, self.theta = np.exp(best.x[0]), np.exp(best.x[1:])
+        (self.beta0, self.chol, self.inv_ones), _ = self._profile(best.x)
+        self.weights = self._solve(self.y - self.beta0)
+        return self
+
+    def _solve(self, b):
+        return np.linalg.solve(self.chol.T, np.linalg.solve(self.chol, b))
+
+    def predict(self, X):
+        """
+        Predicted mean response and its mean squared error
+
+        The MSE covers the uncertainty about the response surface, including
+        the estimation of beta0, but not the noise of a new replication.
+        """
+        k = self._kernel(self._scale(X), self.X, self.tau2, self.theta)
+        mean = self.beta0 + k @ self.weights
+        inv_k = self._solve(k.T)
+        correction = (1 - np.ones(len(self.y)) @ inv_k) ** 2 / (np.ones(len(self.y)) @ self.inv_ones)
+        mse = self.tau2 - np.sum(k.T * inv_k, axis=0) + correction
+        return mean, np.maximum(mse, 0.0)
+
+
+def simulate_point(base_config, point, seeds, metric='prep_queue_lengths'):
+    """
+    Replications of one parameter point, summarized as mean, variance and count
+
+    A single replication has no sample variance and reports 0, which pools
+    correctly into the variance of earlier replications of the point.
+    """
+    config = {**base_config, **point}
+    values = np.array(getattr(run_configuration(config, seeds), metric))
+    variance = values.var(ddof=1) if len(values) > 1 else 0.0
+    return values.mean(), variance, len(values)
+
+
+def sequential_design(base_config, ranges, budget, n_initial=5, n0=10, grid_size=200,
+                      base_seed=1000, metric='prep_queue_lengths'):
+    """
+    Build a stochastic kriging metamodel by sequential design
+
+    Starts from n_initial evenly spread points with n0 replications each.
+    Every step refits the metamodel and finds the candidate with the largest
+    predictive MSE. If that candidate lies within a quarter of the initial
+    spacing of an existing point, the uncertainty there is simulation noise,
+    so that point gets n0 more replications; otherwise the candidate is
+    added as a new point with n0 replications. Every point, initial or
+    added, is charged to the budget. A new point needs at least two
+    replications for its variance, so once fewer remain no points are added
+    and the rest go to the existing point nearest the candidate.
+
+    Args:
+        base_config (dict): Config the parameter values are applied to
+        ranges (dict): Config key to (low, high); a single key is searched on a grid
+        budget (int): Total replications
+        n_initial (int): Initial design points
+        n0 (int): Replications of a new point
+        grid_size (int): Candidate points per dimension
+
+    Returns:
+        tuple: (fitted StochasticKriging, design dict with points and summaries)
+    """
+    names = list(ranges)
+    bounds = [ranges[name] for name in names]
+    rng = np.random.default_rng(base_seed)
+    if len(names) == 1:
+        candidates = np.linspace(*bounds[0], grid_size)[:, None]
+        initial = np.linspace(*bounds[0], n_initial)[:, None]
+    else:
+        lows, highs = np.array(bounds).T
+        candidates = lows + rng.random((grid_size * len(names), len(names))) * (highs - lows)
+        initial = lows + rng.random((n_initial, len(names))) * (highs - lows)
+
+    next_seed = base_seed
+    design = {'points': [], 'means': [], 'variances': [], 'counts': []}
+
+    def replicate(index, n):
+        nonlocal next_seed
+        seeds = list(range(next_seed, next_seed + n))
+        next_seed += n
+        mean, variance, count = simulate_point(base_config, dict(zip(names, design['points'][index])), seeds, metric)
+        # Pool with earlier replications of the point
+        old_n, old_mean, old_var = design['counts'][index], design['means'][index], design['variances'][index]
+        total = old_n + count
+        pooled_mean = (old_n * old_mean + count * mean) / total
+        pooled_var = ((old_n - 1) * old_var + (count - 1) * variance
+                      + old_n * count / total * (old_mean - mean) ** 2) / (total - 1)
+        design['means'][index], design['variances'][index], design['counts'][index] = pooled_mean, pooled_var, total
+
+    def add_point(x, n):
+        design['points'].append(np.asarray(x, dtype=float))
+        design['means'].append(0.0)
+        design['variances'].append(0.0)
+        design['counts'].append(0)
+        replicate(len(design['points']) - 1, n)
+
+    if budget < 2 * n_initial:
+        raise ValueError(f"A budget of {budget} cannot give {n_initial} initial points two replications each")
+    # Initial points share the budget when n0 each would overrun it
+    initial_reps = min(n0, budget // n_initial)
+    for x in initial:
+        add_point(x, initial_reps)
+
+    scale = np.array([high - low for low, high in bounds])
+    radius = 0.25 / max(n_initial ** (1 / len(names)) - 1, 1)
+    model = StochasticKriging(bounds)
+    while True:
+        model.fit(design['points'], design['means'], design['variances'], design['counts'])
+        if sum(design['counts']) >= budget:
+            break
+        _, mse = model.predict(candidates)
+        x = candidates[np.argmax(mse)]
+        distances = np.linalg.norm((np.array(design['points']) - x) / scale, axis=1)
+        nearest = np.argmin(distances)
+        remaining = budget - sum(design['counts'])
+        if distances[nearest] < radius or remaining < 2:
+            replicate(nearest, min(n0, remaining))
+        else:
+            add_point(x, min(n0, remaining))
+
+    design['names'] = names
+    return model, design
+
+
+if __name__ == "__main__":
+    from sim_run import create_config_from_factors
+
+    base_config = create_config_from_factors([0, 0, 0, 0, 0, 1])
+    # Two prep rooms with mean 40 saturate as the mean interarrival time approaches 20
+    ranges = {'mean_interarrival_time': (21, 40)}
+
+    model, design = sequential_design(base_config, ranges, budget=300)
+    print(f"Design: {len(design['points'])} points, {sum(design['counts'])} replications")
+    for x, n, mean in sorted(zip((p[0] for p in design['points']), design['counts'], design['means'])):
+        print(f"  interarrival {x:6.2f}: {n:3d} replications, mean queue {mean:.3f}")
+
+    # What-if checks against fresh simulations
+    test_points = np.array([[21.5], [23.0], [26.0], [31.0], [37.0]])
+    predicted, mse = model.predict(test_points)
+    for x, mean, error in zip(test_points[:, 0], predicted, np.sqrt(mse)):
+        simulated, variance, n = simulate_point(base_config, {'mean_interarrival_time': x}, list(range(50)))
+        print(f"interarrival {x:.1f}: predicted {mean:.3f} +- {1.96 * error:.3f}, "
+              f"simulated {simulated:.3f} +- {1.96 * np.sqrt(variance / n):.3f}")
@@ -1,15 +1,32 @@
+import numpy as np
+import pandas as pd
+from hospital import PRIORITY_ORDER
+
+
 class Monitor:
     def __init__(self, check_interval):
         self.check_interval = check_interval
-        self.queue_length_history = []
         self.reset()
     
     def reset(self):
-        """Reset all counters"""
+        """Reset all counters and the series kept for warm-up and drift detection"""
+        self.queue_length_history = []
+        self.system_size_history = []
+        self.time_history = []
+        self.blocked_history = []
+        self.recovery_full_history = []
         self.queue_length_sum = 0
         self.operation_blocked_time = 0
         self.recovery_full_time = 0
+        self.prep_busy_sum = 0
+        self.operation_busy_sum = 0
+        self.recovery_busy_sum = 0
         self.num_checks = 0
+        # Per (severity, stage): completed waits and their total, and
+        # summed queue lengths for rooms served by class
+        self.class_wait_counts = {}
+        self.class_wait_sums = {}
+        self.class_queue_sums = {}
     
     def current_queue_length(self):
         """Get current queue length"""
@@ -19,14 +36,52 @@ class Monitor:
         """Monitor the hospital system"""
         while True:
             # Record current state
-            self.queue_length_sum += hospital.get_current_queue_length()
-            self.operation_blocked_time += 1 if hospital.is_operation_blocked() else 0
-            self.recovery_full_time += 1 if hospital.is_recovery_full() else 0
+            queue_length = hospital.get_current_queue_length()
+            self.queue_length_sum += queue_length
+            self.record_queue_length(queue_length)
+            self.system_size_history.append(hospital.get_number_in_system())
+            self.time_history.append(env.now)
+            blocked, recovery_full = hospital.is_operation_blocked(), hospital.is_recovery_full()
+            self.blocked_history.append(blocked)
+            self.recovery_full_history.append(recovery_full)
+            self.operation_blocked_time += 1 if blocked else 0
+            self.recovery_full_time += 1 if recovery_full else 0
+            self.prep_busy_sum += hospital.prep_rooms.count / hospital.prep_rooms.capacity
+            self.operation_busy_sum += (hospital.operation_room.count - blocked) / hospital.operation_room.capacity
+            self.recovery_busy_sum += hospital.recovery_rooms.count / hospital.recovery_rooms.capacity
+            self.record_class_statistics(hospital)
             self.num_checks += 1
             
             # Wait for next check
             yield env.timeout(self.check_interval)
 
+    def record_class_statistics(self, hospital):
+        """Collect completed waits and class queue lengths of a hospital with severities"""
+        for severity, stage, wait in hospital.drain_waits():
+            key = (severity, stage)
+            self.class_wait_counts[key] = self.class_wait_counts.get(key, 0) + 1
+            self.class_wait_sums[key] = self.class_wait_sums.get(key, 0) + wait
+        for stage, resource in (('prep', hospital.prep_rooms), ('operation', hospital.operation_room)):
+            if hasattr(resource, 'queue_lengths'):
+                for severity, length in zip(PRIORITY_ORDER, resource.queue_lengths()):
+                    key = (severity, stage)
+                    self.class_queue_sums[key] = self.class_queue_sums.get(key, 0) + length
+
+    def class_waiting_times(self):
+        """
+        Mean wait for a prep or operating room by severity, as {(severity, stage): mean}
+
+        Operation waits run from the end of prep, so they include blocking.
+        Waits completed since the last check are collected at the next one.
+        """
+        return {key: self.class_wait_sums[key] / count for key, count in self.class_wait_counts.items()}
+
+    def class_queue_lengths(self):
+        """Average queue length by severity for rooms served by class"""
+        if self.num_checks == 0:
+            return {}
+        return {key: total / self.num_checks for key, total in self.class_queue_sums.items()}
+
     def operation_blocking_probability(self):
         """Calculate the probability that operations were blocked"""
         return self.operation_blocked_time / self.num_checks if self.num_checks > 0 else 0
@@ -35,6 +90,18 @@ class Monitor:
         """Calculate the probability that recovery was full"""
         return self.recovery_full_time / self.num_checks if self.num_checks > 0 else 0
     
+    def prep_utilization(self):
+        """Calculate the fraction of prep rooms in use"""
+        return self.prep_busy_sum / self.num_checks if self.num_checks > 0 else 0
+
+    def operation_utilization(self):
+        """Calculate the fraction of operating rooms operating, not counting blocking"""
+        return self.operation_busy_sum / self.num_checks if self.num_checks > 0 else 0
+
+    def recovery_utilization(self):
+        """Calculate the fraction of recovery rooms in use"""
+        return self.recovery_busy_sum / self.num_checks if self.num_checks > 0 else 0
+    
     def get_results(self):
         """Get average results"""
         if self.num_checks == 0:
@@ -0,0 +1,269 @@
+import random
+import itertools
+import simpy
+import numpy as np
+from scipy.stats import t
+from hospital import HospitalSimulation
+from monitor import Monitor
+from overload import traffic_intensity
+
+
+def simulate_layout(config, num_prep_rooms, num_recovery_rooms, seed):
+    """
+    One replication of a room layout
+
+    Returns:
+        dict: Prep queue length, blocking probability and room utilizations
+    """
+    config = dict(config, num_prep_rooms=num_prep_rooms, num_recovery_rooms=num_recovery_rooms)
+    random.seed(seed)
+    env = simpy.Environment()
+    hospital = HospitalSimulation(env, config)
+    monitor = Monitor(config['check_interval'])
+    env.process(hospital.generate_patients())
+    env.process(monitor.run(hospital, env))
+
+    env.run(until=config['warm_time'])
+    monitor.reset()
+    env.run(until=config['warm_time'] + config['sim_time'])
+    return {
+        'prep_queue_length': monitor.current_queue_length(),
+        'op_blocking_prob': monitor.operation_blocking_probability(),
+        'prep_utilization': monitor.prep_utilization(),
+        'recovery_utilization': monitor.recovery_utilization(),
+        'op_utilization': monitor.operation_utilization()
+    }
+
+
+def ocba_allocation(means, stds, counts, budget):
+    """
+    Optimal computing budget allocation for selecting the smallest mean
+
+    Splits budget additional replications so that the total per design
+    approaches the OCBA ratios N_i / N_j = (s_i / d_i)^2 / (s_j / d_j)^2
+    for non-best designs, and N_b = s_b * sqrt(sum N_i^2 / s_i^2).
+
+    Args:
+        means (array): Sample means
+        stds (array): Sample standard deviations
+        counts (array): Replications done so far
+        budget (int): Replications to allocate
+
+    Returns:
+        np.ndarray: Additional replications per design
+    """
+    means = np.asarray(means, dtype=float)
+    counts = np.asarray(counts)
+    stds = np.maximum(np.asarray(stds, dtype=float), 1e-9)
+    k = len(means)
+    if k == 1:
+        return np.array([budget])
+
+    best = np.argmin(means)
+    gaps = np.maximum(means - means[best], 1e-9)
+    others = np.arange(k) != best
+    ratios = np.zeros(k)
+    ratios[others] = (stds[others] / gaps[others]) ** 2
+    ratios[best] = stds[best] * np.sqrt(np.sum(ratios[others] ** 2 / stds[others] ** 2))
+
+    # Designs already above their share keep what they have
+    active = np.ones(k, dtype=bool)
+    total = counts.sum() + budget
+    while True:
+        targets = np.zeros(k)
+        spare = total - counts[~active].sum()
+        targets[active] = spare * ratios[active] / ratios[active].sum()
+        over = active & (targets < counts)
+        if not over.any():
+            break
+        active &= ~over
+
+    extra = np.maximum(targets - counts, 0)
+    extra = np.floor(extra / extra.sum() * budget).astype(int) if extra.sum() > 0 else extra.astype(int)
+    # Round-off goes to the designs with the largest shortfall
+    shortfall = targets - counts - extra
+    for i in np.argsort(-shortfall)[:budget - extra.sum()]:
+        extra[i] += 1
+    return extra
+
+
+class RoomOptimizer:
+    """
+    Search for the cheapest room layout meeting utilization and blocking targets
+
+    Every replication of a layout is scored as room cost plus a penalty on
+    OR utilization below config['target_utilization'], the floor that
+    ExperimentAnalyzer.analyze_utilization checks, on prep or recovery
+    utilization above max_utilization and on OR blocking above
+    max_blocking, and the layout with the smallest mean score is sought.
+    Replication r of every layout uses seeds[r], so layouts are compared
+    under common random numbers, and all replications of a visited layout
+    are kept and reused.
+    """
+    def __init__(self, config, seeds, room_costs=None, max_blocking=0.05, max_utilization=0.8,
+                 penalty=100, bounds=((1, 10), (1, 10))):
+        self.config = config
+        self.seeds = seeds
+        self.room_costs = room_costs or {'prep': 1.0, 'recovery': 1.0}
+        self.max_blocking = max_blocking
+        self.max_utilization = max_utilization
+        self.penalty = penalty
+        self.bounds = bounds
+        self.observations = {}  # Layout to list of per-replication metrics
+        self.replications = 0
+
+    def cost(self, layout):
+        """Room cost of a layout"""
+        return self.room_costs['prep'] * layout[0] + self.room_costs['recovery'] * layout[1]
+
+    def is_stable(self, layout):
+        """Whether every stage can keep up with arrivals, without simulating"""
+        config = dict(self.config, num_prep_rooms=layout[0], num_recovery_rooms=layout[1])
+        return traffic_intensity(config)['stable']
+
+    def score(self, layout, metrics):
+        """Penalized cost of one replication"""
+        violation = (
+            max(self.config['target_utilization'] - metrics['op_utilization'], 0)
+            + max(metrics['prep_utilization'] - self.max_utilization, 0)
+            + max(metrics['recovery_utilization'] - self.max_utilization, 0)
+            + max(metrics['op_blocking_prob'] - self.max_blocking, 0)
+        )
+        return self.cost(layout) + self.penalty * violation
+
+    def evaluate(self, layout, n):
+        """Run n more replications of a layout"""
+        done = self.observations.setdefault(layout, [])
+        for seed in self.seeds[len(done):len(done) + n]:
+            done.append(simulate_layout(self.config, *layout, seed))
+            self.replications += 1
+
+    def scores(self, layout):
+        return np.array([self.score(layout, m) for m in self.observations.get(layout, [])])
+
+    def estimate(self, layout, confidence=0.95):
+        """Mean score of a layout with a confidence interval"""
+        scores = self.scores(layout)
+        mean = scores.mean()
+        if len(scores) < 2:
+            return mean, (np.nan, np.nan)
+        half = t.ppf((1 + confidence) / 2, len(scores) - 1) * scores.std(ddof=1) / np.sqrt(len(scores))
+        return mean, (mean - half, mean + half)
+
+    def neighbors(self, layout):
+        """Layouts one room away in either or both room types"""
+        result = []
+        for dp, dr in itertools.product((-1, 0, 1), repeat=2):
+            candidate = (layout[0] + dp, layout[1] + dr)
+            if candidate != layout and all(lo <= x <= hi for x, (lo, hi) in zip(candidate, self.bounds)):
+                result.append(candidate)
+        return result
+
+    def best(self):
+        """Visited layout with the smallest mean score"""
+        return min(self.observations, key=lambda layout: self.scores(layout).mean())
+
+    def search(self, start, n0=5, delta=10, max_replications=None, patience=3):
+        """
+        Stochastic neighborhood search with OCBA replication allocation
+
+        Each iteration simulates n0 replications of the unvisited stable
+        neighbours of the current best layout, then spreads delta more
+        replications over the visited layouts by OCBA and moves to the new
+        sample best. The search stops when the best layout has no unvisited
+        neighbours and has stayed the best for patience iterations, or when
+        the replication budget or the seeds run out.
+
+        Args:
+            start (tuple): Initial (num_prep_rooms, num_recovery_rooms)
+            n0 (int): Initial replications of a new layout
+            delta (int): Replications allocated by OCBA per iteration
+            max_replications (int): Total replication budget
+            patience (int): Iterations the best layout must survive
+
+        Returns:
+            dict: Best layout, its score and metrics, and the search effort
+        """
+        max_replications = max_replications or len(self.seeds) * 100
+        self.evaluate(start, n0)
+        current = start
+        unchanged = 0
+        history = []
+        while self.replications < max_replications and unchanged < patience:
+            new = [layout for layout in self.neighbors(current)
+                   if layout not in self.observations and self.is_stable(layout)]
+            for layout in new:
+                self.evaluate(layout, n0)
+
+            layouts = list(self.observations)
+            stats = [self.scores(layout) for layout in layouts]
+            extra = ocba_allocation(
+                [s.mean() for s in stats], [s.std(ddof=1) for s in stats],
+                [len(s) for s in stats], delta
+            )
+            for layout, n in zip(layouts, extra):
+                self.evaluate(layout, int(n))
+
+            best = self.best()
+            unchanged = unchanged + 1 if best == current and not new else 0
+            current = best
+            history.append((current, self.scores(current).mean(), self.replications))
+            if all(len(self.observations[layout]) >= len(self.seeds) for layout in layouts):
+                break
+
+        mean, ci = self.estimate(current)
+        metrics = self.observations[current]
+        return {
+            'layout': current,
+            'score': mean,
+            'score_ci': ci,
+            'cost': self.cost(current),
+            'metrics': {name: np.mean([m[name] for m in metrics]) for name in metrics[0]},
+            'replications': self.replications,
+            'layouts_visited': len(self.observations),
+            'history': history
+        }
+
+
+def grid_search(optimizer, n):
+    """Brute-force reference: n replications of every stable layout in the grid"""
+    (p_lo, p_hi), (r_lo, r_hi) = optimizer.bounds
+    for layout in itertools.product(range(p_lo, p_hi + 1), range(r_lo, r_hi + 1)):
+        if optimizer.is_stable(layout):
+            optimizer.evaluate(layout, n - len(optimizer.observations.get(layout, [])))
+    best = optimizer.best()
+    mean, ci = optimizer.estimate(best)
+    return {
+        'layout': best,
+        'score': mean,
+        'score_ci': ci,
+        'replications': optimizer.replications,
+        'layouts_visited': len(optimizer.observations)
+    }
+
+
+if __name__ == "__main__":
+    config = {
+        'mean_interarrival_time': 25,
+        'mean_operation_time': 20,
+        'arrival_dist': 'exp',
+        'prep_dist': 'exp',
+        'recovery_dist': 'exp',
+        'check_interval': 5,
+        'warm_time': 1000,
+        'sim_time': 5000,
+        'target_utilization': 0.8
+    }
+    seeds = list(range(42, 82))
+
+    optimizer = RoomOptimizer(config, seeds, room_costs={'prep': 1.0, 'recovery': 1.5})
+    result = optimizer.search(start=(6, 6))
+    print(f"Search: layout {result['layout']}, score {result['score']:.3f} "
+          f"({result['score_ci'][0]:.3f}, {result['score_ci'][1]:.3f})")
+    print(f"  {result['replications']} replications over {result['layouts_visited']} layouts")
+    for name, value in result['metrics'].items():
+        print(f"  {name}: {value:.4f}")
+
+    reference = grid_search(RoomOptimizer(config, seeds, room_costs={'prep': 1.0, 'recovery': 1.5}), 20)
+    print(f"Grid: layout {reference['layout']}, score {reference['score']:.3f}, "
+          f"{reference['replications']} replications over {reference['layouts_visited']} layouts")
@@ -0,0 +1,189 @@
+import numpy as np
+from scipy.stats import t
+
+# Prep and recovery means hard-coded in HospitalSimulation
+PREP_MEAN = 40
+RECOVERY_MEAN = 40
+
+
+def mean_interarrival_time(config):
+    """
+    Mean interarrival time actually simulated
+
+    HospitalSimulation.generate_interarrival_time draws uniform arrivals on
+    (20, 30) for a mean of 25 and on (20, 25) for any other mean.
+    """
+    if config['arrival_dist'] == 'unif':
+        return 25 if config['mean_interarrival_time'] == 25 else 22.5
+    return config['mean_interarrival_time']
+
+
+def traffic_intensity(config):
+    """
+    Traffic intensity rho = lambda * E[S] / servers of every stage
+
+    Stages are treated as a tandem line; a stage with rho >= 1 cannot keep
+    up with its arrivals and its queue grows without bound.
+
+    Returns:
+        dict: rho per stage, the bottleneck stage and whether all rho < 1
+    """
+    arrival_rate = 1.0 / mean_interarrival_time(config)
+    rho = {
+        'prep': arrival_rate * PREP_MEAN / config['num_prep_rooms'],
+        'operation': arrival_rate * config['mean_operation_time'],
+        'recovery': arrival_rate * RECOVERY_MEAN / config['num_recovery_rooms']
+    }
+    bottleneck = max(rho, key=rho.get)
+    return {
+        'rho': rho,
+        'bottleneck': bottleneck,
+        'stable': rho[bottleneck] < 1
+    }
+
+
+def fluid_growth_rates(config):
+    """
+    Queue growth rate of every stage in the fluid limit
+
+    Each stage passes on min(inflow, capacity), so only the first saturated
+    stage sees the full excess; later stages only see what it lets through.
+    """
+    inflow = 1.0 / mean_interarrival_time(config)
+    capacities = {
+        'prep': config['num_prep_rooms'] / PREP_MEAN,
+        'operation': 1.0 / config['mean_operation_time'],
+        'recovery': config['num_recovery_rooms'] / RECOVERY_MEAN
+    }
+    growth = {}
+    for stage, capacity in capacities.items():
+        growth[stage] = max(inflow - capacity, 0.0)
+        inflow = min(inflow, capacity)
+    growth['system'] = sum(growth.values())
+    return growth
+
+
+def drift_test(times, values, min_slope=0.0, n_batches=10, alpha=0.001):
+    """
+    One-sided test that a monitored series grows faster than min_slope
+
+    The series is cut into batches whose means are nearly independent, and
+    the slope of the batch means against time is tested with a t-test.
+
+    Args:
+        times (array): Observation times
+        values (array): Observed values
+        min_slope (float): Growth rate under the null hypothesis
+        n_batches (int): Number of batch means
+        alpha (float): Significance level
+
+    Returns:
+        dict: slope, intercept, std_err, p_value and whether the drift is significant
+    """
+    times = np.asarray(times, dtype=float)
+    values = np.asarray(values, dtype=float)
+    if len(values) < 2 * n_batches:
+        return {'slope': np.nan, 'intercept': np.nan, 'std_err': np.nan,
+                'p_value': 1.0, 'significant': False}
+
+    size = len(values) // n_batches
+    x = times[-size * n_batches:].reshape(n_batches, size).mean(axis=1)
+    y = values[-size * n_batches:].reshape(n_batches, size).mean(axis=1)
+
+    x_centered = x - x.mean()
+    slope = np.dot(x_centered, y - y.mean()) / np.dot(x_centered, x_centered)
+    intercept = y.mean() - slope * x.mean()
+    residuals = y - (intercept + slope * x)
+    std_err = np.sqrt(np.sum(residuals ** 2) / (n_batches - 2) / np.dot(x_centered, x_centered))
+
+    if std_err == 0:
+        p_value = 0.0 if slope > min_slope else 1.0
+    else:
+        p_value = t.sf((slope - min_slope) / std_err, n_batches - 2)
+    return {
+        'slope': slope,
+        'intercept': intercept,
+        'std_err': std_err,
+        'p_value': p_value,
+        'significant': bool(p_value < alpha)
+    }
+
+
+def fluid_extrapolation(slope, time, level, start, end):
+    """
+    Time-average over [start, end] of a queue at level at time growing at slope
+
+    The line is clipped at zero, as a queue cannot be negative.
+    """
+    grid = np.linspace(start, end, 201)
+    return float(np.mean(np.maximum(level + slope * (grid - time), 0.0)))
+
+
+def run_with_overload_detection(env, monitor, until, check_every, min_growth,
+                                alpha=0.001, confirmations=2):
+    """
+    Run the environment to until, stopping early on a growing system
+
+    Every check_every time units the number of patients in the system over
+    the second half of the Monitor's series, which starts at its last reset,
+    is tested for growth faster than min_growth; the first half is left out
+    so the fill-up from an empty hospital does not count as drift. Slow random swings of a stable system
+    in heavy traffic can pass a single test, so the run is only stopped after
+    the given number of consecutive significant tests.
+
+    Returns:
+        dict: The drift test of the last check, None if no check was made
+    """
+    test = None
+    streak = 0
+    while env.now < until:
+        env.run(until=min(env.now + check_every, until))
+        times = np.asarray(monitor.time_history)
+        recent = times >= (times[0] + times[-1]) / 2
+        test = drift_test(times[recent], np.asarray(monitor.system_size_history)[recent],
+                          min_slope=min_growth, alpha=alpha)
+        streak = streak + 1 if test['significant'] else 0
+        if streak >= confirmations:
+            break
+    return test
+
+
+def overload_report(config, monitor, start, end):
+    """
+    Growth rates and fluid extrapolation for an overloaded replication
+
+    Args:
+        start (float): Start of the measurement period
+        end (float): End of the measurement period
+
+    Returns:
+        dict: Estimated and fluid-model growth rates, and the prep queue length
+            averaged over the measurement period by extrapolating from its
+            recent mean at the fluid-model prep growth rate. The fitted slope
+            is only reported as a check, as a few batch means give a noisy
+            estimate. A prep queue the fluid model does not grow is not the
+            bottleneck, and its recent mean is reported instead. The blocking
+            probabilities are over the same second half of the Monitor's
+            series, so a run stopped during warm-up does not report the
+            fill-up from an empty hospital.
+    """
+    times = np.asarray(monitor.time_history)
+    recent = times >= (times[0] + times[-1]) / 2
+    queue = np.asarray(monitor.queue_length_history)[recent]
+    queue_fit = drift_test(times[recent], queue)
+    system_fit = drift_test(times[recent], np.asarray(monitor.system_size_history)[recent])
+    growth = fluid_growth_rates(config)
+    if growth['prep'] > 0:
+        queue_length = fluid_extrapolation(growth['prep'], times[recent].mean(), queue.mean(), start, end)
+    else:
+        queue_length = float(np.mean(queue))
+    return {
+        'stopped_at': float(times[-1]),
+        'queue_growth_rate': queue_fit['slope'],
+        'queue_growth_std_err': queue_fit['std_err'],
+        'system_growth_rate': system_fit['slope'],
+        'fluid_growth_rates': growth,
+        'prep_queue_length': queue_length,
+        'op_blocking_prob': float(np.mean(np.asarray(monitor.blocked_history)[recent])),
+        'recovery_full_prob': float(np.mean(np.asarray(monitor.recovery_full_history)[recent]))
+    }
@@ -1,3 +1,4 @@
+import random
 from dataclasses import dataclass
 from enum import Enum
 
@@ -8,6 +9,13 @@ class Severity(Enum):
     MEDIUM = 'medium'
     HIGH = 'high'
 
+# Service time multiplier of each severity class
+SEVERITY_MULTIPLIERS = {
+    Severity.LOW: 0.8,
+    Severity.MEDIUM: 1.0,
+    Severity.HIGH: 1.3
+}
+
 @dataclass
 class Patient:
     """Patient with service times and severity"""
@@ -20,15 +28,84 @@ class Patient:
 
     def adjust_service_times(self):
         """Adjust service times based on patient severity"""
-        multipliers = {
-            Severity.LOW: 0.8,
-            Severity.MEDIUM: 1.0,
-            Severity.HIGH: 1.3
-        }
-        multiplier = multipliers[self.severity]
+        multiplier = SEVERITY_MULTIPLIERS[self.severity]
         
         self.prep_time *= multiplier
         self.operation_time *= multiplier
         self.recovery_time *= multiplier
 
 
+class SeverityMix:
+    """
+    Severity classes and service times of arriving patients
+
+    With method 'random' each class is drawn independently from the
+    distribution. With 'stratified' every block of block_size arrivals holds
+    the classes in proportion to the distribution (largest-remainder
+    rounding) in random order, so the case mix of a run never strays from
+    the target. Service times are drawn a block at a time per class from a
+    generator of that class, seeded from rng, and scaled by the class
+    multiplier, so the k-th patient of a class gets the same times under
+    either method.
+    """
+    def __init__(self, distribution, hospital, method='random', block_size=20, rng=random):
+        if method not in ('random', 'stratified'):
+            raise ValueError(f"Unknown severity sampling method: {method}")
+        self.classes = [Severity(severity).value for severity in distribution]
+        self.probabilities = list(distribution.values())
+        self.hospital = hospital
+        self.method = method
+        self.block_size = block_size
+        self.rng = rng
+        self.reseed()
+
+    def reseed(self):
+        """Discard pending blocks and seed the class generators afresh from rng"""
+        self.class_block = []
+        self.time_blocks = {severity: [] for severity in self.classes}
+        self.class_rngs = {severity: random.Random(self.rng.getrandbits(64)) for severity in self.classes}
+
+    def _fill_classes(self):
+        if self.method == 'random':
+            self.class_block = self.rng.choices(self.classes, self.probabilities, k=self.block_size)
+            return
+        quotas = [p * self.block_size / sum(self.probabilities) for p in self.probabilities]
+        counts = [int(quota) for quota in quotas]
+        by_remainder = sorted(range(len(quotas)), key=lambda i: counts[i] - quotas[i])
+        for i in by_remainder[:self.block_size - sum(counts)]:
+            counts[i] += 1
+        self.class_block = [severity for severity, count in zip(self.classes, counts) for _ in range(count)]
+        self.rng.shuffle(self.class_block)
+
+    def _fill_times(self, severity):
+        rng = self.class_rngs[severity]
+        multiplier = SEVERITY_MULTIPLIERS[Severity(severity)]
+        self.time_blocks[severity] = [
+            [multiplier * self.hospital.generate_prep_time(rng),
+             multiplier * self.hospital.generate_operation_time(rng),
+             multiplier * self.hospital.generate_recovery_time(rng)]
+            for _ in range(self.block_size)
+        ]
+
+    def next_patient(self):
+        """Severity and (prep, operation, recovery) times of the next arrival"""
+        if not self.class_block:
+            self._fill_classes()
+        severity = self.class_block.pop(0)
+        if not self.time_blocks[severity]:
+            self._fill_times(severity)
+        return {'severity': severity, 'times': self.time_blocks[severity].pop(0)}
+
+    def state(self):
+        """JSON-serializable pending blocks and generator states, for snapshots"""
+        return {
+            'class_block': list(self.class_block),
+            'time_blocks': {severity: [list(times) for times in block] for severity, block in self.time_blocks.items()},
+            'rng_states': {severity: rng.getstate() for severity, rng in self.class_rngs.items()}
+        }
+
+    def set_state(self, state):
+        self.class_block = list(state['class_block'])
+        self.time_blocks = {severity: [list(times) for times in block] for severity, block in state['time_blocks'].items()}
+        for severity, (version, internal, gauss) in state['rng_states'].items():
+            self.class_rngs[severity].setstate((version, tuple(internal), gauss))
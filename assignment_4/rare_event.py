@@ -0,0 +1,210 @@
+import math
+import random
+import simpy
+import numpy as np
+from hospital import HospitalSimulation
+
+# Recovery time parameters hard-coded in HospitalSimulation.generate_recovery_time
+RECOVERY_MEAN = 40
+RECOVERY_BOUNDS = (30, 50)
+
+
+class TwistedHospitalSimulation(HospitalSimulation):
+    """
+    Hospital with exponentially twisted recovery times
+
+    Recovery times are drawn from g(x) = f(x) * exp(theta * x) / M(theta),
+    which stretches them and makes a full recovery unit common. Every draw
+    multiplies the likelihood ratio f/g = M(theta) * exp(-theta * x) of the
+    current regenerative cycle, which restarts whenever a patient arrives to
+    an empty hospital.
+
+    The twist is given in units of the recovery mean, so twist=0 reproduces
+    the original model and twist must stay below 1 for exponential recovery.
+    """
+    def __init__(self, env, config, twist):
+        super().__init__(env, config)
+        self.theta = twist / RECOVERY_MEAN
+        self.log_mgf = self._log_mgf()
+
+        # Regenerative cycle tracking
+        self.in_system = 0
+        self.cycle_index = -1
+        self.cycle_log_lr = 0.0
+
+    def _log_mgf(self):
+        """Log moment generating function of the recovery time at theta"""
+        theta = self.theta
+        if theta == 0:
+            return 0.0
+        if self.config['recovery_dist'] == 'unif':
+            a, b = RECOVERY_BOUNDS
+            return math.log((math.exp(theta * b) - math.exp(theta * a)) / (theta * (b - a)))
+        rate = 1.0 / RECOVERY_MEAN
+        if theta >= rate:
+            raise ValueError("twist must be below 1 for exponential recovery times")
+        return math.log(rate / (rate - theta))
+
+    def generate_recovery_time(self):
+        """Generate a twisted recovery time and update the likelihood ratio"""
+        theta = self.theta
+        if theta == 0:
+            return super().generate_recovery_time()
+
+        if self.config['recovery_dist'] == 'unif':
+            # Inversion of the exponentially tilted uniform distribution
+            a, b = RECOVERY_BOUNDS
+            u = random.random()
+            x = math.log(math.exp(theta * a) + u * (math.exp(theta * b) - math.exp(theta * a))) / theta
+        else:
+            x = random.expovariate(1.0 / RECOVERY_MEAN - theta)
+
+        self.cycle_log_lr += self.log_mgf - theta * x
+        return x
+
+    def patient_journey(self, *args):
+        """Track occupancy so arrivals to an empty hospital start a new cycle"""
+        if self.in_system == 0:
+            self.cycle_index += 1
+            self.cycle_log_lr = 0.0
+        self.in_system += 1
+        yield from super().patient_journey(*args)
+        self.in_system -= 1
+
+
+class CycleRecorder:
+    """Likelihood-ratio weighted samples accumulated per regenerative cycle"""
+    def __init__(self, check_interval):
+        self.check_interval = check_interval
+        self.weights = []
+        self.blocked = []
+        self.full = []
+
+    def run(self, hospital, env):
+        """Sample blocking state at regular intervals"""
+        while True:
+            if hospital.cycle_index >= 0:
+                while len(self.weights) <= hospital.cycle_index:
+                    self.weights.append(0.0)
+                    self.blocked.append(0.0)
+                    self.full.append(0.0)
+
+                c = hospital.cycle_index
+                weight = math.exp(hospital.cycle_log_lr)
+                self.weights[c] += weight
+                self.blocked[c] += weight if hospital.is_operation_blocked() else 0
+                self.full[c] += weight if hospital.is_recovery_full() else 0
+
+            yield env.timeout(self.check_interval)
+
+    def completed_cycles(self):
+        """Per-cycle sums, dropping the cycle cut off by the end of the run"""
+        return (
+            np.array(self.weights[:-1]),
+            np.array(self.blocked[:-1]),
+            np.array(self.full[:-1])
+        )
+
+
+def _ratio_estimate(numerators, denominators):
+    """Regenerative ratio estimator with its delta-method standard error"""
+    n = len(denominators)
+    if n < 2 or np.sum(denominators) == 0:
+        return 0.0, np.nan, np.nan
+
+    estimate = np.sum(numerators) / np.sum(denominators)
+    residuals = numerators - estimate * denominators
+    std_err = np.std(residuals, ddof=1) / (np.mean(denominators) * np.sqrt(n))
+    relative_error = std_err / estimate if estimate > 0 else np.nan
+    return estimate, std_err, relative_error
+
+
+def run_rare_event(config, seeds, twist=0.5, run_time=None):
+    """
+    Estimate OR blocking and recovery-full probabilities by importance sampling
+
+    Each seed runs one long twisted simulation. Sampled indicators are
+    weighted by the likelihood ratio of their regenerative cycle and
+    combined with the regenerative ratio estimator, which is consistent
+    for the untwisted probabilities (bias vanishes with the number of
+    cycles). No warm-up is needed since cycles start from an empty system.
+
+    Args:
+        config (dict): Configuration from create_config_from_factors
+        seeds (list): Random seeds, one run per seed
+        twist (float): Recovery time twist in units of the recovery mean
+        run_time (float): Length of each run, defaults to warm_time + sim_time
+
+    Returns:
+        dict: Estimates with standard errors, relative errors and cycle count
+    """
+    if run_time is None:
+        run_time = config['warm_time'] + config['sim_time']
+
+    weights, blocked, full = [], [], []
+    for seed in seeds:
+        random.seed(seed)
+        env = simpy.Environment()
+        hospital = TwistedHospitalSimulation(env, config, twist)
+        recorder = CycleRecorder(config['check_interval'])
+
+        env.process(hospital.generate_patients())
+        env.process(recorder.run(hospital, env))
+        env.run(until=run_time)
+
+        w, b, f = recorder.completed_cycles()
+        weights.append(w)
+        blocked.append(b)
+        full.append(f)
+
+    weights = np.concatenate(weights)
+    blocked = np.concatenate(blocked)
+    full = np.concatenate(full)
+
+    blocking_prob, blocking_se, blocking_re = _ratio_estimate(blocked, weights)
+    full_prob, full_se, full_re = _ratio_estimate(full, weights)
+
+    return {
+        'blocking_probability': blocking_prob,
+        'blocking_std_err': blocking_se,
+        'blocking_relative_error': blocking_re,
+        'recovery_full_probability': full_prob,
+        'recovery_full_std_err': full_se,
+        'recovery_full_relative_error': full_re,
+        'cycles': len(weights),
+        'twist': twist
+    }
+
+
+def select_twist(config, seeds, candidates=(0.2, 0.4, 0.6, 0.8), run_time=None,
+                 metric='blocking_relative_error'):
+    """
+    Pick the twist with the smallest relative error from short pilot runs
+
+    Returns:
+        tuple: (best twist, dict of pilot results by twist)
+    """
+    pilots = {twist: run_rare_event(config, seeds, twist, run_time) for twist in candidates}
+    finite = {twist: r for twist, r in pilots.items() if np.isfinite(r[metric])}
+    if not finite:
+        return candidates[0], pilots
+    best = min(finite, key=lambda twist: finite[twist][metric])
+    return best, pilots
+
+
+if __name__ == "__main__":
+    from sim_run import create_config_from_factors
+
+    # Low arrival rate with 7 prep and 7 recovery rooms
+    config = create_config_from_factors([0, 0, 0, 0, 1, 1])
+    seeds = list(range(42, 52))
+
+    print("Selecting twist from pilot runs...")
+    twist, pilots = select_twist(config, seeds[:3], run_time=20000)
+    for candidate, pilot in pilots.items():
+        print(f"twist {candidate}: relative error {pilot['blocking_relative_error']:.4f}")
+
+    print(f"\nRare-event estimates with twist {twist}:")
+    results = run_rare_event(config, seeds, twist, run_time=100000)
+    for metric, value in results.items():
+        print(f"{metric}: {value:.6g}")
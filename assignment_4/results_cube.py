@@ -0,0 +1,117 @@
+# assignment_3 and assignment_4 are run as separate script directories and
+# import their modules by name, so each holds this file; keep them identical
+import numpy as np
+
+# Per-run metadata every cube records, besides any a caller adds
+RUN_METADATA = ('wall_time', 'warm_time')
+
+
+class ResultsCube:
+    """
+    Replication results as one design point x replication x metric array
+
+    Values live in a single C-contiguous float array, allocated for the whole
+    experiment and filled in place as runs finish; unrecorded entries are NaN.
+    Per-run metadata such as wall time and warm-up length are points x
+    replications arrays alongside. metric(), point() and by_replication()
+    return views, so analysis code reads the array without copying it or
+    rebuilding it from lists of dicts.
+
+    Without metrics, the metric axis is fixed by the first recorded run, for
+    metric sets only known once a run has finished.
+    """
+    def __init__(self, n_points, n_reps, metrics=None, points=None):
+        self.shape = (n_points, n_reps)
+        self.points = np.arange(n_points)[:, None] if points is None else np.asarray(points)
+        self.metadata = {name: np.full(self.shape, np.nan) for name in RUN_METADATA}
+        self.metrics = ()
+        self.index = {}
+        self.values = None
+        if metrics is not None:
+            self._allocate(metrics)
+
+    def _allocate(self, metrics):
+        self.metrics = tuple(metrics)
+        self.index = {name: j for j, name in enumerate(self.metrics)}
+        self.values = np.full(self.shape + (len(self.metrics),), np.nan)
+
+    def _metadata(self, name):
+        if name not in self.metadata:
+            self.metadata[name] = np.full(self.shape, np.nan)
+        return self.metadata[name]
+
+    def record(self, point, rep, metrics, **metadata):
+        """Store the metric dict and metadata of one run"""
+        if self.values is None:
+            self._allocate(metrics)
+        row = self.values[point, rep]
+        for name, value in metrics.items():
+            row[self.index[name]] = value
+        for name, value in metadata.items():
+            self._metadata(name)[point, rep] = value
+
+    def set_point(self, point, cube):
+        """Copy the single-point cube of a run_configuration call into a point"""
+        if self.values is None:
+            self._allocate(cube.metrics)
+        self.values[point] = cube.select(self.metrics)[0]
+        for name, values in cube.metadata.items():
+            self._metadata(name)[point] = values[0]
+
+    def metric(self, name):
+        """Points x replications view of one metric"""
+        return self.values[..., self.index[name]]
+
+    def point(self, point):
+        """Replications x metrics view of one design point"""
+        return self.values[point]
+
+    def select(self, metrics):
+        """
+        Values of some metrics, in the given order
+
+        A view when the metrics are adjacent and in cube order, which the
+        leading metrics of every run are; a copy otherwise.
+        """
+        columns = [self.index[name] for name in metrics]
+        first = columns[0] if columns else 0
+        if columns == list(range(first, first + len(columns))):
+            return self.values[..., first:first + len(columns)]
+        return self.values[..., columns]
+
+    def by_replication(self, metrics=None):
+        """Replications x points x metrics view, the layout of comparison.py"""
+        values = self.values if metrics is None else self.select(metrics)
+        return values.transpose(1, 0, 2)
+
+    def point_means(self, name):
+        """Mean of a metric at each design point"""
+        return self.metric(name).mean(axis=1)
+
+
+if __name__ == "__main__":
+    import time
+
+    # Analysis of 10^5 replications of 8 design points: per-point means of
+    # every metric, from a list of per-run dicts and from a cube
+    metrics = ('prep_queue_length', 'op_blocking_prob', 'recovery_full_prob')
+    n_points, n_reps = 8, 100_000
+    rng = np.random.default_rng(42)
+    draws = rng.random((n_points, n_reps, len(metrics)))
+
+    runs = [[dict(zip(metrics, draws[i, r])) for r in range(n_reps)] for i in range(n_points)]
+    start = time.perf_counter()
+    list_means = {name: np.array([[run[name] for run in point] for point in runs]).mean(axis=1)
+                  for name in metrics}
+    list_time = time.perf_counter() - start
+
+    cube = ResultsCube(n_points, n_reps, metrics)
+    cube.values[:] = draws
+    start = time.perf_counter()
+    cube_means = {name: cube.point_means(name) for name in metrics}
+    cube_time = time.perf_counter() - start
+
+    same = all(np.allclose(list_means[name], cube_means[name]) for name in metrics)
+    print(f"{n_points} points x {n_reps} replications: lists of dicts {list_time:.3f}s, "
+          f"cube {cube_time:.4f}s, same means: {same}")
+    print(f"Comparison layout shares memory with the cube: {np.shares_memory(cube.by_replication(), cube.values)}")
@@ -0,0 +1,122 @@
+import numpy as np
+from scipy.stats import t
+from sim_run import create_config_from_factors, run_configuration
+
+# Factors of create_config_from_factors that are screened, as (name,
+# position in the factor vector, bit that adds congestion), since sequential
+# bifurcation needs known signs. B (arrival distribution) is left out and
+# held at exponential: the uniform branch of generate_interarrival_time
+# ignores the arrival rate, so switching B adds or removes congestion
+# depending on A and its sign is not known.
+FACTORIAL_FACTORS = [
+    ('A: arrival rate', 0, 1),        # Mean interarrival 10 instead of 40
+    ('C: prep dist', 2, 0),           # Exponential instead of uniform prep times
+    ('D: recovery dist', 3, 0),       # Exponential instead of uniform recovery times
+    ('E: prep units', 4, 0),          # 2 instead of 7 prep rooms
+    ('F: recovery units', 5, 0)       # 2 instead of 7 recovery rooms
+]
+
+
+def build_config(high, extra_factors=()):
+    """
+    Config with the given factors at their high level and the rest low
+
+    Args:
+        high (set): Indices of factors at their high level; the first ones are
+            FACTORIAL_FACTORS, the rest index extra_factors
+        extra_factors (list): (name, config key, low value, high value)
+    """
+    bits = [0] * 6
+    for i, (_, position, bit) in enumerate(FACTORIAL_FACTORS):
+        bits[position] = bit if i in high else 1 - bit
+    config = create_config_from_factors(bits)
+    for i, (_, key, low, high_value) in enumerate(extra_factors, start=len(FACTORIAL_FACTORS)):
+        config[key] = high_value if i in high else low
+    return config
+
+
+def sequential_bifurcation(n_factors, response, seeds, threshold, alpha=0.05):
+    """
+    Sequential bifurcation screening with replicated, paired tests
+
+    Factors are oriented so every effect is non-negative. y(k) is the response
+    with factors 0..k-1 high and the rest low, so the summed effect of the
+    group k1..k2-1 is y(k2) - y(k1). All y(k) use the same seeds, so each
+    group effect is estimated from paired replications. A group is important
+    when a one-sided t-test shows its effect exceeds threshold; important
+    groups are split in two and the halves tested in turn, unimportant ones
+    are dropped with all their factors. Only y(k) at the group boundaries
+    visited are ever simulated. With interactions, a factor's effect is
+    measured with the factors before it high, so the order matters.
+
+    Args:
+        n_factors (int): Number of factors
+        response (callable): Takes a set of high factor indices and the seeds,
+            returns the per-replication responses
+        seeds (list): Replication seeds
+        threshold (float): Smallest effect worth detecting
+        alpha (float): Significance level of each group test
+
+    Returns:
+        dict: Important factors with their effect estimates, the groups tested
+            and the number of simulated design points and replications
+    """
+    cache = {}
+
+    def y(k):
+        if k not in cache:
+            cache[k] = np.asarray(response(set(range(k)), seeds), dtype=float)
+        return cache[k]
+
+    n = len(seeds)
+    t_val = t.ppf(1 - alpha, n - 1)
+    important = {}
+    tested = []
+    groups = [(0, n_factors)]
+    while groups:
+        lo, hi = groups.pop()
+        differences = y(hi) - y(lo)
+        effect = differences.mean()
+        lower = effect - t_val * differences.std(ddof=1) / np.sqrt(n)
+        is_important = bool(lower > threshold)
+        tested.append({'group': (lo, hi), 'effect': effect, 'lower_bound': lower, 'important': is_important})
+        if not is_important:
+            continue
+        if hi - lo == 1:
+            important[lo] = effect
+        else:
+            mid = (lo + hi) // 2
+            groups.extend([(mid, hi), (lo, mid)])
+
+    return {
+        'important': important,
+        'tested': tested,
+        'design_points': len(cache),
+        'replications': len(cache) * n
+    }
+
+
+if __name__ == "__main__":
+    # Candidate factors beyond those of the factorial study. The synthetic
+    # ones are config keys the model never reads, added only to show how the
+    # number of design points grows with many inert factors; they are not
+    # settings of the hospital.
+    extra_factors = [('operation time', 'mean_operation_time', 20, 22)]
+    extra_factors += [(f'synthetic inert {i}', f'synthetic_inert_{i}', 0, 1) for i in range(37)]
+    names = [name for name, *_ in FACTORIAL_FACTORS] + [name for name, *_ in extra_factors]
+
+    def response(metric):
+        def simulate(high, seeds):
+            config = build_config(high, extra_factors)
+            return getattr(run_configuration(config, seeds, detect_overload=True), metric)
+        return simulate
+
+    seeds = list(range(42, 52))
+    print(f"{len(names)} factors, {len(names) - len(FACTORIAL_FACTORS) - 1} of them synthetic and inert; "
+          f"a resolution III design needs at least {4 * (len(names) // 4 + 1)} design points (Plackett-Burman)")
+    for metric, threshold in (('prep_queue_lengths', 0.25), ('op_blocking_prob', 0.01)):
+        result = sequential_bifurcation(len(names), response(metric), seeds, threshold)
+        print(f"\n{metric}: {result['design_points']} design points, {result['replications']} replications, "
+              f"{len(result['tested'])} group tests")
+        for index, effect in sorted(result['important'].items()):
+            print(f"  Important: {names[index]}, effect {effect:.3f}")
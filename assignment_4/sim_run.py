@@ -1,32 +1,57 @@
+import time
 import random
 import simpy
 import numpy as np
 from scipy.stats import t
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from hospital import HospitalSimulation
 from monitor import Monitor
+from snapshot import warm_up_snapshots, start_from_snapshot, snapshot_batch_means
+from results_cube import ResultsCube
+from state_trace import traced_run
+from overload import mean_interarrival_time, traffic_intensity, run_with_overload_detection, overload_report
 from scipy.stats import sem
 import pandas as pd
 from sklearn.linear_model import LinearRegression
 from itertools import combinations
 from patient import Severity  # Add this import
 
+# Metrics recorded for every replication
+RESULT_METRICS = ('prep_queue_length', 'op_blocking_prob', 'recovery_full_prob')
+
+
+def _metric_view(name):
+    return property(lambda self: self.cube.metric(name)[0])
+
 
 @dataclass
 class SimulationResults:
-    """Container for simulation results"""
-    prep_queue_lengths: list
-    op_blocking_prob: list
-    recovery_full_prob: list
+    """Container for simulation results, backed by a single-point ResultsCube"""
+    cube: ResultsCube
+    overload_reports: list = field(default_factory=list)
+    traffic: dict = field(default_factory=dict)
+
+    prep_queue_lengths = _metric_view('prep_queue_length')
+    op_blocking_prob = _metric_view('op_blocking_prob')
+    recovery_full_prob = _metric_view('recovery_full_prob')
+
+    @property
+    def overloaded(self):
+        return self.cube.metadata['overloaded'][0].astype(bool)
     
     def compute_statistics(self, confidence=0.95):
-        """Compute mean and confidence intervals for all metrics"""
+        """
+        Compute mean and confidence intervals for all metrics
+
+        Replications started from warm-up snapshots enter as one batch mean
+        per snapshot, as those sharing a snapshot are correlated.
+        """
+        snapshot_ids = self.cube.metadata.get('snapshot')
         stats_dict = {}
-        for metric_name, values in {
-            'prep_queue_length': self.prep_queue_lengths,
-            'op_blocking_prob': self.op_blocking_prob,
-            'recovery_full_prob': self.recovery_full_prob
-        }.items():
+        for metric_name in self.cube.metrics:
+            values = self.cube.metric(metric_name)[0]
+            if snapshot_ids is not None:
+                values = snapshot_batch_means(values, snapshot_ids[0])
             mean = np.mean(values)
             std_err = sem(values)
             t_val = t.ppf((1 + confidence) / 2, len(values) - 1)
@@ -77,28 +102,21 @@ def interpret_results(regression_results, correlations):
         print(f"Long-term correlation (lag 7): {correlations[6]:.4f}")
 
 def analyze_serial_correlation(config, seeds, n_runs=10, n_samples=8):
-    """Analyze serial correlation with error handling and confidence intervals"""
+    """
+    Analyze serial correlation with error handling and confidence intervals
+
+    Each run is traced once over the measurement period of run_configuration,
+    and the samples are the exact time-averaged prep queue over n_samples
+    consecutive windows of it, read from the trace after the run.
+    """
     results = []
     
     try:
         for seed in seeds[:n_runs]:
-            random.seed(seed)
-            env = simpy.Environment()
-            hospital = HospitalSimulation(env, config)
-            monitor = Monitor(config['check_interval'])
-            
-            env.process(hospital.generate_patients())
-            env.process(monitor.run(hospital, env))
-            
-            samples = []
-            sample_interval = config['sim_time'] / n_samples
-            
-            with np.errstate(divide='ignore', invalid='ignore'):
-                for i in range(n_samples):
-                    env.run(until=(i+1)*sample_interval)
-                    current_length = monitor.current_queue_length()
-                    if not np.isnan(current_length):
-                        samples.append(current_length)
+            warm_time = config.get('warm_time', 0)
+            trace = traced_run(config, seed, warm_time + config['sim_time'])
+            samples = trace.window_averages(n_samples, start=warm_time)['prep_queue']
+            samples = samples[~np.isnan(samples)]
             
             if len(samples) >= n_samples:
                 results.append(samples)
@@ -168,25 +186,26 @@ def create_config_from_factors(factors):
     return config
 
 def run_factorial_experiment(seeds):
-    """Run the factorial experiment"""
+    """
+    Run the factorial experiment
+
+    Returns:
+        ResultsCube: Design points x seeds x metrics, with the factor levels
+            as the cube's points and overload flags as run metadata
+    """
     design = generate_factorial_design()
-    results = []
+    cube = ResultsCube(len(design), len(seeds), RESULT_METRICS, points=design)
     
-    for factors in design:
+    for i, factors in enumerate(design):
         config = create_config_from_factors(factors)
-        sim_results = run_configuration(config, seeds)
-        stats = sim_results.compute_statistics()
-        results.append({
-            'factors': factors,
-            'queue_length': stats['prep_queue_length_mean']
-        })
+        cube.set_point(i, run_configuration(config, seeds, detect_overload=True).cube)
     
-    return results
+    return cube
 
-def perform_regression_analysis(results):
+def perform_regression_analysis(cube, metric='prep_queue_length'):
     """Perform regression analysis with confidence intervals"""
-    X = np.array([r['factors'] for r in results])
-    y = np.array([r['queue_length'] for r in results])
+    X = cube.points
+    y = cube.point_means(metric)
     
     # Scale the response variable
     y = (y - np.mean(y)) / np.std(y)
@@ -231,38 +250,91 @@ def perform_regression_analysis(results):
         'r_squared': model.score(X, y)
     }
 
-def run_configuration(config, seeds):
-    """Run multiple simulations with given configuration and seeds"""
-    prep_queue_lengths = []
-    op_blocking_probs = []
-    recovery_full_probs = []
-    
-    for seed in seeds:
-        random.seed(seed)
-        env = simpy.Environment()
-        hospital = HospitalSimulation(env, config)
+def run_configuration(config, seeds, warmup_runs=None, detect_overload=False):
+    """
+    Run multiple simulations with given configuration and seeds
+
+    With warmup_runs set, only that many warm-up periods are simulated. Their
+    end states are snapshotted and the replications start from them in turn,
+    each with its own seed, so warm-up is amortized across replications.
+    Replications sharing a snapshot are correlated, so compute_statistics
+    then uses one batch mean per snapshot, and a CI needs two or more.
+
+    With detect_overload set, configurations with a stage at traffic
+    intensity rho >= 1 are watched by a drift detector, and a replication
+    whose number of patients shows a significant upward trend is stopped
+    early. Its prep queue length is then extrapolated over the measurement
+    period at the fluid-model prep growth rate, and its blocking
+    probabilities are those of the second half of the run before the stop,
+    whether it stopped during warm-up or after. Stable configurations in heavy traffic drift
+    for longer than a run lasts, so they are never stopped.
+    """
+    if warmup_runs is not None and warmup_runs < 2:
+        raise ValueError("warmup_runs must be at least 2 to give a confidence interval")
+    # Increase simulation time and warm-up period
+    config['warm_time'] = 2000  # Double the warm-up time
+    config['sim_time'] = 5000   # Increase simulation time
+    traffic = traffic_intensity(config)
+    results = SimulationResults(ResultsCube(1, len(seeds), RESULT_METRICS), traffic=traffic)
+    check_every = config.get('overload_check_time', 500)
+    # Smallest growth, as a fraction of the arrival rate, that counts as overload
+    min_growth = config.get('overload_min_growth', 0.05) / mean_interarrival_time(config)
+    snapshots = warm_up_snapshots(config, seeds[:warmup_runs]) if warmup_runs else None
+
+    def run_until(env, monitor, until):
+        """Run to until; True if the run was stopped for overload"""
+        if not detect_overload or traffic['stable']:
+            env.run(until=until)
+            return False
+        test = run_with_overload_detection(env, monitor, until, check_every, min_growth)
+        return test is not None and test['significant']
+    
+    for r, seed in enumerate(seeds):
+        start = time.perf_counter()
         monitor = Monitor(config['check_interval'])
-        
-        env.process(hospital.generate_patients())
-        env.process(monitor.run(hospital, env))
-        
-        # Increase simulation time and warm-up period
-        config['warm_time'] = 2000  # Double the warm-up time
-        config['sim_time'] = 5000   # Increase simulation time
+
+        if snapshots:
+            snapshot = snapshots[r % len(snapshots)]
+            env, hospital = start_from_snapshot(config, snapshot, seed)
+            env.process(monitor.run(hospital, env))
+            start_time = snapshot['time']
+            metadata = {'snapshot': r % len(snapshots)}
+            stopped = False
+        else:
+            random.seed(seed)
+            env = simpy.Environment()
+            hospital = HospitalSimulation(env, config)
+            
+            env.process(hospital.generate_patients())
+            env.process(monitor.run(hospital, env))
+            
+            # Warm-up period
+            stopped = run_until(env, monitor, config['warm_time'])
+            if not stopped:
+                monitor.reset()
+            start_time = config['warm_time']
+            metadata = {}
         
         # Run simulation
-        env.run(until=config['warm_time'] + config['sim_time'])
+        end_time = start_time + config['sim_time']
+        if not stopped:
+            stopped = run_until(env, monitor, end_time)
         
         # Collect statistics
-        prep_queue_lengths.append(monitor.current_queue_length())
-        op_blocking_probs.append(monitor.operation_blocking_probability())
-        recovery_full_probs.append(monitor.recovery_full_probability())
-    
-    return SimulationResults(
-        prep_queue_lengths=prep_queue_lengths,
-        op_blocking_prob=op_blocking_probs,
-        recovery_full_prob=recovery_full_probs
-    )
+        if stopped:
+            report = overload_report(config, monitor, start_time, end_time)
+            results.overload_reports.append(report)
+            metrics = {name: report[name] for name in RESULT_METRICS}
+        else:
+            metrics = {
+                'prep_queue_length': monitor.current_queue_length(),
+                'op_blocking_prob': monitor.operation_blocking_probability(),
+                'recovery_full_prob': monitor.recovery_full_probability()
+            }
+        results.cube.record(0, r, metrics, wall_time=time.perf_counter() - start,
+                            warm_time=start_time, overloaded=stopped, **metadata)
+    
+    return results
 
 
 def run_simulation(config, seed=None):
@@ -0,0 +1,58 @@
+import json
+import random
+import simpy
+import numpy as np
+from hospital import HospitalSimulation
+
+
+def save_snapshot(snapshot, path):
+    """Write a hospital snapshot to a JSON file"""
+    with open(path, 'w') as f:
+        json.dump(snapshot, f)
+
+
+def load_snapshot(path):
+    """Read a hospital snapshot from a JSON file"""
+    with open(path) as f:
+        return json.load(f)
+
+
+def warm_up_snapshot(config, seed):
+    """Run one warm-up period from an empty hospital and snapshot its end state"""
+    random.seed(seed)
+    env = simpy.Environment()
+    hospital = HospitalSimulation(env, config)
+    env.process(hospital.generate_patients())
+    env.run(until=config['warm_time'])
+    return hospital.snapshot()
+
+
+def warm_up_snapshots(config, seeds):
+    """Snapshots at the end of warm-up, one warm-up run per seed"""
+    return [warm_up_snapshot(config, seed) for seed in seeds]
+
+
+def start_from_snapshot(config, snapshot, seed=None):
+    """
+    Create an environment and hospital continuing from a snapshot
+
+    Returns:
+        tuple: (env, hospital) with patient and arrival processes started
+    """
+    env = simpy.Environment(initial_time=snapshot['time'])
+    hospital = HospitalSimulation(env, config)
+    hospital.restore(snapshot, seed)
+    return env, hospital
+
+
+def snapshot_batch_means(values, snapshot_ids):
+    """
+    Mean of the replications started from each snapshot
+
+    Replications continuing from one snapshot share its warm-up state and
+    are positively correlated, so treating them as independent understates
+    the variance of their mean. The batch means, one per snapshot, are
+    independent and give a valid confidence interval.
+    """
+    values, snapshot_ids = np.asarray(values), np.asarray(snapshot_ids)
+    return np.array([values[snapshot_ids == k].mean() for k in np.unique(snapshot_ids)])
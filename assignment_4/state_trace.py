@@ -0,0 +1,147 @@
+import random
+import simpy
+import numpy as np
+from hospital import HospitalSimulation
+
+# One row per state change; the state holds until the next row's time
+TRACE_DTYPE = np.dtype([
+    ('time', np.float64),
+    ('prep_queue', np.int32),
+    ('prep_busy', np.int32),
+    ('op_busy', np.int8),
+    ('op_blocking', np.int8),
+    ('recovery_busy', np.int32),
+    ('recovery_full', np.int8)
+])
+
+
+class StateTrace:
+    """
+    Run-length trace of the hospital state the Monitor samples
+
+    A row is written only when the state changes, and changes at the same
+    time overwrite each other, so the trace holds one row per distinct
+    state rather than one per event or per check. Any check interval or
+    window can then be sampled from the trace after the run.
+    """
+    def __init__(self, hospital, chunk_size=65536):
+        self.hospital = hospital
+        self.chunk_size = chunk_size
+        self.prep_capacity = hospital.prep_rooms.capacity
+        self.recovery_capacity = hospital.recovery_rooms.capacity
+        self.data = np.empty(chunk_size, dtype=TRACE_DTYPE)
+        self.count = 0
+        self.last = None
+        self.observe()
+
+    def _state(self):
+        hospital = self.hospital
+        return (
+            hospital.get_current_queue_length(),
+            hospital.prep_rooms.count,
+            hospital.operation_room.count,
+            1 if hospital.is_operation_blocked() else 0,
+            hospital.recovery_rooms.count,
+            1 if hospital.is_recovery_full() else 0
+        )
+
+    def observe(self):
+        """Record the current state if it differs from the last row"""
+        state = self._state()
+        if state == self.last:
+            return
+        now = self.hospital.env.now
+        if self.count > 0 and self.data['time'][self.count - 1] == now:
+            self.count -= 1  # Same instant: keep only the final state
+            if self.count > 0 and tuple(self.data[self.count - 1])[1:] == state:
+                self.last = state
+                return
+        if self.count == len(self.data):
+            extra = np.empty(max(self.chunk_size, self.count // 2), dtype=TRACE_DTYPE)
+            self.data = np.concatenate((self.data, extra))
+        self.data[self.count] = (now,) + state
+        self.count += 1
+        self.last = state
+
+    def run(self, until):
+        """Run the hospital's environment to until, tracing every event"""
+        env = self.hospital.env
+        while env.peek() < until:
+            env.step()
+            self.observe()
+        env.run(until=until)
+
+    def rows(self):
+        """View of the trace rows"""
+        return self.data[:self.count]
+
+    def _raw_data(self, rows):
+        return {
+            'prep_queue': rows['prep_queue'].astype(float),
+            'op_blocking': rows['op_blocking'].astype(float),
+            'recovery_full': rows['recovery_full'].astype(float),
+            'prep_util': rows['prep_busy'] / self.prep_capacity,
+            'op_util': rows['op_busy'].astype(float),
+            'recovery_util': rows['recovery_busy'] / self.recovery_capacity
+        }
+
+    def resample(self, interval, start=0.0, end=None):
+        """
+        State at every check time start, start + interval, ... before end
+
+        Returns:
+            dict: Arrays of the sampled state, one value per check
+        """
+        data = self.rows()
+        end = self.hospital.env.now if end is None else end
+        times = np.arange(start, end, interval)
+        index = np.searchsorted(data['time'], times, side='right') - 1
+        return self._raw_data(data[np.maximum(index, 0)])
+
+    def time_averages(self, start=0.0, end=None):
+        """Exact time averages over [start, end), keyed like resample()"""
+        data = self.rows()
+        end = self.hospital.env.now if end is None else end
+        first = max(np.searchsorted(data['time'], start, side='right') - 1, 0)
+        last = np.searchsorted(data['time'], end, side='left')
+        rows = data[first:last]
+        edges = np.clip(np.append(rows['time'], end), start, end)
+        weights = np.diff(edges)
+        return {name: np.dot(values, weights) / (end - start) for name, values in self._raw_data(rows).items()}
+
+    def window_averages(self, n_windows, start=0.0, end=None):
+        """
+        Time averages over n_windows equal consecutive windows of [start, end)
+
+        Returns:
+            dict: Arrays of n_windows batch means, keyed like resample()
+        """
+        end = self.hospital.env.now if end is None else end
+        edges = np.linspace(start, end, n_windows + 1)
+        windows = [self.time_averages(lower, upper) for lower, upper in zip(edges[:-1], edges[1:])]
+        return {name: np.array([window[name] for window in windows]) for name in windows[0]}
+
+
+def traced_run(config, seed, until):
+    """One run of the hospital with a state trace that later analyses sample"""
+    random.seed(seed)
+    env = simpy.Environment()
+    hospital = HospitalSimulation(env, config)
+    env.process(hospital.generate_patients())
+    trace = StateTrace(hospital)
+    trace.run(until)
+    return trace
+
+
+if __name__ == "__main__":
+    from sim_run import create_config_from_factors
+
+    config = create_config_from_factors([0, 0, 0, 0, 0, 0])
+    trace = traced_run(config, seed=42, until=100000)
+    print(f"{trace.count} trace rows, {trace.rows().nbytes / 1e6:.1f} MB")
+    for interval in (1, 5, 25, 100):
+        raw_data = trace.resample(interval, start=1000)
+        print(f"Interval {interval:>3}: {len(raw_data['prep_queue'])} samples, "
+              f"mean prep queue {raw_data['prep_queue'].mean():.3f}")
+    print(f"Time average: {trace.time_averages(start=1000)['prep_queue']:.3f}")
+    print(f"Batch means of 8 windows: {np.round(trace.window_averages(8, start=1000)['prep_queue'], 3)}")
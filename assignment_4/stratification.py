@@ -0,0 +1,128 @@
+import random
+import simpy
+import numpy as np
+from hospital import HospitalSimulation
+from monitor import Monitor
+from patient import Severity
+
+# Per-patient outcomes whose mean depends on the case mix
+PATIENT_METRICS = ('system_time', 'prep_wait')
+
+
+def patient_outcomes(hospital, since, until):
+    """
+    Outcomes of the patients that arrived in [since, until) and have left
+
+    Returns:
+        dict: Severity value to a dict of metric arrays
+    """
+    outcomes = {}
+    for severity, arrival, prep_start, departure in hospital.departures:
+        if since <= arrival < until:
+            by_class = outcomes.setdefault(severity, {metric: [] for metric in PATIENT_METRICS})
+            by_class['system_time'].append(departure - arrival)
+            by_class['prep_wait'].append(prep_start - arrival if prep_start is not None else np.nan)
+    return {severity: {metric: np.array(values) for metric, values in by_class.items()}
+            for severity, by_class in outcomes.items()}
+
+
+def naive_mean(outcomes, metric):
+    """Mean over all patients, weighting classes by their observed counts"""
+    values = np.concatenate([by_class[metric] for by_class in outcomes.values()])
+    return np.nanmean(values)
+
+
+def post_stratified_mean(outcomes, distribution, metric):
+    """
+    Mean with classes weighted by their known proportions
+
+    sum_h p_h * ybar_h removes the variation due to the realized case mix
+    from the estimate. Classes with no patients are dropped and the weights
+    of the others renormalized.
+    """
+    weights, means = [], []
+    for severity, probability in distribution.items():
+        by_class = outcomes.get(Severity(severity).value)
+        if by_class is not None and np.any(~np.isnan(by_class[metric])):
+            weights.append(probability)
+            means.append(np.nanmean(by_class[metric]))
+    return np.dot(weights, means) / np.sum(weights)
+
+
+def severity_replication(config, seed, method):
+    """
+    One replication with severity sampling by method
+
+    Returns:
+        dict: Naive and post-stratified means of each patient metric, the
+            prep queue length and the observed case mix
+    """
+    config = {**config, 'severity_sampling': method}
+    random.seed(seed)
+    env = simpy.Environment()
+    hospital = HospitalSimulation(env, config)
+    monitor = Monitor(config['check_interval'])
+    env.process(hospital.generate_patients())
+    env.process(monitor.run(hospital, env))
+
+    env.run(until=config['warm_time'])
+    monitor.reset()
+    end = config['warm_time'] + config['sim_time']
+    env.run(until=end)
+
+    outcomes = patient_outcomes(hospital, config['warm_time'], end)
+    total = sum(len(by_class['system_time']) for by_class in outcomes.values())
+    result = {
+        'prep_queue_length': monitor.current_queue_length(),
+        'mix': {severity: len(by_class['system_time']) / total for severity, by_class in outcomes.items()}
+    }
+    for metric in PATIENT_METRICS:
+        result[f'{metric}_naive'] = naive_mean(outcomes, metric)
+        result[f'{metric}_post_stratified'] = post_stratified_mean(outcomes, config['severity_distribution'], metric)
+    return result
+
+
+def compare_severity_sampling(config, seeds):
+    """
+    Random versus stratified severity sampling, with both estimators
+
+    Each method runs the same seeds. Variance reduction is the variance
+    across replications of simple random sampling with the naive mean over
+    that of each alternative.
+
+    Returns:
+        dict: (metric, method, estimator) to mean, variance across replications
+            and variance reduction factor
+    """
+    runs = {method: [severity_replication(config, seed, method) for seed in seeds]
+            for method in ('random', 'stratified')}
+    report = {}
+    for metric in PATIENT_METRICS + ('prep_queue_length',):
+        estimators = ('naive', 'post_stratified') if metric in PATIENT_METRICS else (None,)
+        baseline = None
+        for method, results in runs.items():
+            for estimator in estimators:
+                key = f'{metric}_{estimator}' if estimator else metric
+                values = np.array([result[key] for result in results])
+                variance = values.var(ddof=1)
+                baseline = variance if baseline is None else baseline
+                report[(metric, method, estimator or 'naive')] = {
+                    'mean': values.mean(),
+                    'variance': variance,
+                    'variance_reduction': baseline / variance if variance > 0 else np.inf
+                }
+    return report
+
+
+if __name__ == "__main__":
+    from sim_run import create_config_from_factors
+
+    # Exponential arrivals every 40 minutes, uniform prep, exponential recovery, 2 prep rooms
+    config = create_config_from_factors([0, 0, 1, 0, 0, 1])
+    config['severity_block_size'] = 10
+    report = compare_severity_sampling(config, list(range(42, 242)))
+
+    print(f"{'metric':<18} {'sampling':<11} {'estimator':<16} {'mean':>8} {'variance':>10} {'reduction':>10}")
+    for (metric, method, estimator), stats in report.items():
+        print(f"{metric:<18} {method:<11} {estimator:<16} {stats['mean']:>8.3f} "
+              f"{stats['variance']:>10.4f} {stats['variance_reduction']:>9.2f}x")
@@ -1,11 +1,25 @@
+import time
 import random
 import numpy as np
 import simpy
 from hospital import HospitalSimulation
 from monitor import Monitor
+from scipy import stats
 from scipy.stats import t, sem
 from collections import defaultdict
 
+# Generators checked by the goodness-of-fit suite, with the config key of
+# their distribution type (the operation time is always exponential)
+GENERATORS = {
+    'interarrival': 'arrival_dist',
+    'prep': 'prep_dist',
+    'operation': None,
+    'recovery': 'recovery_dist'
+}
+# Ranges of the uniform distributions in the assignment, by mean; other
+# uniforms span +-25% of their mean
+UNIFORM_RANGES = {25: (20, 30), 22.5: (20, 25), 40: (30, 50)}
+
 def verify_distributions(config, seed, n_samples=10000):
     """Verify that distributions are generating correct values"""
     random.seed(seed)
@@ -35,6 +49,148 @@ def verify_distributions(config, seed, n_samples=10000):
     
     return results
 
+def nominal_distribution(config, name):
+    """
+    Distribution a generator should follow according to the config
+
+    The mean is the configured one (40 for prep and recovery) and the type
+    comes from the config's distribution key.
+    """
+    means = {
+        'interarrival': config['mean_interarrival_time'],
+        'prep': 40,
+        'operation': config['mean_operation_time'],
+        'recovery': 40
+    }
+    mean = means[name]
+    key = GENERATORS[name]
+    if key is not None and config[key] == 'unif':
+        low, high = UNIFORM_RANGES.get(mean, (0.75 * mean, 1.25 * mean))
+        return stats.uniform(loc=low, scale=high - low)
+    return stats.expon(scale=mean)
+
+
+def anderson_darling(u):
+    """
+    Anderson-Darling test of probability-transformed values against U(0, 1)
+
+    The distribution is fully specified, so the p-value comes from the
+    asymptotic distribution of A^2 (Marsaglia and Marsaglia, 2004).
+    """
+    u = np.clip(np.sort(u), 1e-300, 1 - 1e-16)
+    n = len(u)
+    i = np.arange(1, n + 1)
+    a2 = -n - np.sum((2 * i - 1) * (np.log(u) + np.log1p(-u[::-1]))) / n
+    if a2 < 2:
+        cdf = (np.exp(-1.2337141 / a2) / np.sqrt(a2)
+               * (2.00012 + (0.247105 - (0.0649821 - (0.0347962 - (0.011672 - 0.00168691 * a2) * a2) * a2) * a2) * a2))
+    else:
+        cdf = np.exp(-np.exp(1.0776 - (2.30695 - (0.43424 - (0.082433 - (0.008056 - 0.0003146 * a2) * a2) * a2) * a2) * a2))
+    return a2, 1 - cdf
+
+
+def goodness_of_fit(sample, distribution, bins=100):
+    """Kolmogorov-Smirnov, Anderson-Darling and equiprobable chi-square p-values"""
+    u = distribution.cdf(sample)
+    counts = np.bincount(np.minimum((u * bins).astype(int), bins - 1), minlength=bins)
+    return {
+        'ks': stats.kstest(sample, distribution.cdf).pvalue,
+        'anderson_darling': anderson_darling(u)[1],
+        'chi_square': stats.chisquare(counts).pvalue
+    }
+
+
+def serial_independence(sample, max_lag=10, bins=10):
+    """
+    Ljung-Box test on the first max_lag autocorrelations, and a chi-square
+    test on the bins x bins grid of non-overlapping pairs of ranks, which
+    also catches non-linear dependence between consecutive values
+    """
+    n = len(sample)
+    x = sample - sample.mean()
+    lags = np.arange(1, max_lag + 1)
+    r = np.array([np.dot(x[:-k], x[k:]) for k in lags]) / np.dot(x, x)
+    q = n * (n + 2) * np.sum(r ** 2 / (n - lags))
+
+    ranks = np.argsort(np.argsort(sample)) * bins // n
+    pairs = ranks[:n - n % 2].reshape(-1, 2)
+    counts = np.bincount(pairs[:, 0] * bins + pairs[:, 1], minlength=bins * bins)
+    return {
+        'ljung_box': stats.chi2.sf(q, max_lag),
+        'serial_pairs': stats.chisquare(counts).pvalue
+    }
+
+
+def verify_generator(config, name, n_samples=1_000_000, seed=42):
+    """
+    All tests on one generator of HospitalSimulation
+
+    Draws go through the same generate_*_time method and the same random
+    module stream the simulation uses, seeded with random.seed, so both the
+    choice of distribution and parameters and the stream itself are tested.
+    That means one Python call per draw rather than a vectorized batch, at
+    roughly half a second to a second per 1,000,000 draws.
+    """
+    hospital = HospitalSimulation(simpy.Environment(), config)
+    generate = getattr(hospital, f'generate_{name}_time')
+    random.seed(seed)
+    sample = np.array([generate() for _ in range(n_samples)])
+    distribution = nominal_distribution(config, name)
+    p_values = {**goodness_of_fit(sample, distribution), **serial_independence(sample)}
+    return {
+        'nominal': f"{distribution.dist.name}(mean {distribution.mean():g})",
+        'mean': sample.mean(),
+        'nominal_mean': distribution.mean(),
+        'p_values': p_values
+    }
+
+
+def verify_factorial_generators(n_samples=1_000_000, seed=42, alpha=0.01):
+    """
+    Goodness-of-fit suite over every configuration of the factorial design
+
+    Each distinct generator setting is tested once and its result shared by
+    the design points that use it. A generator passes when every p-value
+    is at least alpha divided by the total number of tests (Bonferroni).
+    A generator that does not pass is tested again on a second stream whose
+    seed is fixed in advance, and passed_on_retest records the outcome;
+    passed itself stays False, as a retest only tells a chance failure from
+    a real one and does not restore the family-wise level.
+
+    Returns:
+        dict: Design points as (factors, {generator: result}) and the
+            distinct generator results, with passed_on_retest None for
+            generators that were not retested
+    """
+    from sim_run import generate_factorial_design, create_config_from_factors
+
+    distinct = {}
+    points = []
+    for factors in generate_factorial_design():
+        config = create_config_from_factors(factors)
+        generators = {}
+        for name, dist_key in GENERATORS.items():
+            key = (name, config.get(dist_key, 'exp'), nominal_distribution(config, name).mean())
+            if key not in distinct:
+                distinct[key] = verify_generator(config, name, n_samples, seed + len(distinct))
+            generators[name] = distinct[key]
+        points.append((factors, generators))
+
+    n_tests = sum(len(result['p_values']) for result in distinct.values())
+    # Retest seeds follow the first-pass ones, one per generator
+    retest_seeds = {key: seed + len(distinct) + i for i, key in enumerate(distinct)}
+    for key, result in distinct.items():
+        result['passed'] = bool(min(result['p_values'].values()) >= alpha / n_tests)
+        result['passed_on_retest'] = None
+        if not result['passed']:
+            config = create_config_from_factors(next(factors for factors, generators in points
+                                                     if generators[key[0]] is result))
+            retest = verify_generator(config, key[0], n_samples, retest_seeds[key])
+            result['retest_p_values'] = retest['p_values']
+            result['passed_on_retest'] = bool(min(retest['p_values'].values()) >= alpha / n_tests)
+    return {'points': points, 'generators': distinct}
+
+
 def verify_factorial_design():
     """Verify that factorial design is properly balanced"""
     from sim_run import generate_factorial_design
@@ -77,11 +233,27 @@ if __name__ == "__main__":
     
     print("Verifying distributions...")
     dist_results = verify_distributions(base_config, 42)
-    for dist_name, stats in dist_results.items():
-        print(f"\n{dist_name.capitalize()} distribution:")
-        for stat_name, value in stats.items():
-            print(f"{stat_name}: {value:.4f}")
-    
+    for dist_name, dist_stats in dist_results.items():
+        summary = ", ".join(f"{stat_name} {value:.4f}" for stat_name, value in dist_stats.items())
+        print(f"{dist_name.capitalize()}: {summary}")
+
+    print("\nVerifying input generators over the factorial design...")
+    start = time.perf_counter()
+    suite = verify_factorial_generators()
+    print(f"{len(suite['generators'])} distinct generators, 1,000,000 draws each, "
+          f"in {time.perf_counter() - start:.1f}s")
+    for (name, _, _), result in suite['generators'].items():
+        p_values = ", ".join(f"{test} {p:.3f}" for test, p in result['p_values'].items())
+        retest = result['passed_on_retest']
+        print(f"{name:<12} nominal {result['nominal']:<20} sample mean {result['mean']:8.3f} "
+              f"{'PASS' if result['passed'] else 'FAIL'}"
+              f"{'' if retest is None else ', retest ' + ('PASS' if retest else 'FAIL')} ({p_values})")
+    for factors, generators in suite['points']:
+        failed = [name + ('' if result['passed_on_retest'] is None else ' (retest '
+                          + ('passed' if result['passed_on_retest'] else 'failed') + ')')
+                  for name, result in generators.items() if not result['passed']]
+        print(f"Design point {factors}: {'failed ' + ', '.join(failed) if failed else 'all generators pass'}")
+
     print("\nVerifying factorial design...")
     try:
         verify_factorial_design()
@@ -90,6 +262,6 @@ if __name__ == "__main__":
         print(f"Factorial design verification failed: {e}")
     
     print("\nVerifying serial correlation...")
-    correlations = verify_serial_correlation(base_config, 42)
+    correlations, _ = verify_serial_correlation(base_config, 42)
     for lag, corr in enumerate(correlations, 1):
         print(f"Lag {lag}: {corr:.4f}")
\ No newline at end of file